@@ -0,0 +1,157 @@
+import asyncio
+import traceback
+from typing import Optional
+
+from neo4j import READ_ACCESS
+
+from driver_manager import get_async_driver_manager
+from instrumentation import configure_metrics, JsonLinesExporter, metrics
+from read_ws import (DEFAULT_PAGE_SIZE, RetrieveNodeAndRelations, SERVICE, TRAVERSAL_FRONTIER, TRAVERSAL_PATHS,
+                     logger_tag)
+from result_cache import make_relation_key, relation_cache
+
+DEFAULT_FAN_OUT_CONCURRENCY = 16
+
+
+class AsyncRetrieveNodeAndRelations(RetrieveNodeAndRelations):
+    # same request and response shape as RetrieveNodeAndRelations, the queries run on the asyncio driver
+
+    @staticmethod
+    def _establish_connection():
+        return get_async_driver_manager()
+
+    async def _run_query_and_format_data(self, query, session):
+        async def _run_txn(tx):
+            result = await tx.run(metrics.profiled(query), assetName=self.node_name, relationship_types=self.relationship_types)
+            records = [rcd async for rcd in result]
+            if metrics.enabled:
+                metrics.record_summary(SERVICE, await result.consume())
+            return records
+
+        with metrics.query(SERVICE, "node_relations"):
+            node_relations = await session.execute_read(_run_txn)
+        for record in node_relations:
+            data = record.get('data', [])
+            self.node_and_its_relations.extend(data)
+            metrics.increment("topology_rows_total", len(data), service=SERVICE, kind="related_nodes")
+
+    async def _query_database(self) -> list:
+        if self.driver is None:
+            self.driver = self._establish_connection()
+        async with self.driver.session(default_access_mode=READ_ACCESS) as session:
+            if self.traversal == TRAVERSAL_FRONTIER:
+                for traversal in self._frontier_traversals():
+                    request = traversal.next_request()
+                    while request is not None:
+                        with metrics.query(SERVICE, "frontier_level"):
+                            traversal.accept(await session.execute_read(self._fetch_records_txn_async, *request))
+                        request = traversal.next_request()
+                    self._accept_frontier_rows(traversal)
+            else:
+                for query in self._queries():
+                    await self._run_query_and_format_data(query, session)
+        return list(self.node_and_its_relations)
+
+    @staticmethod
+    async def _fetch_records_txn_async(tx, query, parameters):
+        result = await tx.run(metrics.profiled(query), parameters)
+        records = await result.data()
+        if metrics.enabled:
+            metrics.record_summary(SERVICE, await result.consume())
+        return records
+
+    async def fetch_page(self, page_size: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                         properties: Optional[list[str]] = None) -> dict:
+        if self.driver is None:
+            self.driver = self._establish_connection()
+        steps = self._page_steps(page_size, cursor, properties)
+        with metrics.phase(SERVICE, "pages"):
+            async with self.driver.session(default_access_mode=READ_ACCESS) as session:
+                try:
+                    request = next(steps)
+                    while True:
+                        with metrics.query(SERVICE, "relations_page"):
+                            records = await session.execute_read(self._fetch_records_txn_async, *request)
+                        request = steps.send(records)
+                except StopIteration as stop:
+                    return stop.value
+
+    async def iter_relations(self, fetch_size: int = DEFAULT_PAGE_SIZE, properties: Optional[list[str]] = None):
+        if self.driver is None:
+            self.driver = self._establish_connection()
+        async with self.driver.session(default_access_mode=READ_ACCESS, fetch_size=fetch_size) as session:
+            if self.traversal == TRAVERSAL_FRONTIER:
+                for traversal in self._frontier_traversals(None if properties is None else tuple(properties)):
+                    request = traversal.next_request()
+                    while request is not None:
+                        with metrics.query(SERVICE, "frontier_level"):
+                            traversal.accept(await session.execute_read(self._fetch_records_txn_async, *request))
+                        for row in traversal.take_rows():
+                            yield row
+                        request = traversal.next_request()
+            else:
+                for direction, relation_level, relation in self._traversal_specs():
+                    result = await session.run(*self._stream_query(direction, relation_level, relation, properties))
+                    async for record in result:
+                        yield record.data()
+
+    async def retrieve_relation_using_node_name(self) -> list:
+        try:
+            if self.topology_engine is not None:
+                with metrics.phase(SERVICE, "reads_topology_engine"):
+                    self.node_and_its_relations.extend(
+                        self.topology_engine.retrieve(self.node_name, self.relationship_types, self.direction,
+                                                      self.relation_levels, self.limit, traversal=self.traversal))
+                return self.node_and_its_relations
+            with metrics.phase(SERVICE, "async_reads"):
+                if self.cache is not None:
+                    cache_key = make_relation_key(self.node_label, self.node_name, self.relationship_types,
+                                                  self.direction, self.relation_levels, self.limit, self.traversal)
+                    self.node_and_its_relations = await self.cache.get_or_load_async(cache_key, self.node_label,
+                                                                                     self._query_database)
+                else:
+                    await self._query_database()
+
+        except Exception as exc:
+            print(f'{logger_tag} exception occurred {exc}')
+            print(traceback.format_exc())
+
+        return self.node_and_its_relations
+
+
+async def retrieve_relations_for_assets(node_names: list[str], project_id: int, relationship_types: list[dict],
+                                        direction: str, relation_levels, limit,
+                                        concurrency: int = DEFAULT_FAN_OUT_CONCURRENCY, topology_engine=None,
+                                        cache=relation_cache, traversal: str = TRAVERSAL_PATHS) -> dict[str, list]:
+    # one lookup per asset with at most `concurrency` of them in flight; the driver manager still caps
+    # sessions at the pool size, this bound keeps a large fan-out from queueing every lookup on the pool
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    slots = asyncio.Semaphore(concurrency)
+    node_names = list(dict.fromkeys(node_names))
+
+    async def _retrieve(node_name):
+        async with slots:
+            retriever = AsyncRetrieveNodeAndRelations(node_name, project_id, relationship_types, direction,
+                                                      relation_levels, limit, topology_engine=topology_engine,
+                                                      cache=cache, traversal=traversal)
+            return await retriever.retrieve_relation_using_node_name()
+
+    with metrics.phase(SERVICE, "async_fan_out"):
+        results = await asyncio.gather(*(_retrieve(node_name) for node_name in node_names))
+    return dict(zip(node_names, results))
+
+
+async def _main():
+    configure_metrics(enabled=True, exporters=[JsonLinesExporter()])
+    try:
+        return_data = await retrieve_relations_for_assets([f"Device{index}" for index in range(1, 201)], 60, [], "",
+                                                          10, 500)
+        print({node_name: len(rows) for node_name, rows in return_data.items()})
+    finally:
+        await get_async_driver_manager().close()
+    metrics.flush()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
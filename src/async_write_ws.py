@@ -0,0 +1,187 @@
+import asyncio
+from typing import AsyncIterable, Iterable, List, Optional, Union
+
+from neo4j import WRITE_ACCESS
+
+from driver_manager import get_async_driver_manager
+from instrumentation import configure_metrics, JsonLinesExporter, metrics
+from parallel_import import relationship_bucket_pair
+from result_cache import relation_cache
+from topology_readers import iter_device_chunks, iter_relationship_chunks
+from write_ws import DEFAULT_STREAM_BATCH_SIZE, SERVICE, TopologyImportBase
+
+logger_tag = "[ASYNC-IMPORT] "
+
+DEFAULT_MAX_IN_FLIGHT = 4
+
+Chunks = Union[Iterable[List[dict]], AsyncIterable[List[dict]]]
+
+
+async def _iterate_chunks(chunks: Chunks):
+    if hasattr(chunks, "__aiter__"):
+        async for chunk in chunks:
+            yield chunk
+        return
+    # file readers block on disk and parsing, so the next chunk is pulled on a worker thread
+    iterator = iter(chunks)
+    while True:
+        chunk = await asyncio.to_thread(next, iterator, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+class _BoundedWriter:
+    # backpressure for the write side: submit() waits while max_in_flight writes are outstanding, so the
+    # reader never runs further ahead of the database than that
+
+    def __init__(self, max_in_flight: int):
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._tasks = set()
+        self._error: Optional[BaseException] = None
+
+    async def submit(self, write, *args):
+        if self._error is not None:
+            raise self._error
+        await self._slots.acquire()
+        task = asyncio.create_task(self._run(write, *args))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, write, *args):
+        try:
+            await write(*args)
+        except BaseException as exc:
+            if self._error is None:
+                self._error = exc
+        finally:
+            self._slots.release()
+
+    async def drain(self):
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks))
+        if self._error is not None:
+            raise self._error
+
+
+class AsyncImportTopologyWithRelationsService(TopologyImportBase):
+    # asyncio counterpart of ImportTopologyWithRelationsService: always batched, with up to max_in_flight
+    # batches written concurrently, each on its own session. Only process_input and process_input_stream exist
+    # here; the columnar, delta and controlled imports are on the sync service
+
+    def __init__(self, *, project_id: int, device_details_data: Optional[List[dict]] = None,
+                 relationship_data: Optional[List[dict]] = None, batch_size: Optional[int] = None,
+                 max_in_flight: int = DEFAULT_MAX_IN_FLIGHT):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        super().__init__(project_id=project_id, device_details_data=device_details_data,
+                         relationship_data=relationship_data, batch_size=batch_size or DEFAULT_STREAM_BATCH_SIZE)
+        self._max_in_flight = max_in_flight
+
+    @staticmethod
+    def _establish_connection():
+        return get_async_driver_manager()
+
+    async def process_input(self):
+        self._convert_to_aiops_fields()
+        return await self.process_input_stream([self._device_details_data], [self._relationship_data])
+
+    async def process_input_stream(self, device_chunks: Chunks, relationship_chunks: Chunks):
+        # chunks are expected to be converted already (see topology_readers.iter_device_chunks)
+        try:
+            with metrics.phase(SERVICE, "async_total"):
+                await self._write_input_stream_async(device_chunks, relationship_chunks)
+        finally:
+            relation_cache.invalidate_all()
+        msg = f"Nodes and relationships created successfully in Neo4j database {self._node_label}."
+        return {"statusCode": 200, "statusMessage": msg}
+
+    async def _write_input_stream_async(self, device_chunks, relationship_chunks):
+        async with self._driver.session(default_access_mode=WRITE_ACCESS) as session:
+            with metrics.phase(SERVICE, "indices"):
+                await session.execute_write(self._run_queries_tx_async, self._index_queries())
+            with metrics.phase(SERVICE, "constraints"):
+                await session.execute_write(self._run_queries_tx_async, [self._constraint_query()])
+
+        writer = _BoundedWriter(self._max_in_flight)
+        with metrics.phase(SERVICE, "nodes"):
+            async for chunk in _iterate_chunks(device_chunks):
+                for batch in self._chunked(chunk):
+                    await writer.submit(self._write_node_batch_async, batch)
+            # every node has to exist before relationships MATCH on them
+            await writer.drain()
+        with metrics.phase(SERVICE, "relationships"):
+            # rows are buffered per (bucket pair, type) and written once a buffer fills a batch; a batch holds
+            # the locks of both its buckets, so concurrent batches never share a node and cannot deadlock
+            bucket_count = 2 * self._max_in_flight
+            bucket_locks = [asyncio.Lock() for _ in range(bucket_count)]
+            buffers = {}
+            async for chunk in _iterate_chunks(relationship_chunks):
+                for rel_type_name, rel_rows in self._group_relationship_rows(chunk).items():
+                    for row in rel_rows:
+                        key = (relationship_bucket_pair(row, bucket_count), rel_type_name)
+                        buffer = buffers.setdefault(key, [])
+                        buffer.append(row)
+                        if len(buffer) >= self._batch_size:
+                            del buffers[key]
+                            await writer.submit(self._write_relationship_batch_async, bucket_locks, *key, buffer)
+            await writer.drain()
+            # the partly filled buffers are merged per type and written one batch at a time, otherwise the
+            # tail would be one small batch per bucket pair
+            leftovers = {}
+            for (_, rel_type_name), buffer in buffers.items():
+                leftovers.setdefault(rel_type_name, []).extend(buffer)
+            for rel_type_name, rel_rows in leftovers.items():
+                for batch in self._chunked(rel_rows):
+                    await self._write_relationship_batch_async(bucket_locks, range(bucket_count), rel_type_name,
+                                                               batch)
+
+    @staticmethod
+    async def _run_queries_tx_async(tx, queries):
+        for query in queries:
+            result = await tx.run(query)
+            await result.consume()
+
+    @staticmethod
+    async def _run_batch_tx_async(tx, cypher_query, rows):
+        result = await tx.run(metrics.profiled(cypher_query), rows=rows)
+        metrics.record_summary(SERVICE, await result.consume())
+
+    async def _write_node_batch_async(self, items):
+        rows = self._node_batch_rows(items)
+        async with self._driver.session(default_access_mode=WRITE_ACCESS) as session:
+            with metrics.query(SERVICE, "merge_node_batch"):
+                await session.execute_write(self._run_batch_tx_async, self._node_batch_query(), rows)
+        metrics.increment("topology_rows_total", len(rows), service=SERVICE, kind="nodes")
+
+    async def _write_relationship_batch_async(self, bucket_locks, buckets, rel_type_name, rows):
+        locks = [bucket_locks[bucket] for bucket in sorted(set(buckets))]
+        for lock in locks:
+            await lock.acquire()
+        try:
+            async with self._driver.session(default_access_mode=WRITE_ACCESS) as session:
+                with metrics.query(SERVICE, "merge_relationship_batch"):
+                    await session.execute_write(self._run_batch_tx_async,
+                                                self._relationship_batch_query(rel_type_name), rows)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+        metrics.increment("topology_rows_total", len(rows), service=SERVICE, kind="relationships")
+
+
+async def _main():
+    configure_metrics(enabled=True, exporters=[JsonLinesExporter()])
+    device_details_location = "../artifacts/5k/device_details_5k_csv.csv"
+    relationship_location = "../artifacts/5k/relationships_5k_csv.csv"
+    obj = AsyncImportTopologyWithRelationsService(project_id=60, batch_size=1000, max_in_flight=4)
+    try:
+        response = await obj.process_input_stream(iter_device_chunks(device_details_location),
+                                                  iter_relationship_chunks(relationship_location))
+        print(response)
+    finally:
+        await obj._driver.close()
+    metrics.flush()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
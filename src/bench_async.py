@@ -0,0 +1,131 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import time
+
+import driver_manager
+from bench_ingestion import DATASETS, _count_rows, _dataset_files
+from stand_in_driver import AsyncStandInDriver, StandInDriver
+
+logger_tag = "[ASYNC-BENCHMARK] "
+
+
+def _relation_rows(query, parameters):
+    return [{"data": [{"relatedNode": "Device1", "positionNumber": 1, "relation": "Connected",
+                       "relatedNodeProperties": {}}]}]
+
+
+def _configure_sync(latency: float, pool_size: int):
+    return driver_manager.configure_driver_manager(
+        uri="stand-in://local", username="bench", password="bench", max_pool_size=pool_size,
+        driver_factory=lambda uri, **config: StandInDriver(uri, latency=latency, responder=_relation_rows, **config))
+
+
+async def _configure_async(latency: float, pool_size: int):
+    return await driver_manager.configure_async_driver_manager(
+        uri="stand-in://local", username="bench", password="bench", max_pool_size=pool_size,
+        driver_factory=lambda uri, **config: AsyncStandInDriver(uri, latency=latency, responder=_relation_rows,
+                                                                **config))
+
+
+def bench_reads(asset_count: int, concurrency_levels, latency: float, pool_size: int) -> list:
+    from async_read_ws import retrieve_relations_for_assets
+    from read_ws import RetrieveNodeAndRelations
+
+    node_names = [f"Device{index}" for index in range(1, asset_count + 1)]
+    results = []
+    sync_manager = _configure_sync(latency, pool_size)
+    start = time.perf_counter()
+    for node_name in node_names:
+        RetrieveNodeAndRelations(node_name, 0, [], "", 3, 500, cache=None).retrieve_relation_using_node_name()
+    seconds = time.perf_counter() - start
+    results.append({"case": "reads", "mode": "sync", "concurrency": 1, "requests": asset_count,
+                    "statements": len(sync_manager.driver.statements), "wallSeconds": seconds,
+                    "requestsPerSecond": asset_count / seconds if seconds else 0.0})
+
+    for concurrency in concurrency_levels:
+        async def _fan_out():
+            async_manager = await _configure_async(latency, pool_size)
+            try:
+                await retrieve_relations_for_assets(node_names, 0, [], "", 3, 500, concurrency=concurrency,
+                                                    cache=None)
+                return len(async_manager.driver.statements), async_manager.metrics()["waitTimeMax"]
+            finally:
+                await async_manager.close()
+
+        start = time.perf_counter()
+        statements, wait_time_max = asyncio.run(_fan_out())
+        seconds = time.perf_counter() - start
+        results.append({"case": "reads", "mode": "async", "concurrency": concurrency, "requests": asset_count,
+                        "statements": statements, "wallSeconds": seconds,
+                        "requestsPerSecond": asset_count / seconds if seconds else 0.0,
+                        "poolWaitTimeMax": wait_time_max})
+    return results
+
+
+def bench_writes(dataset: str, batch_size: int, in_flight_levels, latency: float, pool_size: int) -> list:
+    from async_write_ws import AsyncImportTopologyWithRelationsService
+    from topology_readers import iter_device_chunks, iter_relationship_chunks
+    from write_ws import ImportTopologyWithRelationsService
+
+    device_file, relationship_file = _dataset_files(dataset)
+    row_count = _count_rows(device_file) + _count_rows(relationship_file)
+
+    def _chunks():
+        return (iter_device_chunks(device_file),
+                iter_relationship_chunks(relationship_file) if relationship_file else [])
+
+    results = []
+    sync_manager = _configure_sync(latency, pool_size)
+    start = time.perf_counter()
+    ImportTopologyWithRelationsService(project_id=0, batch_size=batch_size).process_input_stream(*_chunks())
+    seconds = time.perf_counter() - start
+    results.append({"case": "writes", "dataset": dataset, "mode": "sync", "maxInFlight": 1, "rows": row_count,
+                    "statements": len(sync_manager.driver.statements), "wallSeconds": seconds,
+                    "rowsPerSecond": row_count / seconds if seconds else 0.0})
+
+    for max_in_flight in in_flight_levels:
+        async def _import():
+            async_manager = await _configure_async(latency, pool_size)
+            try:
+                service = AsyncImportTopologyWithRelationsService(project_id=0, batch_size=batch_size,
+                                                                  max_in_flight=max_in_flight)
+                await service.process_input_stream(*_chunks())
+                return len(async_manager.driver.statements)
+            finally:
+                await async_manager.close()
+
+        start = time.perf_counter()
+        statements = asyncio.run(_import())
+        seconds = time.perf_counter() - start
+        results.append({"case": "writes", "dataset": dataset, "mode": "async", "maxInFlight": max_in_flight,
+                        "rows": row_count, "statements": statements, "wallSeconds": seconds,
+                        "rowsPerSecond": row_count / seconds if seconds else 0.0})
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the asyncio services with the sync path on a stand-in")
+    parser.add_argument("--assets", type=int, default=200)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[4, 16, 64])
+    parser.add_argument("--datasets", nargs="+", choices=list(DATASETS), default=["1k", "5k"])
+    parser.add_argument("--batch-size", type=int, default=250)
+    parser.add_argument("--in-flight", nargs="+", type=int, default=[2, 4, 8])
+    parser.add_argument("--latency", type=float, default=0.005,
+                        help="simulated round-trip latency in seconds of the stand-in driver")
+    parser.add_argument("--pool-size", type=int, default=50)
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        report = bench_reads(args.assets, args.concurrency, args.latency, args.pool_size)
+        for dataset in args.datasets:
+            report.extend(bench_writes(dataset, args.batch_size, args.in_flight, args.latency, args.pool_size))
+    report = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as report_file:
+            report_file.write(report + "\n")
+    else:
+        print(report)
@@ -0,0 +1,113 @@
+import argparse
+import contextlib
+import io
+import json
+import time
+import tracemalloc
+
+import driver_manager
+from bench_ingestion import DATASETS, _dataset_files
+from stand_in_driver import StandInDriver
+
+logger_tag = "[COLUMNAR-BENCHMARK] "
+
+
+def _dict_parameters(device_file, relationship_file, batch_size: int, repeat: int):
+    # what the streaming path hands to the driver: converted dicts, then one row dict per node/relationship
+    from topology_readers import iter_device_chunks, iter_relationship_chunks
+    from write_ws import ImportTopologyWithRelationsService
+
+    for _ in range(repeat):
+        for chunk in iter_device_chunks(device_file, batch_size):
+            yield len(chunk), ImportTopologyWithRelationsService._node_batch_rows(chunk)
+        if relationship_file is None:
+            continue
+        for chunk in iter_relationship_chunks(relationship_file, batch_size):
+            for rel_rows in ImportTopologyWithRelationsService._group_relationship_rows(chunk).values():
+                yield len(rel_rows), rel_rows
+
+
+def _columnar_parameters(device_file, relationship_file, batch_size: int, repeat: int):
+    from columnar_batches import iter_device_batches, iter_relationship_batches
+
+    for _ in range(repeat):
+        for batch in iter_device_batches(device_file, batch_size):
+            yield batch.size, batch.parameters()
+        if relationship_file is None:
+            continue
+        for batch in iter_relationship_batches(relationship_file, batch_size):
+            yield batch.size, batch.parameters()
+
+
+PATHS = {"dict": _dict_parameters, "columnar": _columnar_parameters}
+
+
+def bench_client(path: str, dataset: str, batch_size: int, repeat: int) -> dict:
+    # client side only: file parsing, rename, uuids and property split up to the driver parameters
+    device_file, relationship_file = _dataset_files(dataset)
+    rows = 0
+    start_cpu = time.process_time()
+    start = time.perf_counter()
+    for row_count, _ in PATHS[path](device_file, relationship_file, batch_size, repeat):
+        rows += row_count
+    cpu_seconds = time.process_time() - start_cpu
+    seconds = time.perf_counter() - start
+
+    # tracemalloc slows allocation down, so peak memory is measured on a separate pass
+    tracemalloc.start()
+    for _ in PATHS[path](device_file, relationship_file, batch_size, repeat):
+        pass
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"case": "client", "dataset": dataset, "path": path, "batchSize": batch_size, "rows": rows,
+            "cpuSeconds": cpu_seconds, "wallSeconds": seconds,
+            "cpuMicrosecondsPerRow": cpu_seconds / rows * 1e6 if rows else 0.0,
+            "peakTracedBytes": peak_bytes, "peakBytesPerBatchRow": peak_bytes / min(rows, batch_size) if rows else 0.0}
+
+
+def bench_import(path: str, dataset: str, batch_size: int) -> dict:
+    # end to end through ImportTopologyWithRelationsService against the stand-in driver
+    from columnar_batches import iter_device_batches, iter_relationship_batches
+    from topology_readers import iter_device_chunks, iter_relationship_chunks
+    from write_ws import ImportTopologyWithRelationsService
+
+    device_file, relationship_file = _dataset_files(dataset)
+    manager = driver_manager.configure_driver_manager(
+        uri="stand-in://local", username="bench", password="bench",
+        driver_factory=lambda uri, **config: StandInDriver(uri, **config))
+    service = ImportTopologyWithRelationsService(project_id=0, batch_size=batch_size)
+    start_cpu = time.process_time()
+    if path == "columnar":
+        service.process_input_columnar(
+            iter_device_batches(device_file, batch_size),
+            iter_relationship_batches(relationship_file, batch_size) if relationship_file else [])
+    else:
+        service.process_input_stream(
+            iter_device_chunks(device_file, batch_size),
+            iter_relationship_chunks(relationship_file, batch_size) if relationship_file else [])
+    cpu_seconds = time.process_time() - start_cpu
+    return {"case": "import", "dataset": dataset, "path": path, "batchSize": batch_size,
+            "statements": len(manager.driver.statements), "cpuSeconds": cpu_seconds}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the columnar batches with the dict rows on the client")
+    parser.add_argument("--datasets", nargs="+", choices=list(DATASETS), default=["1k", "5k", "10k"])
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=1, help="read every dataset this many times")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    report = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for dataset in args.datasets:
+            for path in PATHS:
+                report.append(bench_client(path, dataset, args.batch_size, args.repeat))
+            for path in PATHS:
+                report.append(bench_import(path, dataset, args.batch_size))
+    report = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as report_file:
+            report_file.write(report + "\n")
+    else:
+        print(report)
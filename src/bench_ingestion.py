@@ -0,0 +1,213 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from neo4j import GraphDatabase, WRITE_ACCESS
+
+import driver_manager
+from stand_in_driver import RecordingDriver, RecordingStats, StandInDriver
+
+logger_tag = "[INGESTION-BENCHMARK] "
+
+ARTIFACTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "artifacts")
+LOAD_CSV_BASE_URL = "https://raw.githubusercontent.com/jaganmithran99/Neo4j_Aura_POC/main/artifacts"
+
+DATASETS = {
+    "1k": ("1k/device_details_1k_csv.csv", "1k/relationships_1k_csv.csv"),
+    "5k": ("5k/device_details_5k_csv.csv", "5k/relationships_5k_csv.csv"),
+    "10k": ("10k/device_details_10k_csv.csv", "10k/relationships_10k_csv.csv"),
+}
+
+STRATEGIES = ("load_csv", "partitioned", "per_row", "batched", "streaming", "parallel")
+
+# figures the recording backend cannot measure for a strategy: LOAD CSV reads and writes every row inside the
+# server, so nothing is loaded and the rate comes from three round trips; per_row sends auto-commit statements,
+# which are transactions on a server but are not counted as such by the recording driver
+SIMULATED_FIELDS = {"load_csv": ("rowsPerSecond", "transactions", "batchLatencyP50", "batchLatencyP99"),
+                    "per_row": ("transactions",)}
+
+
+def _dataset_files(dataset: str):
+    device_file, relationship_file = (os.path.normpath(os.path.join(ARTIFACTS_DIR, path))
+                                      for path in DATASETS[dataset])
+    return device_file, relationship_file if os.path.exists(relationship_file) else None
+
+
+def _read_rows(file_path):
+    from topology_readers import iter_file_chunks
+
+    if file_path is None:
+        return []
+    return [row for chunk in iter_file_chunks(file_path) for row in chunk]
+
+
+def _count_rows(file_path) -> int:
+    from topology_readers import iter_file_chunks
+
+    if file_path is None:
+        return 0
+    return sum(len(chunk) for chunk in iter_file_chunks(file_path))
+
+
+def _percentile(values, percentile: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(percentile / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def _peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _reset_label(node_label: str):
+    with driver_manager.get_driver_manager().session(default_access_mode=WRITE_ACCESS) as session:
+        session.run(f"MATCH (n:{node_label}) CALL {{ WITH n DETACH DELETE n }} IN TRANSACTIONS OF 10000 ROWS").consume()
+
+
+def _run_strategy(strategy: str, device_file: str, relationship_file, batch_size: int, workers: int):
+    from bulk_impot_csv import BulkImportTopologyWithRelationsService
+    from topology_readers import iter_device_chunks, iter_relationship_chunks
+    from write_ws import ImportTopologyWithRelationsService
+
+    if strategy == "load_csv":
+        if relationship_file is None:
+            raise FileNotFoundError("LOAD CSV needs a relationship file")
+        # LOAD CSV reads server side, so the files have to be reachable by the database over HTTP
+        base = os.path.normpath(ARTIFACTS_DIR)
+        service = BulkImportTopologyWithRelationsService()
+        service.bulk_import(
+            device_file_path=LOAD_CSV_BASE_URL + "/" + os.path.relpath(device_file, base).replace(os.sep, "/"),
+            rel_file_path=LOAD_CSV_BASE_URL + "/" + os.path.relpath(relationship_file, base).replace(os.sep, "/"))
+        return service._node_label
+    if strategy == "partitioned":
+        # local files are streamed from disk, so nothing has to be hosted for the server
+        service = BulkImportTopologyWithRelationsService(rows_per_transaction=batch_size)
+        service.bulk_import_partitioned(device_file, relationship_file)
+        return service._node_label
+    if strategy == "streaming":
+        service = ImportTopologyWithRelationsService(project_id=0, batch_size=batch_size)
+        service.process_input_stream(
+            iter_device_chunks(device_file),
+            iter_relationship_chunks(relationship_file) if relationship_file else [])
+        return service._node_label
+
+    options = {"per_row": {}, "batched": {"batch_size": batch_size},
+               "parallel": {"batch_size": batch_size, "parallel_workers": workers}}[strategy]
+    service = ImportTopologyWithRelationsService(project_id=0, device_details_data=_read_rows(device_file),
+                                                 relationship_data=_read_rows(relationship_file), **options)
+    service.process_input()
+    return service._node_label
+
+
+def run_case(strategy: str, dataset: str, backend: str, batch_size: int, workers: int,
+             latency: float = 0.0, reset_label: bool = False) -> dict:
+    device_file, relationship_file = _dataset_files(dataset)
+    pool_size = max(workers + 1, 4)
+    if backend == "neo4j":
+        manager = driver_manager.configure_driver_manager(
+            driver_factory=lambda uri, **config: RecordingDriver(GraphDatabase.driver(uri, **config)),
+            max_pool_size=pool_size)
+    else:
+        manager = driver_manager.configure_driver_manager(
+            uri="stand-in://local", username="bench", password="bench", max_pool_size=pool_size,
+            driver_factory=lambda uri, **config: RecordingDriver(StandInDriver(uri, latency=latency, **config)))
+
+    row_count = _count_rows(device_file) + _count_rows(relationship_file)
+    if backend == "neo4j":
+        # the services import under their real labels, so emptying one deletes the imported topology
+        # of whatever database the driver manager points at; only done when asked for
+        if reset_label:
+            _reset_label("CI_2labels" if strategy in ("load_csv", "partitioned") else "CI_10K_loop")
+        manager.driver.stats = RecordingStats()
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        _run_strategy(strategy, device_file, relationship_file, batch_size, workers)
+    cpu_seconds = time.process_time() - cpu_start
+    wall_seconds = time.perf_counter() - wall_start
+
+    stats = manager.driver.stats
+    result = {
+        "strategy": strategy,
+        "dataset": dataset,
+        "backend": backend,
+        "batchSize": batch_size,
+        "workers": workers if strategy == "parallel" else 1,
+        "rows": row_count,
+        "wallSeconds": wall_seconds,
+        "clientCpuSeconds": cpu_seconds,
+        "rowsPerSecond": row_count / wall_seconds if wall_seconds else 0.0,
+        "batchLatencyP50": _percentile(stats.batch_latencies, 50),
+        "batchLatencyP99": _percentile(stats.batch_latencies, 99),
+        "peakRssBytes": _peak_rss_bytes(),
+        "timestamp": time.time()
+    }
+    result.update(stats.as_dict())
+    simulated_fields = list(SIMULATED_FIELDS.get(strategy, ())) if backend != "neo4j" else []
+    result["simulated"] = bool(simulated_fields)
+    result["simulatedFields"] = simulated_fields
+    manager.close()
+    return result
+
+
+def run_suite(strategies, datasets, backend: str, batch_size: int, workers: int, latency: float,
+              reset_label: bool = False) -> list:
+    # each case runs in a fresh interpreter so that peak RSS belongs to that case only
+    results = []
+    for dataset in datasets:
+        for strategy in strategies:
+            command = [sys.executable, os.path.abspath(__file__), "--case", strategy, dataset, "--backend", backend,
+                       "--batch-size", str(batch_size), "--workers", str(workers), "--latency", str(latency)]
+            if reset_label:
+                command.append("--reset-label")
+            completed = subprocess.run(command, capture_output=True, text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__)))
+            if completed.returncode != 0:
+                results.append({"strategy": strategy, "dataset": dataset, "backend": backend,
+                                "error": (completed.stderr.strip().splitlines() or [""])[-1]})
+                continue
+            results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+            simulated = " (simulated)" if "rowsPerSecond" in results[-1]["simulatedFields"] else ""
+            print(f"{logger_tag}{dataset} {strategy}: {results[-1]['rowsPerSecond']:.1f} rows/sec{simulated}",
+                  file=sys.stderr)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare ingestion strategies over the artifact datasets")
+    parser.add_argument("--strategies", nargs="+", choices=STRATEGIES, default=list(STRATEGIES))
+    parser.add_argument("--datasets", nargs="+", choices=list(DATASETS), default=list(DATASETS))
+    parser.add_argument("--backend", choices=("recording", "neo4j"), default="recording")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="simulated round-trip latency in seconds for the recording backend")
+    parser.add_argument("--reset-label", action="store_true",
+                        help="delete every node of the import label before each case on the neo4j backend; "
+                             "this wipes the imported topology of the configured database")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--case", nargs=2, metavar=("STRATEGY", "DATASET"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(args.case[0], args.case[1], args.backend, args.batch_size, args.workers,
+                                  args.latency, args.reset_label)))
+    else:
+        report = json.dumps(run_suite(args.strategies, args.datasets, args.backend, args.batch_size, args.workers,
+                                      args.latency, args.reset_label), indent=2)
+        if args.output:
+            with open(args.output, "w") as report_file:
+                report_file.write(report + "\n")
+        else:
+            print(report)
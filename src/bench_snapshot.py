@@ -0,0 +1,97 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_ingestion import DATASETS, _dataset_files, _peak_rss_bytes
+
+logger_tag = "[SNAPSHOT-BENCHMARK] "
+
+MODES = ("csv", "snapshot")
+
+
+def _memory_status() -> dict:
+    # resident memory split into private (anonymous) pages and file pages; mapped snapshot pages are file
+    # pages that every process mapping the snapshot shares
+    status = {}
+    try:
+        with open("/proc/self/status") as status_file:
+            for line in status_file:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "RssAnon", "RssFile"):
+                    status[key] = int(value.split()[0]) * 1024
+    except OSError:
+        pass
+    return status
+
+
+def _start_worker(mode: str, dataset: str, snapshot_path: str) -> dict:
+    # runs in a fresh interpreter, so the numbers are those of a cold worker process
+    from topology_engine import TopologyGraph
+    from topology_snapshot import load_snapshot
+
+    baseline = _memory_status()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == "csv":
+            graph = TopologyGraph.from_csv(*_dataset_files(dataset))
+        else:
+            graph = load_snapshot(snapshot_path)
+        load_seconds = time.perf_counter() - start
+        # the first lookup builds the name index, which is part of getting a worker ready
+        rows = graph.retrieve("Device7", [], "", 3, 500)
+    ready_seconds = time.perf_counter() - start
+    memory = _memory_status()
+    return {"case": "startup", "dataset": dataset, "mode": mode, "nodes": graph.node_count,
+            "relations": graph.edge_count, "rows": len(rows), "loadSeconds": load_seconds,
+            "readySeconds": ready_seconds, "peakRssBytes": _peak_rss_bytes(),
+            "rssGrowthBytes": memory.get("VmRSS", 0) - baseline.get("VmRSS", 0),
+            "privateGrowthBytes": memory.get("RssAnon", 0) - baseline.get("RssAnon", 0),
+            "fileBackedGrowthBytes": memory.get("RssFile", 0) - baseline.get("RssFile", 0)}
+
+
+def bench_startup(dataset: str, repeat: int, snapshot_dir: str) -> list:
+    from topology_snapshot import export_csv_snapshot
+
+    snapshot_path = os.path.join(snapshot_dir, f"topology_{dataset}.snapshot")
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        export = export_csv_snapshot(*_dataset_files(dataset), snapshot_path)
+    results = [{"case": "export", "dataset": dataset, "bytes": export["bytes"],
+                "seconds": time.perf_counter() - start}]
+    for mode in MODES:
+        for _ in range(repeat):
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", mode, "--datasets", dataset,
+                                     "--snapshot", snapshot_path], capture_output=True, text=True, check=True,
+                                    cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+            results.append(json.loads(output))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare worker startup from a topology snapshot with the CSV path")
+    parser.add_argument("--datasets", nargs="+", choices=list(DATASETS), default=["1k", "5k", "10k"])
+    parser.add_argument("--repeat", type=int, default=3, help="worker processes started per mode")
+    parser.add_argument("--snapshot-dir", default=tempfile.gettempdir())
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--worker", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--snapshot", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(_start_worker(args.worker, args.datasets[0], args.snapshot)))
+        sys.exit(0)
+    report = []
+    for dataset in args.datasets:
+        report.extend(bench_startup(dataset, args.repeat, args.snapshot_dir))
+    report = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as report_file:
+            report_file.write(report + "\n")
+    else:
+        print(report)
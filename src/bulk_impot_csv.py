@@ -1,36 +1,71 @@
-import time
+import os
+from collections import defaultdict
+from functools import partial
 
-from neo4j import GraphDatabase
+from driver_manager import get_driver_manager
+from instrumentation import configure_metrics, JsonLinesExporter, metrics
+from result_cache import relation_cache
+from topology_readers import RELATIONSHIP_KEY_FIELDS, iter_file_chunks
+
+SERVICE = "bulk_import"
+
+DEFAULT_ROWS_PER_TRANSACTION = 10000
+NODE_PARTITION_FIELD = "Type"
+RELATIONSHIP_PARTITION_FIELD = "Relationship Type Name"
+
+
+def _quote(name) -> str:
+    return "`" + str(name).replace("`", "``") + "`"
+
+
+def _quote_string(value) -> str:
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def _batched(rows, size: int):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _is_local_file(path) -> bool:
+    return os.path.isfile(path)
 
 
 class BulkImportTopologyWithRelationsService:
 
-    def __init__(self):
+    def __init__(self, concurrent_transactions: int = 0, rows_per_transaction: int = DEFAULT_ROWS_PER_TRANSACTION,
+                 controller=None, impact_index=None):
+        if rows_per_transaction < 1:
+            raise ValueError("rows_per_transaction must be at least 1")
         self._node_label = "CI_2labels"
+        self._concurrent_transactions = concurrent_transactions
+        self._rows_per_transaction = rows_per_transaction
+        # import_controller.ImportController for the local partitioned import; LOAD CSV batches on the server
+        self._controller = controller
+        # impact_index.ImpactIndex; the rows are read by the server, so it is synced from the graph afterwards
+        self._impact_index = impact_index
         self._unique_properties = ["assetId"]
         self._driver = self._establish_connection()
 
     @staticmethod
     def _establish_connection():
-        neo4j_uname = "neo4j"  # replace with correct value
-        neo4j_pwd = "pwd"
-        neo4j_uri = "uri"
-
-        if neo4j_uname and neo4j_pwd and neo4j_uri:
-            start = time.time()
-            _driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_uname, neo4j_pwd))
-            end = time.time()
-            print("Time taken for initializing driver: " + str(end - start))
-            return _driver
-        else:
-            raise RuntimeError("Driver not initialized")
+        return get_driver_manager()
 
     def bulk_import(self, device_file_path, rel_file_path):
-        with self._driver.session(database="neo4j") as session:
-            self._create_constraint(session)
-            self.import_nodes_n_rel(session, device_file_path, rel_file_path)
-            session.close()
-        self._driver.close()
+        try:
+            with metrics.phase(SERVICE, "total"), self._driver.session(database="neo4j") as session:
+                self._create_constraint(session)
+                self.import_nodes_n_rel(session, device_file_path, rel_file_path)
+                self._write_impact_summaries(session)
+                session.close()
+        finally:
+            relation_cache.invalidate_all()
 
     @staticmethod
     def _generate_field_mappings():
@@ -63,6 +98,13 @@ class BulkImportTopologyWithRelationsService:
             [f"a.{aiops_key}= coalesce(line['{ip_key}'], '')" for aiops_key, ip_key in mappings.items()])
         return mapped_string
 
+    def _in_transactions_clause(self):
+        # IN n CONCURRENT TRANSACTIONS needs Neo4j 5.21+; rows are not lock-partitioned on the server, so
+        # dense topologies deadlock less with the client-side ParallelRelationshipImporter in write_ws
+        if self._concurrent_transactions:
+            return f"IN {self._concurrent_transactions} CONCURRENT TRANSACTIONS OF {self._rows_per_transaction} rows"
+        return f"IN TRANSACTIONS OF {self._rows_per_transaction} rows"
+
     def import_nodes_n_rel(self, imp_session, n_file, rel_file):
 
         node_query = f"""
@@ -86,35 +128,192 @@ class BulkImportTopologyWithRelationsService:
                 MATCH (a2:{self._node_label} {{assetId: line['Target Asset ID']}}) WITH a1,a2, line CALL 
                 apoc.create.relationship(a1, line['Relationship Type Name'], apoc.map.removeKeys(line, ['Source Asset 
                 ID', 'Target Asset ID', 'Relationship Type Name']), a2) YIELD rel RETURN COUNT(*) as count }} 
-                IN TRANSACTIONS OF 10000 rows 
+                {self._in_transactions_clause()} 
                 RETURN count;"""
 
-        node_start = time.time()
-        result = imp_session.run(
-            node_query,
-            nodeFile=n_file
+        # results are consumed inside the span so it covers server execution, not just submission
+        with metrics.phase(SERVICE, "nodes"):
+            result = imp_session.run(
+                metrics.profiled(node_query),
+                nodeFile=n_file
+            )
+            metrics.record_summary(SERVICE, result.consume())
+
+        with metrics.phase(SERVICE, "relationships"):
+            result = imp_session.run(
+                metrics.profiled(relationship_query),
+                relationshipFile=rel_file
+            )
+            metrics.record_summary(SERVICE, result.consume())
+
+    def bulk_import_partitioned(self, device_file_path, rel_file_path) -> dict:
+        # one statement per node Type and per relationship type, so labels and relationship types are static
+        # in the Cypher text instead of going through apoc.create.* for every row. Local files are streamed
+        # from disk in UNWIND batches; anything else is read by the server with LOAD CSV as before
+        try:
+            with metrics.phase(SERVICE, "total"), self._driver.session(database="neo4j") as session:
+                self._create_constraint(session)
+                if _is_local_file(device_file_path) and (rel_file_path is None or _is_local_file(rel_file_path)):
+                    summary = self._import_local_partitions(session, device_file_path, rel_file_path)
+                else:
+                    summary = self._import_remote_partitions(session, device_file_path, rel_file_path)
+                self._write_impact_summaries(session)
+                session.close()
+        finally:
+            relation_cache.invalidate_all()
+        return summary
+
+    def _node_partition_query(self, node_type, source: str) -> str:
+        if source == "csv":
+            prefix = "LOAD CSV WITH HEADERS FROM $file AS line WITH line "
+            prefix += ("WHERE line['Type'] = $partition " if node_type
+                       else "WHERE coalesce(line['Type'], '') = '' ")
+            suffix = f" {self._in_transactions_clause()}"
+        else:
+            prefix, suffix = "UNWIND $rows AS line ", ""
+        label = f", a:{_quote(node_type)}" if node_type else ""
+        return (
+            f"{prefix}"
+            "CALL { "
+            "WITH line "
+            f"MERGE (a:{self._node_label} {{assetId: line['Asset ID']}}) "
+            f"SET {self._generate_field_mappings()}, a.internalAssetId = randomUUID(){label} "
+            f"}}{suffix}"
         )
-        node_end = time.time()
-        print("Time taken for importing nodes: " + str(node_end - node_start))
 
-        rel_start = time.time()
-        result = imp_session.run(
-            relationship_query,
-            relationshipFile=rel_file
+    def _relationship_partition_query(self, rel_type_name, property_columns, source: str) -> str:
+        if source == "csv":
+            prefix = ("LOAD CSV WITH HEADERS FROM $file AS line "
+                      "WITH line WHERE line['Relationship Type Name'] = $partition ")
+            suffix = f" {self._in_transactions_clause()}"
+        else:
+            prefix, suffix = "UNWIND $rows AS line ", ""
+        # the non-key columns are known from the header, so the property map is static as well
+        properties = ", ".join(f"{_quote(column)}: line[{_quote_string(column)}]" for column in property_columns)
+        # under a controller a batch can be replayed after a resume, so relationships are merged, not created
+        return (
+            f"{prefix}"
+            "CALL { "
+            "WITH line "
+            f"MATCH (a1:{self._node_label} {{assetId: line['Source Asset ID']}}) "
+            f"MATCH (a2:{self._node_label} {{assetId: line['Target Asset ID']}}) "
+            f"{'MERGE' if self._controller else 'CREATE'} (a1)-[r:{_quote(rel_type_name)}]->(a2) "
+            f"SET r = {{{properties}}} "
+            f"}}{suffix}"
         )
-        rel_end = time.time()
-        print("Time taken for importing relations: " + str(rel_end - rel_start))
+
+    def scan_partitions(self, session, device_file_path, rel_file_path) -> dict:
+        # distinct node Types and relationship types, plus the relationship columns that become properties
+        node_types = [record["partition"] for record in session.run(
+            "LOAD CSV WITH HEADERS FROM $file AS line RETURN DISTINCT coalesce(line['Type'], '') AS partition",
+            file=device_file_path)]
+        relationship_types, columns = [], []
+        if rel_file_path is not None:
+            relationship_types = [record["partition"] for record in session.run(
+                "LOAD CSV WITH HEADERS FROM $file AS line WITH line['Relationship Type Name'] AS partition "
+                "WHERE partition IS NOT NULL AND partition <> '' RETURN DISTINCT partition",
+                file=rel_file_path)]
+            header = session.run("LOAD CSV FROM $file AS line RETURN line LIMIT 1", file=rel_file_path).single()
+            columns = [column for column in (header["line"] if header else []) if column not in RELATIONSHIP_KEY_FIELDS]
+        return {"nodeTypes": sorted(node_types), "relationshipTypes": sorted(relationship_types),
+                "relationshipColumns": columns}
+
+    def _import_remote_partitions(self, session, device_file_path, rel_file_path) -> dict:
+        with metrics.phase(SERVICE, "scan"):
+            partitions = self.scan_partitions(session, device_file_path, rel_file_path)
+        with metrics.phase(SERVICE, "nodes"):
+            for node_type in partitions["nodeTypes"]:
+                with metrics.query(SERVICE, "node_partition"):
+                    result = session.run(metrics.profiled(self._node_partition_query(node_type, "csv")),
+                                         file=device_file_path, partition=node_type)
+                    metrics.record_summary(SERVICE, result.consume())
+        with metrics.phase(SERVICE, "relationships"):
+            for rel_type_name in partitions["relationshipTypes"]:
+                with metrics.query(SERVICE, "relationship_partition"):
+                    result = session.run(
+                        metrics.profiled(self._relationship_partition_query(rel_type_name,
+                                                                            partitions["relationshipColumns"], "csv")),
+                        file=rel_file_path, partition=rel_type_name)
+                    metrics.record_summary(SERVICE, result.consume())
+        return {"nodePartitions": len(partitions["nodeTypes"]),
+                "relationshipPartitions": len(partitions["relationshipTypes"])}
+
+    @staticmethod
+    def _run_rows_tx(tx, cypher_query, rows):
+        metrics.record_summary(SERVICE, tx.run(metrics.profiled(cypher_query), rows=rows).consume())
+
+    def _import_local_partitions(self, session, device_file_path, rel_file_path) -> dict:
+        # rows are split by partition per batch as they are read, so no separate scan pass over the file is
+        # needed; every batch is one transaction over all of its partitions
+        node_types, relationship_types = set(), set()
+        write_nodes = partial(self._write_node_partitions_tx, node_types=node_types)
+        write_relationships = partial(self._write_relationship_partitions_tx, relationship_types=relationship_types)
+        device_rows = self._partition_rows(device_file_path)
+        relationship_rows = self._partition_rows(rel_file_path) if rel_file_path else []
+        if self._controller:
+            with metrics.phase(SERVICE, "nodes"):
+                self._controller.run("nodes", device_rows, write_nodes)
+            with metrics.phase(SERVICE, "relationships"):
+                self._controller.run("relationships", relationship_rows, write_relationships)
+            self._controller.complete()
+        else:
+            with metrics.phase(SERVICE, "nodes"):
+                for rows in _batched(device_rows, self._rows_per_transaction):
+                    with metrics.query(SERVICE, "node_partitions"):
+                        session.execute_write(write_nodes, rows)
+                    metrics.increment("topology_rows_total", len(rows), service=SERVICE, kind="nodes")
+            with metrics.phase(SERVICE, "relationships"):
+                for rows in _batched(relationship_rows, self._rows_per_transaction):
+                    with metrics.query(SERVICE, "relationship_partitions"):
+                        session.execute_write(write_relationships, rows)
+                    metrics.increment("topology_rows_total", len(rows), service=SERVICE, kind="relationships")
+        return {"nodePartitions": len(node_types), "relationshipPartitions": len(relationship_types)}
+
+    def _partition_rows(self, file_path):
+        # empty cells become null like they do with LOAD CSV
+        for chunk in iter_file_chunks(file_path, self._rows_per_transaction):
+            for row in chunk:
+                yield {key: (value if value != "" else None) for key, value in row.items()}
+
+    def _write_node_partitions_tx(self, tx, rows, node_types):
+        rows_by_type = defaultdict(list)
+        for row in rows:
+            rows_by_type[row.get(NODE_PARTITION_FIELD) or ""].append(row)
+        for node_type, type_rows in rows_by_type.items():
+            self._run_rows_tx(tx, self._node_partition_query(node_type, "rows"), type_rows)
+        node_types.update(rows_by_type)
+
+    def _write_relationship_partitions_tx(self, tx, rows, relationship_types):
+        property_columns = [column for column in rows[0] if column not in RELATIONSHIP_KEY_FIELDS]
+        rows_by_type = defaultdict(list)
+        for row in rows:
+            if row.get(RELATIONSHIP_PARTITION_FIELD):
+                rows_by_type[row[RELATIONSHIP_PARTITION_FIELD]].append(row)
+        for rel_type_name, type_rows in rows_by_type.items():
+            self._run_rows_tx(tx, self._relationship_partition_query(rel_type_name, property_columns, "rows"),
+                              type_rows)
+        relationship_types.update(rows_by_type)
+
+    def _write_impact_summaries(self, session):
+        if self._impact_index is None:
+            return
+        with metrics.phase(SERVICE, "impact_summaries"):
+            changed = self._impact_index.sync_from_session(session, self._node_label)
+            self._impact_index.write_summaries(session, self._node_label, changed)
 
     def _create_constraint(self, session):
         cypher_query = (
             f"CREATE CONSTRAINT {self._node_label}UniqueConstraints IF NOT EXISTS FOR (label:{self._node_label}) "
             f"REQUIRE ({', '.join(f'label.{prop}' for prop in self._unique_properties)}) IS NODE KEY"
         )
-        session.run(cypher_query)
+        with metrics.phase(SERVICE, "constraints"):
+            session.run(cypher_query).consume()
 
 
 if __name__ == "__main__":
     device_details_location = "https://raw.githubusercontent.com/jaganmithran99/Neo4j_Aura_POC/main/artifacts/device_details_csv.csv"
     relationship_location = "https://raw.githubusercontent.com/jaganmithran99/Neo4j_Aura_POC/main/artifacts/relationship_details_csv.csv"
+    configure_metrics(enabled=True, exporters=[JsonLinesExporter()])
     obj = BulkImportTopologyWithRelationsService()
     obj.bulk_import(device_file_path=device_details_location, rel_file_path=relationship_location)
+    metrics.flush()
@@ -0,0 +1,86 @@
+import os
+from typing import Dict, Iterator, List
+
+import numpy as np
+import pandas as pd
+
+from topology_readers import DEFAULT_CHUNK_SIZE, DEVICE_FIELD_MAPPINGS, RELATIONSHIP_KEY_FIELDS, iter_file_frames
+
+_HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+# byte offsets of the 16 uuid bytes inside the 36 character text form
+_UUID_HEX_POSITIONS = np.array([0, 2, 4, 6, 9, 11, 14, 16, 19, 21, 24, 26, 28, 30, 32, 34])
+
+
+def uuid4_strings(count: int) -> np.ndarray:
+    # RFC 4122 version 4 UUIDs formatted as text without a python loop: random bytes, version and variant
+    # bits, then the hex digits are written straight into a (count, 36) byte matrix
+    raw = np.frombuffer(os.urandom(16 * count), dtype=np.uint8).reshape(count, 16).copy()
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+    text = np.full((count, 36), ord("-"), dtype=np.uint8)
+    text[:, _UUID_HEX_POSITIONS] = _HEX_DIGITS[raw >> 4]
+    text[:, _UUID_HEX_POSITIONS + 1] = _HEX_DIGITS[raw & 0x0F]
+    return text.view("S36").ravel().astype(str)
+
+
+class DeviceBatch:
+    __slots__ = ("columns", "size")
+
+    # device rows as one list per AIOps field; the mapping rename is a column selection, not a per-row loop
+    def __init__(self, columns: Dict[str, list], size: int):
+        self.columns = columns
+        self.size = size
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame) -> "DeviceBatch":
+        columns = {aiops_key: frame[ip_key].tolist() for aiops_key, ip_key in DEVICE_FIELD_MAPPINGS.items()
+                   if ip_key in frame.columns}
+        columns["internalAssetId"] = uuid4_strings(len(frame)).tolist()
+        return cls(columns, len(frame))
+
+    def property_keys(self) -> List[str]:
+        return [key for key in self.columns if key != "assetName"]
+
+    def parameters(self) -> dict:
+        return {"count": self.size, "columns": self.columns}
+
+
+class RelationshipBatch:
+    __slots__ = ("rel_type_name", "source_asset_ids", "target_asset_ids", "properties", "size")
+
+    # relationships of one type: endpoint id lists plus one list per property column
+    def __init__(self, rel_type_name: str, source_asset_ids: list, target_asset_ids: list,
+                 properties: Dict[str, list]):
+        self.rel_type_name = rel_type_name
+        self.source_asset_ids = source_asset_ids
+        self.target_asset_ids = target_asset_ids
+        self.properties = properties
+        self.size = len(source_asset_ids)
+
+    @classmethod
+    def split_frame(cls, frame: pd.DataFrame, batch_size: int) -> Iterator["RelationshipBatch"]:
+        rel_type_field, source_field, target_field = RELATIONSHIP_KEY_FIELDS
+        property_fields = [column for column in frame.columns if column not in RELATIONSHIP_KEY_FIELDS]
+        for rel_type_name, group in frame.groupby(rel_type_field, sort=False):
+            for offset in range(0, len(group), batch_size):
+                part = group.iloc[offset:offset + batch_size]
+                yield cls(rel_type_name, part[source_field].tolist(), part[target_field].tolist(),
+                          {field: part[field].tolist() for field in property_fields})
+
+    def property_keys(self) -> List[str]:
+        return list(self.properties)
+
+    def parameters(self) -> dict:
+        # property columns are sent by position, their names only appear in the query's SET map
+        return {"count": self.size, "sources": self.source_asset_ids, "targets": self.target_asset_ids,
+                "properties": list(self.properties.values())}
+
+
+def iter_device_batches(file_path: str, batch_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[DeviceBatch]:
+    for frame in iter_file_frames(file_path, batch_size):
+        yield DeviceBatch.from_frame(frame)
+
+
+def iter_relationship_batches(file_path: str, batch_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[RelationshipBatch]:
+    for frame in iter_file_frames(file_path, batch_size):
+        yield from RelationshipBatch.split_frame(frame, batch_size)
@@ -1,3 +1,5 @@
+import time
+
 from neo4j import GraphDatabase
 from neo4j.exceptions import ServiceUnavailable, AuthError
 
@@ -6,20 +8,55 @@ username = "neo4j"
 password = "password"
 
 
-def check_connection(uri, username, password):
+def check_readiness(driver, database=None):
+    start = time.perf_counter()
     try:
-        driver = GraphDatabase.driver(uri, auth=(username, password))
-        with driver.session() as session:
-            result = session.run("RETURN 'Connection Successful' AS message")
-            for record in result:
-                print(record["message"])
-        driver.close()
+        with driver.session(database=database) as session:
+            record = session.run("RETURN 'Connection Successful' AS message").single()
+        latency_ms = (time.perf_counter() - start) * 1000
+        return {"ready": True, "latencyMs": latency_ms, "message": record["message"] if record else None}
     except ServiceUnavailable as e:
-        print(f"ServiceUnavailable: {e}")
+        error = f"ServiceUnavailable: {e}"
     except AuthError as e:
-        print(f"AuthError: {e}")
+        error = f"AuthError: {e}"
+    except Exception as e:
+        error = f"An error occurred: {e}"
+    latency_ms = (time.perf_counter() - start) * 1000
+    return {"ready": False, "latencyMs": latency_ms, "error": error}
+
+
+async def check_readiness_async(driver, database=None):
+    start = time.perf_counter()
+    try:
+        async with driver.session(database=database) as session:
+            result = await session.run("RETURN 'Connection Successful' AS message")
+            record = await result.single()
+        latency_ms = (time.perf_counter() - start) * 1000
+        return {"ready": True, "latencyMs": latency_ms, "message": record["message"] if record else None}
+    except ServiceUnavailable as e:
+        error = f"ServiceUnavailable: {e}"
+    except AuthError as e:
+        error = f"AuthError: {e}"
+    except Exception as e:
+        error = f"An error occurred: {e}"
+    latency_ms = (time.perf_counter() - start) * 1000
+    return {"ready": False, "latencyMs": latency_ms, "error": error}
+
+
+def check_connection(uri, username, password):
+    try:
+        driver = GraphDatabase.driver(uri, auth=(username, password))
     except Exception as e:
         print(f"An error occurred: {e}")
+        return
+    readiness = check_readiness(driver)
+    if readiness["ready"]:
+        print(readiness["message"])
+        print(f"Round trip latency: {readiness['latencyMs']:.2f} ms")
+    else:
+        print(readiness["error"])
+    driver.close()
 
 
-check_connection(uri, username, password)
+if __name__ == "__main__":
+    check_connection(uri, username, password)
@@ -0,0 +1,237 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, Optional
+
+from neo4j import AsyncGraphDatabase, GraphDatabase
+
+from conn_test import check_readiness, check_readiness_async
+
+logger_tag = "[DRIVER-MANAGER] "
+
+neo4j_uname = "neo4j"  # replace with correct value
+neo4j_pwd = "password"
+neo4j_uri = "uri"
+
+DEFAULT_MAX_POOL_SIZE = 50
+DEFAULT_ACQUISITION_TIMEOUT = 60.0
+
+
+class DriverManager:
+
+    def __init__(self, uri: str, username: str, password: str, *, max_pool_size: int = DEFAULT_MAX_POOL_SIZE,
+                 acquisition_timeout: float = DEFAULT_ACQUISITION_TIMEOUT,
+                 driver_factory: Callable = GraphDatabase.driver):
+        if not (uri and username and password):
+            raise RuntimeError("Driver not initialized")
+        if max_pool_size < 1:
+            raise ValueError("max_pool_size must be at least 1")
+        self._uri = uri
+        self._auth = (username, password)
+        self._max_pool_size = max_pool_size
+        self._acquisition_timeout = acquisition_timeout
+        self._driver_factory = driver_factory
+        self._driver = None
+        self._driver_lock = threading.Lock()
+        # one session holds at most one pooled connection, so capping sessions at the pool size turns pool
+        # exhaustion into a measurable wait here instead of an opaque stall inside the driver
+        self._slots = threading.BoundedSemaphore(max_pool_size)
+        self._metrics_lock = threading.Lock()
+        # session counts, not pool connections: the driver does not expose how many pooled connections are idle
+        self._sessions_in_use = 0
+        self._peak_sessions = 0
+        self._acquisitions = 0
+        self._acquisition_timeouts = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+
+    @property
+    def driver(self):
+        if self._driver is None:
+            with self._driver_lock:
+                if self._driver is None:
+                    start = time.time()
+                    self._driver = self._driver_factory(
+                        self._uri, auth=self._auth, max_connection_pool_size=self._max_pool_size,
+                        connection_acquisition_timeout=self._acquisition_timeout)
+                    end = time.time()
+                    print("Time taken for initializing driver: " + str(end - start))
+        return self._driver
+
+    @contextmanager
+    def session(self, **config):
+        driver = self.driver
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self._acquisition_timeout):
+            self._acquisition_timed_out()
+        self._acquired(time.perf_counter() - start)
+        try:
+            with driver.session(**config) as session:
+                yield session
+        finally:
+            self._released()
+            self._slots.release()
+
+    def _acquisition_timed_out(self):
+        with self._metrics_lock:
+            self._acquisition_timeouts += 1
+        raise RuntimeError(f"Timed out after {self._acquisition_timeout}s waiting for a pooled connection")
+
+    def _acquired(self, waited: float):
+        with self._metrics_lock:
+            self._sessions_in_use += 1
+            self._peak_sessions = max(self._peak_sessions, self._sessions_in_use)
+            self._acquisitions += 1
+            self._wait_time_total += waited
+            self._wait_time_max = max(self._wait_time_max, waited)
+
+    def _released(self):
+        with self._metrics_lock:
+            self._sessions_in_use -= 1
+
+    def warm_up(self, connections: Optional[int] = None, database: Optional[str] = None) -> float:
+        connections = min(connections or self._max_pool_size, self._max_pool_size)
+        start = time.time()
+        self.driver.verify_connectivity()
+
+        def _ping(_):
+            with self.session(database=database) as session:
+                session.run("RETURN 1").consume()
+
+        # sessions run concurrently so the driver has to open one pooled connection per worker
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            list(executor.map(_ping, range(connections)))
+        end = time.time()
+        print(f"{logger_tag}warmed {connections} connections in " + str(end - start))
+        return end - start
+
+    def metrics(self) -> dict:
+        with self._metrics_lock:
+            return {
+                "maxPoolSize": self._max_pool_size,
+                "sessionsInUse": self._sessions_in_use,
+                "peakSessions": self._peak_sessions,
+                "acquisitions": self._acquisitions,
+                "acquisitionTimeouts": self._acquisition_timeouts,
+                "waitTimeTotal": self._wait_time_total,
+                "waitTimeMax": self._wait_time_max,
+                "waitTimeAvg": self._wait_time_total / self._acquisitions if self._acquisitions else 0.0
+            }
+
+    def check_readiness(self, database: Optional[str] = None) -> dict:
+        readiness = check_readiness(self, database=database)
+        readiness["pool"] = self.metrics()
+        return readiness
+
+    def close(self):
+        with self._driver_lock:
+            if self._driver is not None:
+                self._driver.close()
+                self._driver = None
+
+
+class AsyncDriverManager(DriverManager):
+    # asyncio counterpart over AsyncGraphDatabase; the session cap is an asyncio semaphore, so one manager
+    # belongs to one event loop
+
+    def __init__(self, uri: str, username: str, password: str, *, max_pool_size: int = DEFAULT_MAX_POOL_SIZE,
+                 acquisition_timeout: float = DEFAULT_ACQUISITION_TIMEOUT,
+                 driver_factory: Callable = AsyncGraphDatabase.driver):
+        super().__init__(uri, username, password, max_pool_size=max_pool_size,
+                         acquisition_timeout=acquisition_timeout, driver_factory=driver_factory)
+        self._slots = asyncio.BoundedSemaphore(max_pool_size)
+
+    @asynccontextmanager
+    async def session(self, **config):
+        driver = self.driver
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self._acquisition_timeout)
+        except asyncio.TimeoutError:
+            self._acquisition_timed_out()
+        self._acquired(time.perf_counter() - start)
+        try:
+            async with driver.session(**config) as session:
+                yield session
+        finally:
+            self._released()
+            self._slots.release()
+
+    async def warm_up(self, connections: Optional[int] = None, database: Optional[str] = None) -> float:
+        connections = min(connections or self._max_pool_size, self._max_pool_size)
+        start = time.time()
+        await self.driver.verify_connectivity()
+
+        async def _ping():
+            async with self.session(database=database) as session:
+                result = await session.run("RETURN 1")
+                await result.consume()
+
+        await asyncio.gather(*(_ping() for _ in range(connections)))
+        end = time.time()
+        print(f"{logger_tag}warmed {connections} async connections in " + str(end - start))
+        return end - start
+
+    async def check_readiness(self, database: Optional[str] = None) -> dict:
+        readiness = await check_readiness_async(self, database=database)
+        readiness["pool"] = self.metrics()
+        return readiness
+
+    async def close(self):
+        with self._driver_lock:
+            driver, self._driver = self._driver, None
+        if driver is not None:
+            await driver.close()
+
+
+_manager: Optional[DriverManager] = None
+_manager_lock = threading.Lock()
+_async_manager: Optional[AsyncDriverManager] = None
+
+
+def configure_driver_manager(**kwargs) -> DriverManager:
+    global _manager
+    with _manager_lock:
+        if _manager is not None:
+            _manager.close()
+        kwargs.setdefault("uri", neo4j_uri)
+        kwargs.setdefault("username", neo4j_uname)
+        kwargs.setdefault("password", neo4j_pwd)
+        _manager = DriverManager(**kwargs)
+        return _manager
+
+
+def get_driver_manager() -> DriverManager:
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = DriverManager(neo4j_uri, neo4j_uname, neo4j_pwd)
+    return _manager
+
+
+async def configure_async_driver_manager(**kwargs) -> AsyncDriverManager:
+    global _async_manager
+    if _async_manager is not None:
+        await _async_manager.close()
+    kwargs.setdefault("uri", neo4j_uri)
+    kwargs.setdefault("username", neo4j_uname)
+    kwargs.setdefault("password", neo4j_pwd)
+    _async_manager = AsyncDriverManager(**kwargs)
+    return _async_manager
+
+
+def get_async_driver_manager() -> AsyncDriverManager:
+    global _async_manager
+    if _async_manager is None:
+        _async_manager = AsyncDriverManager(neo4j_uri, neo4j_uname, neo4j_pwd)
+    return _async_manager
+
+
+if __name__ == "__main__":
+    manager = get_driver_manager()
+    manager.warm_up(connections=10)
+    print(manager.check_readiness())
+    manager.close()
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import sqlite3
+from typing import Iterator, List, Set, Tuple
+
+EXCLUDED_NODE_FIELDS = ("internalAssetId",)
+
+
+def fingerprint(properties: dict, excluded=()) -> str:
+    payload = {key: value for key, value in properties.items() if key not in excluded}
+    encoded = json.dumps(payload, sort_keys=True, default=str, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha1(encoded).hexdigest()
+
+
+def edge_key(source_asset_id, target_asset_id, rel_type_name) -> str:
+    return json.dumps([source_asset_id, target_asset_id, rel_type_name], default=str, separators=(",", ":"))
+
+
+class FingerprintStore:
+    # local sqlite store of what the last runs wrote: asset id -> content hash (+ internalAssetId) and
+    # edge key -> content hash; every row touched by a run is stamped with that run id. Asset id columns
+    # have no declared type so ids keep the type they have in the graph (string from CSV, int from XLSX)
+
+    def __init__(self, path: str):
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS nodes (
+                asset_id PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                internal_asset_id TEXT,
+                seen_run INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS edges (
+                edge_key TEXT PRIMARY KEY,
+                source_asset_id NOT NULL,
+                target_asset_id NOT NULL,
+                rel_type TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                seen_run INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                completed INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+        self._connection.commit()
+
+    def begin_run(self) -> int:
+        cursor = self._connection.execute("INSERT INTO runs (completed) VALUES (0)")
+        self._connection.commit()
+        return cursor.lastrowid
+
+    def complete_run(self, run_id: int):
+        self._connection.execute("UPDATE runs SET completed = 1 WHERE run_id = ?", (run_id,))
+        self._connection.commit()
+
+    def classify_nodes(self, run_id: int, items: List[dict]) -> Tuple[List[dict], int]:
+        changed = []
+        skipped = 0
+        for item in items:
+            asset_id = item.get("assetId")
+            digest = fingerprint(item, EXCLUDED_NODE_FIELDS)
+            stored = self._connection.execute(
+                "SELECT fingerprint, internal_asset_id FROM nodes WHERE asset_id = ?", (asset_id,)).fetchone()
+            if stored is not None and stored[0] == digest:
+                skipped += 1
+                self._connection.execute("UPDATE nodes SET seen_run = ? WHERE asset_id = ?", (run_id, asset_id))
+                continue
+            if stored is not None and stored[1]:
+                item = {**item, "internalAssetId": stored[1]}
+            changed.append(item)
+        self._connection.commit()
+        return changed, skipped
+
+    def record_nodes(self, run_id: int, items: List[dict], internal_asset_ids: dict):
+        self._connection.executemany(
+            "INSERT INTO nodes (asset_id, fingerprint, internal_asset_id, seen_run) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(asset_id) DO UPDATE SET fingerprint = excluded.fingerprint, "
+            "internal_asset_id = excluded.internal_asset_id, seen_run = excluded.seen_run",
+            [(item.get("assetId"), fingerprint(item, EXCLUDED_NODE_FIELDS),
+              internal_asset_ids.get(item.get("assetId"), item.get("internalAssetId")), run_id)
+             for item in items])
+        self._connection.commit()
+
+    def classify_edges(self, run_id: int, rel_type_name: str, rows: List[dict]) -> Tuple[List[dict], int]:
+        changed = []
+        skipped = 0
+        for row in rows:
+            key = edge_key(row["source_asset_id"], row["target_asset_id"], rel_type_name)
+            stored = self._connection.execute("SELECT fingerprint FROM edges WHERE edge_key = ?", (key,)).fetchone()
+            if stored is not None and stored[0] == fingerprint(row["properties"]):
+                skipped += 1
+                self._connection.execute("UPDATE edges SET seen_run = ? WHERE edge_key = ?", (run_id, key))
+                continue
+            changed.append(row)
+        self._connection.commit()
+        return changed, skipped
+
+    def record_edges(self, run_id: int, rel_type_name: str, rows: List[dict], written: Set[tuple]):
+        # only the (source, target) pairs the write actually matched; the others stay unrecorded, so they are
+        # classified as changed again once their endpoints exist
+        rows = [row for row in rows if (row["source_asset_id"], row["target_asset_id"]) in written]
+        self._connection.executemany(
+            "INSERT INTO edges (edge_key, source_asset_id, target_asset_id, rel_type, fingerprint, seen_run) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(edge_key) DO UPDATE SET fingerprint = excluded.fingerprint, seen_run = excluded.seen_run",
+            [(edge_key(row["source_asset_id"], row["target_asset_id"], rel_type_name), row["source_asset_id"],
+              row["target_asset_id"], rel_type_name, fingerprint(row["properties"]), run_id) for row in rows])
+        self._connection.commit()
+
+    def iter_unseen_nodes(self, run_id: int, batch_size: int) -> Iterator[List[str]]:
+        cursor = self._connection.execute("SELECT asset_id FROM nodes WHERE seen_run <> ?", (run_id,))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield [row[0] for row in rows]
+
+    def iter_unseen_edges(self, run_id: int, batch_size: int) -> Iterator[List[tuple]]:
+        cursor = self._connection.execute(
+            "SELECT source_asset_id, target_asset_id, rel_type FROM edges WHERE seen_run <> ?", (run_id,))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield rows
+
+    def forget_unseen(self, run_id: int):
+        # DETACH DELETE also drops relationships still listed in the input, forget those too so they are
+        # written again if the node comes back
+        self._connection.execute(
+            "DELETE FROM edges WHERE seen_run <> ? "
+            "OR source_asset_id IN (SELECT asset_id FROM nodes WHERE seen_run <> ?) "
+            "OR target_asset_id IN (SELECT asset_id FROM nodes WHERE seen_run <> ?)", (run_id, run_id, run_id))
+        self._connection.execute("DELETE FROM nodes WHERE seen_run <> ?", (run_id,))
+        self._connection.commit()
+
+    def close(self):
+        self._connection.close()
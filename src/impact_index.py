@@ -0,0 +1,346 @@
+import json
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from neo4j import READ_ACCESS
+
+from instrumentation import metrics
+
+logger_tag = "[IMPACT-INDEX] "
+
+SERVICE = "impact"
+
+OUTGOING = "outgoing"
+INCOMING = "incoming"
+DIRECTIONS = (OUTGOING, INCOMING)
+
+DEFAULT_IMPACT_DEPTH = 3
+# above this share of dirty seeds a full rebuild is cheaper than one BFS per seed
+DEFAULT_REBUILD_FRACTION = 0.25
+DEFAULT_WRITE_BATCH_SIZE = 1000
+
+CRITICALITY_RANKS = {"Low": 1, "Medium": 2, "High": 3, "Critical": 4}
+
+SUMMARY_PROPERTY = "impactSummary"
+
+
+class ImpactIndex:
+    # k-hop neighbourhood summary per asset, keyed by assetId: per direction the number of assets first
+    # reached at each depth, over all relationship types and over paths of a single type, plus the highest
+    # businessCriticality within k hops. Mutations only mark seeds; refresh() recomputes the summaries of the
+    # assets whose k-hop neighbourhood can contain a seed, so an impact lookup never traverses the graph
+
+    def __init__(self, depth: int = DEFAULT_IMPACT_DEPTH, rebuild_fraction: float = DEFAULT_REBUILD_FRACTION):
+        if depth < 1:
+            raise ValueError("depth must be at least 1")
+        self.depth = depth
+        self._rebuild_fraction = rebuild_fraction
+        self._names: Dict[str, str] = {}
+        self._asset_ids_by_name: Dict[str, str] = {}
+        self._criticality: Dict[str, int] = {}
+        # direction -> asset -> relationship type -> neighbours
+        self._adjacency: Dict[str, Dict[str, Dict[str, Set[str]]]] = {OUTGOING: {}, INCOMING: {}}
+        self._summaries: Dict[str, dict] = {}
+        # assets whose summary has to be recomputed, and seeds whose surroundings have to be found first
+        self._dirty: Set[str] = set()
+        self._seeds: Dict[str, Set[str]] = {OUTGOING: set(), INCOMING: set()}
+        self._criticality_seeds: Set[str] = set()
+        # label of the graph the index was last synced from; until then it only knows what it was given
+        self._synced_label: Optional[str] = None
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, asset_id):
+        return asset_id in self._names
+
+    def is_synced(self, node_label: str) -> bool:
+        return self._synced_label == node_label
+
+    # mutations
+
+    def upsert_node(self, asset_id, name=None, criticality=None):
+        if asset_id is None:
+            return
+        if asset_id not in self._names:
+            self._names[asset_id] = name
+            self._dirty.add(asset_id)
+        elif name is not None and self._names[asset_id] != name:
+            self._asset_ids_by_name.pop(self._names[asset_id], None)
+            self._names[asset_id] = name
+        if name is not None:
+            self._asset_ids_by_name[name] = asset_id
+        rank = CRITICALITY_RANKS.get(criticality, 0)
+        if self._criticality.get(asset_id, 0) != rank:
+            self._criticality[asset_id] = rank
+            # every asset that has this one within k hops reports its criticality
+            self._criticality_seeds.add(asset_id)
+
+    def upsert_nodes(self, items: Iterable[dict]):
+        # rows as convert_to_aiops_fields returns them
+        for item in items:
+            self.upsert_node(item.get("assetId"), item.get("assetName"), item.get("businessCriticality"))
+
+    def remove_node(self, asset_id):
+        if asset_id not in self._names:
+            return
+        # the neighbourhoods that contain the asset are only reachable while it is still connected
+        self._dirty.update(self._within(asset_id, INCOMING, self.depth))
+        self._dirty.update(self._within(asset_id, OUTGOING, self.depth))
+        for direction, opposite in ((OUTGOING, INCOMING), (INCOMING, OUTGOING)):
+            for rel_type_name, neighbours in self._adjacency[direction].pop(asset_id, {}).items():
+                for neighbour in neighbours:
+                    self._discard(opposite, neighbour, rel_type_name, asset_id)
+        name = self._names.pop(asset_id)
+        if self._asset_ids_by_name.get(name) == asset_id:
+            del self._asset_ids_by_name[name]
+        self._criticality.pop(asset_id, None)
+        self._summaries.pop(asset_id, None)
+        self._dirty.discard(asset_id)
+        for seeds in self._seeds.values():
+            seeds.discard(asset_id)
+        self._criticality_seeds.discard(asset_id)
+
+    def add_edge(self, source, target, rel_type_name) -> bool:
+        # MATCH on both ends, like the import: an edge to an unknown asset is dropped
+        if source not in self._names or target not in self._names or not rel_type_name:
+            return False
+        neighbours = self._adjacency[OUTGOING].setdefault(source, {}).setdefault(rel_type_name, set())
+        if target in neighbours:
+            return False
+        neighbours.add(target)
+        self._adjacency[INCOMING].setdefault(target, {}).setdefault(rel_type_name, set()).add(source)
+        self._mark_edge(source, target)
+        return True
+
+    def remove_edge(self, source, target, rel_type_name) -> bool:
+        if target not in self._adjacency[OUTGOING].get(source, {}).get(rel_type_name, ()):
+            return False
+        self._discard(OUTGOING, source, rel_type_name, target)
+        self._discard(INCOMING, target, rel_type_name, source)
+        self._mark_edge(source, target)
+        return True
+
+    def add_relationship_rows(self, items: Iterable[dict]):
+        # raw relationship rows, as iter_relationship_chunks returns them
+        for item in items:
+            self.add_edge(item.get('Source Asset ID'), item.get('Target Asset ID'), item.get('Relationship Type Name'))
+
+    def _discard(self, direction, asset_id, rel_type_name, neighbour):
+        by_type = self._adjacency[direction].get(asset_id)
+        if by_type is None or rel_type_name not in by_type:
+            return
+        by_type[rel_type_name].discard(neighbour)
+        if not by_type[rel_type_name]:
+            del by_type[rel_type_name]
+        if not by_type:
+            del self._adjacency[direction][asset_id]
+
+    def _mark_edge(self, source, target):
+        # outgoing summaries change for the assets reaching the source within k-1 hops, incoming summaries
+        # for the assets the target reaches within k-1 hops; a path reaching either end never needs the
+        # edge itself, so this holds before and after the edge is added or removed
+        self._seeds[OUTGOING].add(source)
+        self._seeds[INCOMING].add(target)
+
+    # computation
+
+    def _neighbours(self, asset_id, direction, rel_type_name=None):
+        by_type = self._adjacency[direction].get(asset_id)
+        if not by_type:
+            return ()
+        if rel_type_name is not None:
+            return by_type.get(rel_type_name, ())
+        if len(by_type) == 1:
+            return next(iter(by_type.values()))
+        return set().union(*by_type.values())
+
+    def _levels(self, asset_id, direction, depth, rel_type_name=None) -> List[Set[str]]:
+        # breadth first: level d holds the assets first reached at depth d
+        visited = {asset_id}
+        frontier = [asset_id]
+        levels = []
+        for _ in range(depth):
+            level = set()
+            for node in frontier:
+                for neighbour in self._neighbours(node, direction, rel_type_name):
+                    if neighbour not in visited:
+                        visited.add(neighbour)
+                        level.add(neighbour)
+            if not level:
+                break
+            levels.append(level)
+            frontier = level
+        return levels
+
+    def _within(self, asset_id, direction, depth) -> Set[str]:
+        reached = {asset_id}
+        for level in self._levels(asset_id, direction, depth):
+            reached.update(level)
+        return reached
+
+    def _compute(self, asset_id) -> dict:
+        summary = {"depth": self.depth}
+        for direction in DIRECTIONS:
+            levels = self._levels(asset_id, direction, self.depth)
+            max_rank = max((self._criticality.get(node, 0) for level in levels for node in level), default=0)
+            by_type = {}
+            for rel_type_name in sorted(self._adjacency[direction].get(asset_id, {})):
+                by_type[rel_type_name] = _counts(self._levels(asset_id, direction, self.depth, rel_type_name),
+                                                 self.depth)
+            summary[direction] = {"reachable": _counts(levels, self.depth), "byType": by_type,
+                                  "maxCriticality": _criticality_name(max_rank)}
+        return summary
+
+    def _affected(self) -> Optional[Set[str]]:
+        seed_count = sum(len(seeds) for seeds in self._seeds.values()) + len(self._criticality_seeds)
+        if seed_count > self._rebuild_fraction * max(len(self._names), 1):
+            return None
+        affected = set(self._dirty)
+        # an outgoing seed is found by walking incoming edges from it and the other way round
+        for asset_id in self._seeds[OUTGOING]:
+            affected.update(self._within(asset_id, INCOMING, self.depth - 1))
+        for asset_id in self._seeds[INCOMING]:
+            affected.update(self._within(asset_id, OUTGOING, self.depth - 1))
+        # a criticality is seen from up to k hops away, one hop further than an edge
+        for asset_id in self._criticality_seeds:
+            affected.update(self._within(asset_id, INCOMING, self.depth))
+            affected.update(self._within(asset_id, OUTGOING, self.depth))
+        return {asset_id for asset_id in affected if asset_id in self._names}
+
+    def refresh(self, full: bool = False) -> Set[str]:
+        # recomputes every pending summary and returns the asset ids whose summary changed
+        start = time.time()
+        affected = None if full else self._affected()
+        full = affected is None
+        if full:
+            affected = set(self._names)
+        changed = set()
+        for asset_id in affected:
+            summary = self._compute(asset_id)
+            if self._summaries.get(asset_id) != summary:
+                self._summaries[asset_id] = summary
+                changed.add(asset_id)
+        self._dirty.clear()
+        for seeds in self._seeds.values():
+            seeds.clear()
+        self._criticality_seeds.clear()
+        end = time.time()
+        metrics.increment("impact_summaries_recomputed_total", len(affected), service=SERVICE,
+                          kind="rebuild" if full else "incremental")
+        if affected:
+            print(f"{logger_tag}recomputed {len(affected)} summaries ({'full' if full else 'incremental'}), "
+                  f"{len(changed)} changed in " + str(end - start))
+        return changed
+
+    def rebuild(self) -> Set[str]:
+        return self.refresh(full=True)
+
+    # lookups
+
+    def summary(self, asset_id) -> Optional[dict]:
+        return self._summaries.get(asset_id)
+
+    def summary_for_name(self, asset_name) -> Optional[dict]:
+        return self._summaries.get(self._asset_ids_by_name.get(asset_name))
+
+    def check_consistency(self) -> dict:
+        # compares the maintained summaries with a recomputation from scratch
+        mismatches = [asset_id for asset_id in self._names if self._summaries.get(asset_id) != self._compute(asset_id)]
+        stale = [asset_id for asset_id in self._summaries if asset_id not in self._names]
+        return {"checked": len(self._names), "consistent": not mismatches and not stale,
+                "mismatches": mismatches, "stale": stale}
+
+    # persistence
+
+    @classmethod
+    def from_driver(cls, driver, node_label: str, depth: int = DEFAULT_IMPACT_DEPTH,
+                    database: Optional[str] = None) -> "ImpactIndex":
+        index = cls(depth)
+        index.sync_from_driver(driver, node_label, database)
+        return index
+
+    def sync_from_driver(self, driver, node_label: str, database: Optional[str] = None) -> Set[str]:
+        with driver.session(database=database, default_access_mode=READ_ACCESS) as session:
+            return self.sync_from_session(session, node_label)
+
+    def sync_from_session(self, session, node_label: str) -> Set[str]:
+        # makes the index match the graph in the database, for imports that run on the server (LOAD CSV);
+        # only the differences are applied, so refresh() still recomputes just their surroundings. Reads on
+        # the caller's session, a second one next to it can wait forever on a capped pool
+        nodes, edges = {}, set()
+        for record in session.run(f"MATCH (n:{node_label}) RETURN n.assetId AS assetId, n.assetName AS name, "
+                                  "n.businessCriticality AS criticality"):
+            nodes[record["assetId"]] = (record["name"], record["criticality"])
+        for record in session.run(f"MATCH (source:{node_label})-[r]->(target:{node_label}) "
+                                  "RETURN source.assetId AS source, target.assetId AS target, type(r) AS type"):
+            edges.add((record["source"], record["target"], record["type"]))
+        for asset_id in [asset_id for asset_id in self._names if asset_id not in nodes]:
+            self.remove_node(asset_id)
+        for source, by_type in list(self._adjacency[OUTGOING].items()):
+            for rel_type_name, targets in list(by_type.items()):
+                for target in [target for target in targets if (source, target, rel_type_name) not in edges]:
+                    self.remove_edge(source, target, rel_type_name)
+        for asset_id, (name, criticality) in nodes.items():
+            self.upsert_node(asset_id, name, criticality)
+        for source, target, rel_type_name in edges:
+            self.add_edge(source, target, rel_type_name)
+        self._synced_label = node_label
+        return self.refresh()
+
+    def write_summaries(self, session, node_label: str, asset_ids: Iterable,
+                        batch_size: int = DEFAULT_WRITE_BATCH_SIZE) -> int:
+        # stored as a JSON string, node properties cannot hold maps
+        cypher_query = (
+            "UNWIND $rows AS row "
+            f"MATCH (n:{node_label} {{assetId: row.asset_id}}) "
+            f"SET n.{SUMMARY_PROPERTY} = row.summary"
+        )
+        rows = [{"asset_id": asset_id, "summary": json.dumps(self._summaries[asset_id], sort_keys=True)}
+                for asset_id in asset_ids if asset_id in self._summaries]
+        for offset in range(0, len(rows), batch_size):
+            with metrics.query(SERVICE, "write_impact_summaries"):
+                session.execute_write(_run_rows_tx, cypher_query, rows[offset:offset + batch_size])
+        metrics.increment("topology_rows_total", len(rows), service=SERVICE, kind="impact_summaries")
+        return len(rows)
+
+    def check_persisted(self, driver, node_label: str, database: Optional[str] = None) -> dict:
+        # compares the summaries stored on the nodes with a full recomputation from the graph in the database
+        expected = ImpactIndex.from_driver(driver, node_label, self.depth, database)
+        mismatches = []
+        with driver.session(database=database, default_access_mode=READ_ACCESS) as session:
+            records = session.run(f"MATCH (n:{node_label}) RETURN n.assetId AS assetId, "
+                                  f"n.{SUMMARY_PROPERTY} AS summary")
+            for record in records:
+                stored = json.loads(record["summary"]) if record["summary"] else None
+                if stored != expected.summary(record["assetId"]):
+                    mismatches.append(record["assetId"])
+        return {"checked": len(expected), "consistent": not mismatches, "mismatches": mismatches}
+
+
+def _run_rows_tx(tx, cypher_query, rows):
+    metrics.record_summary(SERVICE, tx.run(metrics.profiled(cypher_query), rows=rows).consume())
+
+
+def _counts(levels: List[Set[str]], depth: int) -> List[int]:
+    return [len(level) for level in levels] + [0] * (depth - len(levels))
+
+
+def _criticality_name(rank: int) -> Optional[str]:
+    for name, name_rank in CRITICALITY_RANKS.items():
+        if name_rank == rank:
+            return name
+    return None
+
+
+if __name__ == "__main__":
+    from topology_readers import iter_device_chunks, iter_relationship_chunks
+
+    index = ImpactIndex()
+    for chunk in iter_device_chunks("../artifacts/5k/device_details_5k_csv.csv"):
+        index.upsert_nodes(chunk)
+    for chunk in iter_relationship_chunks("../artifacts/5k/relationships_5k_csv.csv"):
+        index.add_relationship_rows(chunk)
+    index.refresh()
+    print(index.summary_for_name("Device7"))
+    print(f"{logger_tag}consistent: {index.check_consistency()['consistent']}")
@@ -0,0 +1,235 @@
+import hashlib
+import itertools
+import json
+import os
+import random
+import time
+from typing import Callable, Iterable, List, Optional
+
+from neo4j import WRITE_ACCESS
+from neo4j.exceptions import DriverError, Neo4jError
+
+from instrumentation import metrics
+
+logger_tag = "[IMPORT-CONTROLLER] "
+
+DEFAULT_INITIAL_BATCH_SIZE = 1000
+DEFAULT_MIN_BATCH_SIZE = 50
+DEFAULT_MAX_BATCH_SIZE = 20000
+DEFAULT_TARGET_COMMIT_SECONDS = 1.0
+DEFAULT_MAX_RETRIES = 5
+
+# errors that mean the transaction was too big for the server rather than unlucky: the batch is split
+# instead of replayed as it is
+_OVERSIZED_BATCH_CODES = ("OutOfMemory", "MemoryLimit", "TransactionTimedOut")
+
+
+def is_oversized_batch_error(exc: BaseException) -> bool:
+    code = getattr(exc, "code", None) or ""
+    return any(marker in code for marker in _OVERSIZED_BATCH_CODES)
+
+
+def is_retryable_error(exc: BaseException) -> bool:
+    if is_oversized_batch_error(exc):
+        return True
+    return isinstance(exc, (Neo4jError, DriverError)) and exc.is_retryable()
+
+
+def input_signature(*paths) -> str:
+    # identifies the input of a checkpoint, so a checkpoint left by another file is never resumed
+    digest = hashlib.sha1()
+    for path in paths:
+        if path is None:
+            continue
+        stat = os.stat(path)
+        digest.update(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns};".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class AdaptiveBatchSizer:
+    # multiplicative increase/decrease on the observed commit latency: batches grow while commits stay well
+    # under the target, shrink when a commit is slower than the target or the server runs out of memory
+
+    def __init__(self, initial: int = DEFAULT_INITIAL_BATCH_SIZE, min_size: int = DEFAULT_MIN_BATCH_SIZE,
+                 max_size: int = DEFAULT_MAX_BATCH_SIZE, target_seconds: float = DEFAULT_TARGET_COMMIT_SECONDS,
+                 growth: float = 1.5, shrink: float = 0.5):
+        if not 1 <= min_size <= max_size:
+            raise ValueError("batch size bounds must satisfy 1 <= min_size <= max_size")
+        if target_seconds <= 0:
+            raise ValueError("target_seconds must be positive")
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_seconds = target_seconds
+        self._growth = growth
+        self._shrink = shrink
+        # largest size batches may grow to; lowered below every batch the server rejected as too large
+        self._ceiling = max_size
+        self.size = self._clamp(initial)
+
+    def _clamp(self, size) -> int:
+        return max(self.min_size, min(self._ceiling, int(size)))
+
+    def observe(self, rows: int, seconds: float):
+        if seconds > self.target_seconds:
+            self.size = self._clamp(self.size * self._shrink)
+        elif seconds < self.target_seconds / 2 and rows >= self.size:
+            # a short tail batch says nothing about how a full one would do
+            self.size = self._clamp(self.size * self._growth)
+
+    def shrink(self, rejected_rows: Optional[int] = None) -> bool:
+        if rejected_rows is not None:
+            # stay a tenth below the rejected size, so growing back does not hit the same limit right away
+            self._ceiling = max(self.min_size, min(self._ceiling, rejected_rows - max(1, rejected_rows // 10)))
+        size = self._clamp(self.size * self._shrink)
+        changed = size != self.size
+        self.size = size
+        return changed
+
+
+class ImportCheckpoint:
+    # rows committed per phase, written after every commit; the rows of a phase always arrive in the same
+    # order, so on resume the first `committed` rows of that phase are skipped
+
+    def __init__(self, path: str, signature: Optional[str] = None):
+        self._path = path
+        self._signature = signature
+        self._phases = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as checkpoint_file:
+                state = json.load(checkpoint_file)
+            if state.get("signature") == signature:
+                self._phases = state.get("phases", {})
+            else:
+                print(f"{logger_tag}ignoring checkpoint {path} written for a different input")
+
+    def committed(self, phase: str) -> int:
+        return self._phases.get(phase, 0)
+
+    def advance(self, phase: str, rows: int):
+        self._phases[phase] = self.committed(phase) + rows
+        tmp_path = f"{self._path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as checkpoint_file:
+            json.dump({"signature": self._signature, "phases": self._phases}, checkpoint_file)
+        # replace is atomic, an interruption leaves either the old or the new checkpoint
+        os.replace(tmp_path, self._path)
+
+    def complete(self):
+        self._phases = {}
+        if os.path.exists(self._path):
+            os.remove(self._path)
+
+
+class ImportController:
+    # drives one import: rows of each phase are cut into batches sized by the AdaptiveBatchSizer, every batch
+    # is one write transaction, replayed with jittered backoff on transient errors and split when the server
+    # reports it as too large. The write transactions have to be idempotent (MERGE) for replays and resumes
+
+    def __init__(self, driver, *, sizer: Optional[AdaptiveBatchSizer] = None,
+                 checkpoint: Optional[ImportCheckpoint] = None, max_retries: int = DEFAULT_MAX_RETRIES,
+                 base_delay: float = 0.05, max_delay: float = 2.0, service: str = "import"):
+        self._driver = driver
+        self.sizer = sizer or AdaptiveBatchSizer()
+        self.checkpoint = checkpoint
+        self._max_retries = max_retries
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._service = service
+        self.stats = {}
+
+    def _backoff(self, attempt: int):
+        time.sleep(min(self._base_delay * 2 ** attempt, self._max_delay) * (0.5 + random.random()))
+
+    def run(self, phase: str, rows: Iterable[dict], write_tx: Callable) -> dict:
+        skipped = self.checkpoint.committed(phase) if self.checkpoint else 0
+        iterator = itertools.islice(iter(rows), skipped, None)
+        stats = {"rows": 0, "batches": 0, "retries": 0, "splits": 0, "resumedAfter": skipped}
+        self.stats[phase] = stats
+        if skipped:
+            print(f"{logger_tag}resuming {phase} after {skipped} committed rows")
+        carry: List[dict] = []
+        while True:
+            size = self.sizer.size
+            batch = carry[:size]
+            carry = carry[size:]
+            batch.extend(itertools.islice(iterator, size - len(batch)))
+            if not batch:
+                break
+            split = self._write_batch(phase, batch, write_tx, stats)
+            if split:
+                # the rows beyond the shrunken size go back in front of the stream
+                carry = batch[split:] + carry
+                batch = batch[:split]
+            stats["rows"] += len(batch)
+            stats["batches"] += 1
+            if self.checkpoint:
+                self.checkpoint.advance(phase, len(batch))
+        stats["batchSize"] = self.sizer.size
+        metrics.increment("topology_batch_retries_total", stats["retries"], service=self._service)
+        return stats
+
+    def _write_batch(self, phase, batch, write_tx, stats) -> int:
+        # returns 0 when the whole batch was committed, otherwise how many of its leading rows were
+        attempt = 0
+        rows = batch
+        while True:
+            start = time.perf_counter()
+            try:
+                # an explicit transaction: a managed one (execute_write) replays memory errors and deadlocks
+                # inside the driver for up to max_transaction_retry_time, before the split or the backoff
+                # here ever see them
+                with self._driver.session(default_access_mode=WRITE_ACCESS) as session:
+                    with metrics.query(self._service, f"controlled_{phase}_batch"), \
+                            session.begin_transaction() as tx:
+                        write_tx(tx, rows)
+                        tx.commit()
+            except Exception as exc:
+                if not is_retryable_error(exc):
+                    raise
+                if is_oversized_batch_error(exc) and self.sizer.shrink(len(rows)):
+                    stats["splits"] += 1
+                    print(f"{logger_tag}{phase} batch of {len(rows)} rows too large ({exc.code}), "
+                          f"retrying with {self.sizer.size}")
+                    rows = rows[:self.sizer.size]
+                    continue
+                attempt += 1
+                stats["retries"] += 1
+                if attempt > self._max_retries:
+                    raise
+                print(f"{logger_tag}retrying {phase} batch of {len(rows)} rows after "
+                      f"{getattr(exc, 'code', None) or type(exc).__name__}")
+                self._backoff(attempt)
+                continue
+            self.sizer.observe(len(rows), time.perf_counter() - start)
+            metrics.increment("topology_rows_total", len(rows), service=self._service, kind=phase)
+            return len(rows) if len(rows) < len(batch) else 0
+
+    def complete(self):
+        if self.checkpoint:
+            self.checkpoint.complete()
+
+
+if __name__ == "__main__":
+    # resume drill on the fault-injecting stand-in: the first run crashes part way, the second one resumes
+    import driver_manager
+    from stand_in_driver import FaultInjectingDriver, SimulatedCrash
+    from topology_readers import iter_device_chunks, iter_relationship_chunks
+    from write_ws import ImportTopologyWithRelationsService
+
+    device_details_location = "../artifacts/5k/device_details_5k_csv.csv"
+    relationship_location = "../artifacts/5k/relationships_5k_csv.csv"
+    checkpoint_location = "import_checkpoint.json"
+    for crash_after_commits in (10, None):
+        manager = driver_manager.configure_driver_manager(
+            uri="stand-in://local", username="drill", password="drill",
+            driver_factory=lambda uri, **config: FaultInjectingDriver(
+                uri, transient_rate=0.05, max_batch_rows=1500, latency_per_row=0.00002,
+                crash_after_commits=crash_after_commits, **config))
+        checkpoint = ImportCheckpoint(checkpoint_location,
+                                      input_signature(device_details_location, relationship_location))
+        controller = ImportController(manager, sizer=AdaptiveBatchSizer(target_seconds=0.05), checkpoint=checkpoint)
+        try:
+            ImportTopologyWithRelationsService(project_id=60, controller=controller).process_input_stream(
+                iter_device_chunks(device_details_location), iter_relationship_chunks(relationship_location))
+        except SimulatedCrash as exc:
+            print(f"{logger_tag}{exc}")
+        print(f"{logger_tag}committed {manager.driver.committed_rows} rows: {controller.stats}")
@@ -0,0 +1,250 @@
+import json
+import sys
+import threading
+import time
+from typing import List, Optional
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+SUMMARY_COUNTERS = ("nodes_created", "nodes_deleted", "relationships_created", "relationships_deleted",
+                    "properties_set", "labels_added", "indexes_added", "constraints_added")
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Histogram:
+    __slots__ = ("buckets", "bucket_counts", "count", "total")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[index] += 1
+                break
+
+    def as_dict(self) -> dict:
+        cumulative = []
+        running = 0
+        for bucket_count in self.bucket_counts:
+            running += bucket_count
+            cumulative.append(running)
+        return {"count": self.count, "sum": self.total,
+                "buckets": {str(bound): value for bound, value in zip(self.buckets, cumulative)}}
+
+
+class _Span:
+    __slots__ = ("_registry", "_metric", "_labels", "_start")
+
+    def __init__(self, registry: "MetricsRegistry", metric: str, labels: tuple):
+        self._registry = registry
+        self._metric = metric
+        self._labels = labels
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        seconds = time.perf_counter() - self._start
+        self._registry._observe(self._metric, self._labels, seconds, failed=exc_type is not None)
+        return False
+
+
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _db_hits(profile) -> int:
+    if not profile:
+        return 0
+    return int(profile.get("dbHits", 0)) + sum(_db_hits(child) for child in profile.get("children", []))
+
+
+class MetricsRegistry:
+
+    def __init__(self, enabled: bool = False, exporters: Optional[list] = None, profile: bool = False):
+        self.enabled = enabled
+        # opt-in: instrumented queries run with PROFILE so their summaries carry db hits; profiling makes the
+        # server record every operator, so it is meant for diagnosis runs, not for production imports
+        self.profile = profile
+        self.exporters: list = exporters or []
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    def phase(self, service: str, phase: str):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, "topology_phase_seconds", _labels({"service": service, "phase": phase}))
+
+    def query(self, service: str, query: str):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, "topology_query_seconds", _labels({"service": service, "query": query}))
+
+    def profiled(self, cypher_query: str) -> str:
+        if not (self.enabled and self.profile):
+            return cypher_query
+        return "PROFILE " + cypher_query
+
+    def increment(self, metric: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = (metric, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def record_summary(self, service: str, summary):
+        if not self.enabled or summary is None:
+            return
+        counters = summary.counters
+        for counter in SUMMARY_COUNTERS:
+            value = getattr(counters, counter, 0)
+            if value:
+                self.increment("topology_server_counter_total", value, service=service, counter=counter)
+        db_hits = _db_hits(getattr(summary, "profile", None))
+        if db_hits:
+            self.increment("topology_db_hits_total", db_hits, service=service)
+
+    def _observe(self, metric: str, labels: tuple, seconds: float, failed: bool):
+        key = (metric, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+        if self.exporters:
+            event = {"type": "span", "metric": metric, "labels": dict(labels), "seconds": seconds,
+                     "failed": failed, "timestamp": time.time()}
+            for exporter in self.exporters:
+                exporter.export(event)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "histograms": [{"metric": metric, "labels": dict(labels), **histogram.as_dict()}
+                               for (metric, labels), histogram in self._histograms.items()],
+                "counters": [{"metric": metric, "labels": dict(labels), "value": value}
+                             for (metric, labels), value in self._counters.items()]
+            }
+
+    def flush(self):
+        snapshot = self.snapshot()
+        for exporter in self.exporters:
+            exporter.flush(snapshot)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+class InMemoryExporter:
+
+    def __init__(self):
+        self.events: List[dict] = []
+        self.snapshots: List[dict] = []
+
+    def export(self, event: dict):
+        self.events.append(event)
+
+    def flush(self, snapshot: dict):
+        self.snapshots.append(snapshot)
+
+
+class JsonLinesExporter:
+
+    def __init__(self, path: Optional[str] = None):
+        self._path = path
+        self._lock = threading.Lock()
+
+    def _write(self, payload: dict):
+        line = json.dumps(payload, default=str)
+        with self._lock:
+            if self._path is None:
+                print(line, file=sys.stdout)
+            else:
+                with open(self._path, "a") as output:
+                    output.write(line + "\n")
+
+    def export(self, event: dict):
+        self._write(event)
+
+    def flush(self, snapshot: dict):
+        self._write({"type": "snapshot", "timestamp": time.time(), **snapshot})
+
+
+def _prometheus_labels(labels: dict, extra: Optional[dict] = None) -> str:
+    merged = {**labels, **(extra or {})}
+    if not merged:
+        return ""
+    rendered = ",".join(
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in merged.items())
+    return "{" + rendered + "}"
+
+
+class PrometheusTextExporter:
+
+    def __init__(self, path: Optional[str] = None):
+        self._path = path
+        self.last_text = ""
+
+    def export(self, event: dict):
+        pass
+
+    @staticmethod
+    def render(snapshot: dict) -> str:
+        lines = []
+        for metric in sorted({histogram["metric"] for histogram in snapshot["histograms"]}):
+            lines.append(f"# TYPE {metric} histogram")
+            for histogram in snapshot["histograms"]:
+                if histogram["metric"] != metric:
+                    continue
+                for bound, value in histogram["buckets"].items():
+                    lines.append(f"{metric}_bucket{_prometheus_labels(histogram['labels'], {'le': bound})} {value}")
+                lines.append(f"{metric}_bucket{_prometheus_labels(histogram['labels'], {'le': '+Inf'})} "
+                             f"{histogram['count']}")
+                lines.append(f"{metric}_sum{_prometheus_labels(histogram['labels'])} {histogram['sum']}")
+                lines.append(f"{metric}_count{_prometheus_labels(histogram['labels'])} {histogram['count']}")
+        for metric in sorted({counter["metric"] for counter in snapshot["counters"]}):
+            lines.append(f"# TYPE {metric} counter")
+            for counter in snapshot["counters"]:
+                if counter["metric"] == metric:
+                    lines.append(f"{metric}{_prometheus_labels(counter['labels'])} {counter['value']}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self, snapshot: dict):
+        self.last_text = self.render(snapshot)
+        if self._path is not None:
+            with open(self._path, "w") as output:
+                output.write(self.last_text)
+
+
+metrics = MetricsRegistry()
+
+
+def configure_metrics(enabled: bool = True, exporters: Optional[list] = None,
+                      profile: bool = False) -> MetricsRegistry:
+    metrics.exporters = exporters or []
+    metrics.enabled = enabled
+    metrics.profile = profile
+    return metrics
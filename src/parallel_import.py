@@ -0,0 +1,176 @@
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from neo4j import WRITE_ACCESS
+
+from instrumentation import metrics
+
+logger_tag = "[PARALLEL-RELATIONSHIP-IMPORT] "
+
+
+def _bucket_of(asset_id, bucket_count: int) -> int:
+    return zlib.crc32(str(asset_id).encode("utf-8")) % bucket_count
+
+
+def relationship_bucket_pair(row: dict, bucket_count: int) -> tuple:
+    return tuple(sorted((_bucket_of(row["source_asset_id"], bucket_count),
+                         _bucket_of(row["target_asset_id"], bucket_count))))
+
+
+def _bucket_pair_rounds(bucket_count: int) -> List[List[tuple]]:
+    # round-robin (circle method) schedule: every round is a perfect matching of the buckets, so the
+    # partitions running together never share a bucket and therefore never share a node
+    buckets = list(range(bucket_count))
+    rounds = []
+    for _ in range(bucket_count - 1):
+        rounds.append([tuple(sorted((buckets[i], buckets[bucket_count - 1 - i]))) for i in range(bucket_count // 2)])
+        buckets = [buckets[0], buckets[-1]] + buckets[1:-1]
+    rounds.append([(bucket, bucket) for bucket in range(bucket_count)])
+    return rounds
+
+
+def _add_to_partitions(partitions: dict, rows_by_type: Dict[str, List[dict]], bucket_count: int):
+    for rel_type_name, rel_rows in rows_by_type.items():
+        for row in rel_rows:
+            key = relationship_bucket_pair(row, bucket_count)
+            partitions.setdefault(key, {}).setdefault(rel_type_name, []).append(row)
+
+
+def _scheduled_rounds(partitions: dict, bucket_count: int) -> List[List[dict]]:
+    rounds = []
+    for pairs in _bucket_pair_rounds(bucket_count):
+        round_partitions = [partitions[pair] for pair in pairs if pair in partitions]
+        if round_partitions:
+            rounds.append(round_partitions)
+    return rounds
+
+
+def partition_relationship_rows(rows_by_type: Dict[str, List[dict]], worker_count: int) -> List[List[dict]]:
+    # rounds of partitions; a partition holds every type of one bucket pair, type name -> rows
+    bucket_count = 2 * worker_count
+    partitions = {}
+    _add_to_partitions(partitions, rows_by_type, bucket_count)
+    return _scheduled_rounds(partitions, bucket_count)
+
+
+def partition_batches(partition: Dict[str, List[dict]], batch_size: int):
+    # cuts a partition into transactions of at most batch_size rows, each one holding all the types it covers
+    batch, size = {}, 0
+    for rel_type_name, rel_rows in partition.items():
+        offset = 0
+        while offset < len(rel_rows):
+            rows = rel_rows[offset:offset + batch_size - size]
+            batch.setdefault(rel_type_name, []).extend(rows)
+            offset += len(rows)
+            size += len(rows)
+            if size == batch_size:
+                yield batch
+                batch, size = {}, 0
+    if batch:
+        yield batch
+
+
+class ParallelRelationshipImporter:
+    # rows are buffered per bucket pair across add() calls and written round by round on flush(), so a stream
+    # of chunks pays for the round barriers once per buffer instead of once per chunk. write_tx(tx, rows_by_type)
+    # writes one transaction; it runs as a managed transaction, which the driver retries on deadlocks
+
+    def __init__(self, driver, write_tx: Callable, *, worker_count: int = 4, batch_size: int = 1000,
+                 buffer_rows: Optional[int] = None, service: str = "import"):
+        if worker_count < 1:
+            raise ValueError("worker_count must be at least 1")
+        self._driver = driver
+        self._write_tx = write_tx
+        self._worker_count = worker_count
+        self._bucket_count = 2 * worker_count
+        self._batch_size = batch_size
+        # enough rows for about one full transaction per bucket pair
+        pair_count = self._bucket_count * (self._bucket_count + 1) // 2
+        self._buffer_rows = buffer_rows or batch_size * pair_count
+        self._service = service
+        self._partitions = {}
+        self._buffered = 0
+        self.stats = {"workers": worker_count, "rows": 0, "transactions": 0, "rounds": 0, "seconds": 0.0,
+                      "rowsPerSecond": 0.0}
+
+    def _import_partition(self, partition):
+        transaction_count = 0
+        with self._driver.session(default_access_mode=WRITE_ACCESS) as session:
+            for batch in partition_batches(partition, self._batch_size):
+                with metrics.query(self._service, "merge_relationship_partition"):
+                    session.execute_write(self._write_tx, batch)
+                transaction_count += 1
+        return transaction_count
+
+    def add(self, rows_by_type: Dict[str, List[dict]]):
+        _add_to_partitions(self._partitions, rows_by_type, self._bucket_count)
+        self._buffered += sum(len(rel_rows) for rel_rows in rows_by_type.values())
+        if self._buffered >= self._buffer_rows:
+            self.flush()
+
+    def flush(self) -> dict:
+        if not self._buffered:
+            return self.stats
+        start = time.time()
+        rounds = _scheduled_rounds(self._partitions, self._bucket_count)
+        transaction_count = 0
+        with ThreadPoolExecutor(max_workers=self._worker_count) as executor:
+            for round_partitions in rounds:
+                transaction_count += sum(executor.map(self._import_partition, round_partitions))
+        self.stats["seconds"] += time.time() - start
+        self.stats["rows"] += self._buffered
+        self.stats["transactions"] += transaction_count
+        self.stats["rounds"] += len(rounds)
+        if self.stats["seconds"]:
+            self.stats["rowsPerSecond"] = self.stats["rows"] / self.stats["seconds"]
+        metrics.increment("topology_rows_total", self._buffered, service=self._service, kind="relationships")
+        self._partitions = {}
+        self._buffered = 0
+        return self.stats
+
+    def import_relationships(self, rows_by_type: Dict[str, List[dict]]) -> dict:
+        self.add(rows_by_type)
+        return self.flush()
+
+
+def thread_scaling_report(device_file: str, relationship_file: str, worker_counts=(1, 2, 4, 8),
+                          batch_size: int = 1000, reset_relationships: bool = False) -> List[dict]:
+    # reset_relationships deletes every relationship between nodes of the import label before each run, on
+    # the database the driver manager points at; without it the later runs merge onto the existing ones
+    from topology_readers import iter_device_chunks, iter_file_chunks
+    from write_ws import ImportTopologyWithRelationsService
+
+    loader = ImportTopologyWithRelationsService(project_id=0, batch_size=batch_size)
+    loader.process_input_stream(iter_device_chunks(device_file), [])
+
+    relationship_rows = [row for chunk in iter_file_chunks(relationship_file) for row in chunk]
+    report = []
+    for worker_count in worker_counts:
+        service = ImportTopologyWithRelationsService(project_id=0, relationship_data=relationship_rows,
+                                                     batch_size=batch_size, parallel_workers=worker_count)
+        if reset_relationships:
+            with service._driver.session(default_access_mode=WRITE_ACCESS) as session:
+                session.run(f"MATCH (:{service._node_label})-[r]->(:{service._node_label}) "
+                            "CALL { WITH r DELETE r } IN TRANSACTIONS OF 10000 ROWS").consume()
+        report.append(service._match_relationships_parallel())
+
+    print(f"{'workers':>8} {'rows':>8} {'seconds':>10} {'rows/sec':>12} {'txs':>8}")
+    for entry in report:
+        print(f"{entry['workers']:>8} {entry['rows']:>8} {entry['seconds']:>10.3f} "
+              f"{entry['rowsPerSecond']:>12.1f} {entry['transactions']:>8}")
+    return report
+
+
+if __name__ == "__main__":
+    datasets = {
+        "5k": ("../artifacts/5k/device_details_5k_csv.csv", "../artifacts/5k/relationships_5k_csv.csv"),
+        "10k": ("../artifacts/10k/device_details_10k_csv.csv", "../artifacts/10k/relationships_10k_csv.csv"),
+    }
+    for dataset, (device_file, relationship_file) in datasets.items():
+        try:
+            print(f"Dataset {dataset}")
+            thread_scaling_report(device_file, relationship_file)
+        except FileNotFoundError as exc:
+            print(f"{logger_tag}skipping dataset {dataset}: {exc}")
@@ -1,15 +1,222 @@
-import time
+import base64
+import json
 import traceback
+from functools import lru_cache
+from typing import Optional
 
-from neo4j import GraphDatabase, READ_ACCESS
+from neo4j import READ_ACCESS
+
+from driver_manager import get_driver_manager
+from impact_index import SUMMARY_PROPERTY
+from instrumentation import configure_metrics, JsonLinesExporter, metrics
+from result_cache import make_relation_key, relation_cache
 
 logger_tag = "[RETRIEVE-NODE-RELATIONS] "
 
+SERVICE = "retrieve"
+
+TRAVERSAL_PATHS = "paths"
+TRAVERSAL_FRONTIER = "frontier"
+TRAVERSAL_MODES = (TRAVERSAL_PATHS, TRAVERSAL_FRONTIER)
+
+DEFAULT_PAGE_SIZE = 100
+ROW_KEYS = ("relatedNode", "positionNumber", "relation", "relatedNodeProperties")
+
+
+def _normalize_direction(direction) -> str:
+    direction = (direction or "").lower()
+    return direction if direction in ("incoming", "outgoing") else "both"
+
+
+def _projection(variable: str, properties) -> str:
+    # None keeps every property; otherwise a map projection so only the requested keys leave the server
+    if properties is None:
+        return f"properties({variable})"
+    keys = ", ".join("." + "`" + str(key).replace("`", "``") + "`" for key in properties)
+    return f"{variable} {{{keys}}}"
+
+
+def _pattern(direction: str, source: str, relationship: str, target: str) -> str:
+    if direction == "incoming":
+        return f"({source})<-[{relationship}]-({target})"
+    if direction == "outgoing":
+        return f"({source})-[{relationship}]->({target})"
+    return f"({source})-[{relationship}]-({target})"
+
+
+@lru_cache(maxsize=32)
+def _frontier_query_templates(node_label: str, direction: str, properties) -> tuple:
+    start_query = f"MATCH (node:{node_label}) WHERE node.assetName = $assetName RETURN elementId(node) AS id"
+    expand_query = (
+        "UNWIND $frontier AS source_id "
+        "MATCH (source) WHERE elementId(source) = source_id "
+        f"MATCH {_pattern(direction, 'source', 'rel', 'related')} "
+        "WHERE $relation IS NULL OR type(rel) = $relation "
+        "RETURN elementId(related) AS id, related.name AS relatedNode, min(type(rel)) AS relation"
+    )
+    properties_query = (
+        "UNWIND $ids AS node_id "
+        "MATCH (related) WHERE elementId(related) = node_id "
+        f"RETURN node_id AS id, {_projection('related', properties)} AS relatedNodeProperties"
+    )
+    return start_query, expand_query, properties_query
+
+
+def _frontier_key(entry: dict) -> list:
+    name = entry["relatedNode"]
+    return [entry["positionNumber"], int(name is None), "" if name is None else str(name), entry["id"]]
+
+
+@lru_cache(maxsize=64)
+def _stream_query_template(node_label: str, direction: str, relation_level: str, properties, limited: bool) -> str:
+    # one record per path instead of one COLLECT()ed record per query, so the driver can pull it in batches
+    return (
+        f"MATCH p = {_pattern(direction, f'node:{node_label}', f'r*1..{relation_level}', 'related')} "
+        "WHERE node.assetName = $assetName AND ($relation IS NULL OR ALL(rel IN r WHERE type(rel) = $relation)) "
+        "WITH relationships(p) AS rels, related "
+        f"{'LIMIT $limit ' if limited else ''}"
+        "RETURN related.name AS relatedNode, size(rels) AS positionNumber, type(rels[size(rels) - 1]) AS relation, "
+        f"{_projection('related', properties)} AS relatedNodeProperties"
+    )
+
+
+@lru_cache(maxsize=64)
+def _page_query_template(node_label: str, direction: str, relation_level: str, properties) -> str:
+    # keyset pagination: a page starts strictly after the sort key of the previous page's last row, so no
+    # OFFSET is skipped over and concurrent writes cannot shift rows between pages. Rows are distinct per
+    # (related node, depth, last relation) since paths with the same key are indistinguishable in a page.
+    return (
+        f"MATCH p = {_pattern(direction, f'node:{node_label}', f'r*1..{relation_level}', 'related')} "
+        "WHERE node.assetName = $assetName AND ($relation IS NULL OR ALL(rel IN r WHERE type(rel) = $relation)) "
+        "WITH DISTINCT related, size(r) AS positionNumber, type(last(r)) AS relation "
+        "WITH related, positionNumber, relation, CASE WHEN related.name IS NULL THEN 1 ELSE 0 END AS nameMissing, "
+        "coalesce(toString(related.name), '') AS sortName, elementId(related) AS relatedId "
+        "WHERE $after IS NULL OR positionNumber > $after[0] OR (positionNumber = $after[0] AND ("
+        "nameMissing > $after[1] OR (nameMissing = $after[1] AND (sortName > $after[2] OR (sortName = $after[2] AND ("
+        "relatedId > $after[3] OR (relatedId = $after[3] AND relation > $after[4]))))))) "
+        "ORDER BY positionNumber, nameMissing, sortName, relatedId, relation "
+        "LIMIT $pageSize "
+        "RETURN related.name AS relatedNode, positionNumber, relation, "
+        f"{_projection('related', properties)} AS relatedNodeProperties, "
+        "[positionNumber, nameMissing, sortName, relatedId, relation] AS sortKey"
+    )
+
+
+def _encode_cursor(state: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> dict:
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return {"spec": int(state["spec"]), "after": state["after"], "returned": int(state["returned"])}
+    except (ValueError, KeyError, TypeError) as exc:
+        raise ValueError(f"invalid cursor: {cursor!r}") from exc
+
+
+class FrontierTraversal(object):
+    # level-by-level expansion that visits every related node once, at its minimum depth. Each level is one
+    # round trip bounded by the frontier, so the cost follows node count instead of path count. Rows are
+    # ordered by (depth, name, id) and LIMIT keeps the first ones, so a limited result is deterministic.
+    # A node reached at the same depth through several types is reported with the smallest type name.
+    # Properties are fetched per level, which lets callers consume rows before the traversal finishes;
+    # `after` skips rows up to a keyset cursor and `page_size` stops once that many rows are produced.
+
+    def __init__(self, node_label: str, node_name: str, direction, relation_level, relation, limit,
+                 properties=None, after=None, page_size=None) -> None:
+        self.node_name = node_name
+        self.relation = relation or None
+        self.max_level = None if relation_level is None or relation_level == "" else int(relation_level)
+        self.limit = None if limit is None or limit == "" else int(limit)
+        self.after = after
+        self.page_size = page_size
+        self.start_query, self.expand_query, self.properties_query = _frontier_query_templates(
+            node_label, _normalize_direction(direction), None if properties is None else tuple(properties))
+        self.visited = set()
+        self.frontier = None
+        self.depth = 0
+        self.counted = 0
+        self.pending = []
+        self.rows = []
+        self.last_key = None
+        self._taken = 0
+        self._truncated = False
+        self._stage = "start"
+
+    def _levels_left(self) -> bool:
+        return bool(self.frontier) and (self.max_level is None or self.depth < self.max_level) and (
+            self.limit is None or self.counted < self.limit)
+
+    def _finished_expanding(self) -> bool:
+        return not self._levels_left() or (self.page_size is not None and len(self.rows) >= self.page_size)
+
+    @property
+    def has_more(self) -> bool:
+        # only meaningful once next_request() returned None: the page filled up before the traversal ended
+        return self._stage == "done" and (self._truncated or self._levels_left())
+
+    def next_request(self):
+        if self._stage == "start":
+            return self.start_query, {"assetName": self.node_name}
+        if self._stage == "properties":
+            return self.properties_query, {"ids": [entry["id"] for entry in self.pending]}
+        if self._stage == "expand" and not self._finished_expanding():
+            return self.expand_query, {"frontier": self.frontier, "relation": self.relation}
+        self._stage = "done"
+        return None
+
+    def accept(self, records: list):
+        if self._stage == "start":
+            self.frontier = sorted(record["id"] for record in records)
+            self.visited.update(self.frontier)
+            self._stage = "expand"
+        elif self._stage == "expand":
+            self.depth += 1
+            reached = {}
+            for record in records:
+                if record["id"] in self.visited:
+                    continue
+                previous = reached.get(record["id"])
+                if previous is None or record["relation"] < previous["relation"]:
+                    reached[record["id"]] = {"id": record["id"], "relatedNode": record["relatedNode"],
+                                             "positionNumber": self.depth, "relation": record["relation"]}
+            level = sorted(reached.values(), key=_frontier_key)
+            self.visited.update(reached)
+            self.frontier = [entry["id"] for entry in level]
+            if self.limit is not None:
+                del level[self.limit - self.counted:]
+            self.counted += len(level)
+            if self.after is not None:
+                level = [entry for entry in level if _frontier_key(entry) > self.after]
+            if self.page_size is not None and len(level) > self.page_size - len(self.rows):
+                del level[self.page_size - len(self.rows):]
+                self._truncated = True
+            self.pending = level
+            if self.pending:
+                self._stage = "properties"
+        elif self._stage == "properties":
+            properties = {record["id"]: record["relatedNodeProperties"] for record in records}
+            for entry in self.pending:
+                self.rows.append({"relatedNode": entry["relatedNode"], "positionNumber": entry["positionNumber"],
+                                  "relation": entry["relation"],
+                                  "relatedNodeProperties": properties.get(entry["id"], {})})
+            self.last_key = _frontier_key(self.pending[-1])
+            self.pending = []
+            self._stage = "expand"
+
+    def take_rows(self) -> list:
+        rows = self.rows[self._taken:]
+        self._taken = len(self.rows)
+        return rows
+
 
 class RetrieveNodeAndRelations(object):
 
     def __init__(self, node_name: str, project_id: int, relationship_types: list[dict], direction: str,
-                 relation_levels, limit) -> None:
+                 relation_levels, limit, topology_engine=None, cache=relation_cache,
+                 traversal: str = TRAVERSAL_PATHS) -> None:
+        if traversal not in TRAVERSAL_MODES:
+            raise ValueError(f"traversal must be one of {TRAVERSAL_MODES}")
         self.project_id: int = project_id
         self.node_name: str = node_name
         self.relationship_types: list[dict] = relationship_types
@@ -19,22 +226,15 @@ class RetrieveNodeAndRelations(object):
         self.relation_levels = relation_levels
         self.node_and_its_relations: list = []
         self.related_node_name_list: list = []
-        self.driver = self._establish_connection()
+        self.topology_engine = topology_engine
+        self.cache = cache
+        self.traversal: str = traversal
+        # resolved lazily so that cache hits and topology engine lookups never touch the driver
+        self.driver = None
 
     @staticmethod
     def _establish_connection():
-        neo4j_uname = "neo4j"  # replace with correct value
-        neo4j_pwd = "password"
-        neo4j_uri = "uri"
-
-        if neo4j_uname and neo4j_pwd and neo4j_uri:
-            start = time.time()
-            _driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_uname, neo4j_pwd))
-            end = time.time()
-            print("Time taken for initializing driver: " + str(end - start))
-            return _driver
-        else:
-            raise RuntimeError("Driver not initialized")
+        return get_driver_manager()
 
     def _build_query(self, relationship_type, direction, relation_level):
         if direction.lower() == "incoming":
@@ -64,73 +264,342 @@ class RetrieveNodeAndRelations(object):
         return query
 
     def _run_query_and_format_data(self, query, session):
-        start_time = time.time()
-
         def _run_txn(tx):
-            result = tx.run(query, assetName=self.node_name, relationship_types=self.relationship_types)
-            return [rcd for rcd in result]
+            result = tx.run(metrics.profiled(query), assetName=self.node_name,
+                            relationship_types=self.relationship_types)
+            records = [rcd for rcd in result]
+            if metrics.enabled:
+                metrics.record_summary(SERVICE, result.consume())
+            return records
 
         # node_relations = session.run(query, assetName=self.node_name, relationship_types=self.relationship_types)
-        node_relations = session.execute_read(_run_txn)
-        print(f"{node_relations=}")
-        end_time = time.time()
-        print('execution_time', end_time - start_time)
+        with metrics.query(SERVICE, "node_relations"):
+            node_relations = session.execute_read(_run_txn)
         for record in node_relations:
             data = record.get('data', [])
             self.node_and_its_relations.extend(data)
+            metrics.increment("topology_rows_total", len(data), service=SERVICE, kind="related_nodes")
+
+    def _queries(self) -> list:
+        queries = []
+        if self.relationship_types:
+            for types in self.relationship_types:
+                relationship_type = types.get("relation", "")
+                relation_level = types.get("relationLevel", "")
+                direction = types.get("direction", "")
+                query = self._build_query(relationship_type, direction, relation_level)
+                queries.append(query)
+        else:
+            if self.direction.lower() == "incoming":
+                '''query to fetch incoming relations'''
+                query = (
+                    f"MATCH p = (node:{self.node_label})<-[r*1..{self.relation_levels}]-(related) "
+                    f"WHERE node.assetName = $assetName "
+                    "WITH node, relationships(p) AS rels, related "
+                    f"LIMIT {self.limit} "
+                    "RETURN COLLECT({relatedNode: related.name, positionNumber: size(rels), relation: type(rels[size(rels) - 1]), relatedNodeProperties: properties(related)}) AS data"
+                )
+                queries.append(query)
+            elif self.direction.lower() == "outgoing":
+                '''query to fetch outgoing relations'''
+                query = (
+                    f"MATCH p = (node:{self.node_label})-[r*1..{self.relation_levels}]->(related) "
+                    f"WHERE node.assetName = $assetName "
+                    "WITH node, relationships(p) AS rels, related "
+                    f"LIMIT {self.limit} "
+                    "RETURN COLLECT({relatedNode: related.name, positionNumber: size(rels), relation: type(rels[size(rels) - 1]), relatedNodeProperties: properties(related)}) AS data"
+                )
+                queries.append(query)
+            else:
+                ''' query to fetch both incoming and outgoing relations '''
+                query = (
+                    f"MATCH p = (node:{self.node_label})-[r*1..{self.relation_levels}]-(related) "
+                    f"WHERE node.assetName = $assetName "
+                    "WITH node, relationships(p) AS rels, related "
+                    f"LIMIT {self.limit} "
+                    "RETURN COLLECT({relatedNode: related.name, positionNumber: size(rels), relation: type(rels[size(rels) - 1]), relatedNodeProperties: properties(related)}) AS data"
+                )
+                queries.append(query)
+        return queries
+
+    def _traversal_specs(self) -> list[tuple]:
+        if self.relationship_types:
+            return [(types.get("direction", ""), types.get("relationLevel", ""), types.get("relation", ""))
+                    for types in self.relationship_types]
+        return [(self.direction, self.relation_levels, None)]
+
+    def _frontier_traversals(self, properties=None) -> list[FrontierTraversal]:
+        return [FrontierTraversal(self.node_label, self.node_name, direction, relation_level, relation, self.limit,
+                                  properties)
+                for direction, relation_level, relation in self._traversal_specs()]
+
+    def _stream_query(self, direction, relation_level, relation, properties) -> tuple:
+        # limit=None streams every path, as it pages every path in _page_steps
+        query = _stream_query_template(self.node_label, _normalize_direction(direction), str(relation_level),
+                                       None if properties is None else tuple(properties), self.limit is not None)
+        parameters = {"assetName": self.node_name, "relation": relation}
+        if self.limit is not None:
+            parameters["limit"] = int(self.limit)
+        return query, parameters
+
+    def _accept_frontier_rows(self, traversal: FrontierTraversal):
+        self.node_and_its_relations.extend(traversal.rows)
+        metrics.increment("topology_rows_total", len(traversal.rows), service=SERVICE, kind="related_nodes")
+
+    @staticmethod
+    def _fetch_records_txn(tx, query, parameters):
+        result = tx.run(metrics.profiled(query), parameters)
+        records = result.data()
+        if metrics.enabled:
+            metrics.record_summary(SERVICE, result.consume())
+        return records
+
+    def _page_steps(self, page_size: int, cursor: Optional[str], properties):
+        # sans-IO page assembly: yields (query, parameters) and is sent the records back, so the sync and the
+        # async services drive the same logic
+        if page_size < 1:
+            raise ValueError("page_size must be at least 1")
+        state = _decode_cursor(cursor) if cursor else {"spec": 0, "after": None, "returned": 0}
+        projected = None if properties is None else tuple(properties)
+        specs = self._traversal_specs()
+        rows = []
+        while state["spec"] < len(specs) and len(rows) < page_size:
+            direction, relation_level, relation = specs[state["spec"]]
+            wanted = page_size - len(rows)
+            if self.traversal == TRAVERSAL_FRONTIER:
+                traversal = FrontierTraversal(self.node_label, self.node_name, direction, relation_level, relation,
+                                              self.limit, projected, after=state["after"], page_size=wanted)
+                request = traversal.next_request()
+                while request is not None:
+                    traversal.accept((yield request))
+                    request = traversal.next_request()
+                rows.extend(traversal.rows)
+                has_more, after = traversal.has_more, traversal.last_key
+            else:
+                remaining = wanted if self.limit is None else min(wanted, int(self.limit) - state["returned"])
+                records = []
+                if remaining > 0:
+                    query = _page_query_template(self.node_label, _normalize_direction(direction), str(relation_level),
+                                                 projected)
+                    # one row more than needed tells whether another page follows
+                    records = yield query, {"assetName": self.node_name, "relation": relation,
+                                            "after": state["after"], "pageSize": remaining + 1}
+                records, has_more = records[:remaining], len(records) > remaining
+                rows.extend({key: record[key] for key in ROW_KEYS} for record in records)
+                state["returned"] += len(records)
+                if self.limit is not None and state["returned"] >= int(self.limit):
+                    has_more = False
+                after = records[-1]["sortKey"] if records else state["after"]
+            if has_more:
+                state["after"] = after
+                break
+            state = {"spec": state["spec"] + 1, "after": None, "returned": 0}
+        metrics.increment("topology_rows_total", len(rows), service=SERVICE, kind="related_nodes")
+        return {"rows": rows, "nextCursor": _encode_cursor(state) if state["spec"] < len(specs) else None}
 
-    def retrieve_relation_using_node_name(self) -> dict:
+    def fetch_page(self, page_size: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                   properties: Optional[list[str]] = None) -> dict:
+        # one page of related nodes plus an opaque cursor for the next one (None on the last page);
+        # `properties` limits relatedNodeProperties to those keys
+        if self.driver is None:
+            self.driver = self._establish_connection()
+        steps = self._page_steps(page_size, cursor, properties)
+        with metrics.phase(SERVICE, "pages"), self.driver.session(default_access_mode=READ_ACCESS) as session:
+            try:
+                request = next(steps)
+                while True:
+                    with metrics.query(SERVICE, "relations_page"):
+                        records = session.execute_read(self._fetch_records_txn, *request)
+                    request = steps.send(records)
+            except StopIteration as stop:
+                return stop.value
+
+    def iter_relations(self, fetch_size: int = DEFAULT_PAGE_SIZE, properties: Optional[list[str]] = None):
+        # yields rows while the query is still running: path rows are pulled from the server fetch_size at a
+        # time, frontier rows level by level. The session stays open until the generator is exhausted or closed.
+        if self.driver is None:
+            self.driver = self._establish_connection()
+        with self.driver.session(default_access_mode=READ_ACCESS, fetch_size=fetch_size) as session:
+            if self.traversal == TRAVERSAL_FRONTIER:
+                for traversal in self._frontier_traversals(None if properties is None else tuple(properties)):
+                    request = traversal.next_request()
+                    while request is not None:
+                        with metrics.query(SERVICE, "frontier_level"):
+                            traversal.accept(session.execute_read(self._fetch_records_txn, *request))
+                        yield from traversal.take_rows()
+                        request = traversal.next_request()
+            else:
+                for direction, relation_level, relation in self._traversal_specs():
+                    for record in session.run(*self._stream_query(direction, relation_level, relation, properties)):
+                        yield record.data()
+
+    def _query_database(self) -> list:
+        if self.driver is None:
+            self.driver = self._establish_connection()
+        with self.driver.session(default_access_mode=READ_ACCESS) as session:
+            if self.traversal == TRAVERSAL_FRONTIER:
+                for traversal in self._frontier_traversals():
+                    request = traversal.next_request()
+                    while request is not None:
+                        with metrics.query(SERVICE, "frontier_level"):
+                            traversal.accept(session.execute_read(self._fetch_records_txn, *request))
+                        request = traversal.next_request()
+                    self._accept_frontier_rows(traversal)
+            else:
+                for query in self._queries():
+                    self._run_query_and_format_data(query, session)
+        return list(self.node_and_its_relations)
+
+    def retrieve_relation_using_node_name(self) -> list:
         try:
-            start_time = time.time()
-            with self.driver.session(default_access_mode=READ_ACCESS) as session:
-                if self.relationship_types:
-                    for types in self.relationship_types:
-                        relationship_type = types.get("relation", "")
-                        relation_level = types.get("relationLevel", "")
-                        direction = types.get("direction", "")
-                        query = self._build_query(relationship_type, direction, relation_level)
-                        self._run_query_and_format_data(query, session)
+            if self.topology_engine is not None:
+                with metrics.phase(SERVICE, "reads_topology_engine"):
+                    self.node_and_its_relations.extend(
+                        self.topology_engine.retrieve(self.node_name, self.relationship_types, self.direction,
+                                                      self.relation_levels, self.limit, traversal=self.traversal))
+                return self.node_and_its_relations
+            with metrics.phase(SERVICE, "reads"):
+                if self.cache is not None:
+                    cache_key = make_relation_key(self.node_label, self.node_name, self.relationship_types,
+                                                  self.direction, self.relation_levels, self.limit, self.traversal)
+                    self.node_and_its_relations = self.cache.get_or_load(cache_key, self.node_label,
+                                                                         self._query_database)
                 else:
-                    if self.direction.lower() == "incoming":
-                        '''query to fetch incoming relations'''
-                        query = (
-                            f"MATCH p = (node:{self.node_label})<-[r*1..{self.relation_levels}]-(related) "
-                            f"WHERE node.assetName = $assetName "
-                            "WITH node, relationships(p) AS rels, related "
-                            f"LIMIT {self.limit} "
-                            "RETURN COLLECT({relatedNode: related.name, positionNumber: size(rels), relation: type(rels[size(rels) - 1]), relatedNodeProperties: properties(related)}) AS data"
-                        )
-                        self._run_query_and_format_data(query, session)
-                    elif self.direction.lower() == "outgoing":
-                        '''query to fetch outgoing relations'''
-                        query = (
-                            f"MATCH p = (node:{self.node_label})-[r*1..{self.relation_levels}]->(related) "
-                            f"WHERE node.assetName = $assetName "
-                            "WITH node, relationships(p) AS rels, related "
-                            f"LIMIT {self.limit} "
-                            "RETURN COLLECT({relatedNode: related.name, positionNumber: size(rels), relation: type(rels[size(rels) - 1]), relatedNodeProperties: properties(related)}) AS data"
-                        )
-                        self._run_query_and_format_data(query, session)
-                    else:
-                        ''' query to fetch both incoming and outgoing relations '''
-                        query = (
-                            f"MATCH p = (node:{self.node_label})-[r*1..{self.relation_levels}]-(related) "
-                            f"WHERE node.assetName = $assetName "
-                            "WITH node, relationships(p) AS rels, related "
-                            f"LIMIT {self.limit} "
-                            "RETURN COLLECT({relatedNode: related.name, positionNumber: size(rels), relation: type(rels[size(rels) - 1]), relatedNodeProperties: properties(related)}) AS data"
-                        )
-                        self._run_query_and_format_data(query, session)
-            end_time = time.time()
-            print('final execution_time', end_time - start_time)
-            print(self.node_and_its_relations)
+                    self._query_database()
+
+        except Exception as exc:
+            print(f'{logger_tag} exception occurred {exc}')
+            print(traceback.format_exc())
+
+        return self.node_and_its_relations
+
+
+@lru_cache(maxsize=64)
+def _batch_query_template(node_label: str, shapes: tuple) -> str:
+    # one statement for every request: the direction and the level bound of a variable length pattern cannot
+    # be parameters, so each (direction, level) shape is a UNION ALL branch and a request only passes the
+    # branch of its own shape. Names, types and the limit are parameters, so the server plan cache sees one
+    # statement per set of shapes whatever the requested names are
+    branches = []
+    for shape_index, (direction, relation_level) in enumerate(shapes):
+        if direction == "incoming":
+            pattern = f"(node)<-[r*1..{relation_level}]-(related)"
+        elif direction == "outgoing":
+            pattern = f"(node)-[r*1..{relation_level}]->(related)"
+        else:
+            pattern = f"(node)-[r*1..{relation_level}]-(related)"
+        branches.append(
+            "WITH req "
+            f"MATCH (node:{node_label}) WHERE req.shape = {shape_index} AND node.assetName = req.assetName "
+            f"MATCH p = {pattern} "
+            "WHERE req.relation IS NULL OR ALL(rel IN r WHERE type(rel) = req.relation) "
+            "WITH relationships(p) AS rels, related "
+            "LIMIT $limit "
+            "RETURN {relatedNode: related.name, positionNumber: size(rels), relation: type(rels[size(rels) - 1]), relatedNodeProperties: properties(related)} AS row "
+        )
+    return (
+        "UNWIND $requests AS req "
+        "CALL { " + "UNION ALL ".join(branches) + "} "
+        "RETURN req.assetName AS assetName, req.specIndex AS specIndex, COLLECT(row) AS data"
+    )
+
+
+class BatchRetrieveNodeAndRelations(object):
+
+    def __init__(self, node_names: list[str], project_id: int, relationship_types: list[dict], direction: str,
+                 relation_levels, limit) -> None:
+        self.project_id: int = project_id
+        self.node_names: list[str] = list(dict.fromkeys(node_names))
+        self.relationship_types: list[dict] = relationship_types
+        self.direction: str = direction
+        self.node_label: str = "CI_1K"
+        self.limit: int = limit
+        self.relation_levels = relation_levels
+        self.node_and_its_relations: dict[str, list] = {}
+        self.driver = None
+
+    def _specs(self) -> list[tuple]:
+        if self.relationship_types:
+            return [(_normalize_direction(types.get("direction", "")), str(types.get("relationLevel", "")),
+                     types.get("relation", "")) for types in self.relationship_types]
+        return [(_normalize_direction(self.direction), str(self.relation_levels), None)]
+
+    def _group_requests(self) -> tuple:
+        # the distinct (direction, level) shapes, and one request per asset and spec naming its shape
+        shapes, requests = {}, []
+        for spec_index, (direction, relation_level, relation) in enumerate(self._specs()):
+            shape_index = shapes.setdefault((direction, relation_level), len(shapes))
+            for node_name in self.node_names:
+                requests.append({"assetName": node_name, "relation": relation, "specIndex": spec_index,
+                                 "shape": shape_index})
+        return tuple(shapes), requests
+
+    def _run_batch_txn(self, tx, shapes, requests):
+        query = _batch_query_template(self.node_label, shapes)
+        with metrics.query(SERVICE, "batch_node_relations"):
+            result = tx.run(metrics.profiled(query), requests=requests, limit=int(self.limit))
+            records = result.data()
+        if metrics.enabled:
+            metrics.record_summary(SERVICE, result.consume())
+        return records
+
+    def retrieve_relations_for_nodes(self) -> dict[str, list]:
+        try:
+            shapes, requests = self._group_requests()
+            if self.driver is None:
+                self.driver = RetrieveNodeAndRelations._establish_connection()
+            with metrics.phase(SERVICE, "batch_reads"), \
+                    self.driver.session(default_access_mode=READ_ACCESS) as session:
+                records = session.execute_read(self._run_batch_txn, shapes, requests)
+
+            data_by_spec = {(record["assetName"], record["specIndex"]): record["data"] for record in records}
+            spec_count = len(self._specs())
+            for node_name in self.node_names:
+                self.node_and_its_relations[node_name] = [
+                    row for spec_index in range(spec_count) for row in data_by_spec.get((node_name, spec_index), [])
+                ]
+                metrics.increment("topology_rows_total", len(self.node_and_its_relations[node_name]),
+                                  service=SERVICE, kind="related_nodes")
+
+        except Exception as exc:
+            print(f'{logger_tag} exception occurred {exc}')
+            print(traceback.format_exc())
+
+        return self.node_and_its_relations
+
+
+class RetrieveImpactSummary(object):
+    # precomputed k-hop impact summary of an asset (see impact_index.ImpactIndex): one lookup on the name
+    # index, or none at all with an in-process index, instead of a traversal
+
+    def __init__(self, node_name: str, project_id: int, impact_index=None) -> None:
+        self.project_id: int = project_id
+        self.node_name: str = node_name
+        self.node_label: str = "CI_1K"
+        self.impact_index = impact_index
+        self.driver = None
+
+    def retrieve_impact_summary(self) -> Optional[dict]:
+        try:
+            if self.impact_index is not None:
+                return self.impact_index.summary_for_name(self.node_name)
+            if self.driver is None:
+                self.driver = RetrieveNodeAndRelations._establish_connection()
+            query = (
+                f"MATCH (node:{self.node_label}) WHERE node.assetName = $assetName "
+                f"RETURN node.{SUMMARY_PROPERTY} AS summary LIMIT 1"
+            )
+            with metrics.query(SERVICE, "impact_summary"), \
+                    self.driver.session(default_access_mode=READ_ACCESS) as session:
+                record = session.execute_read(lambda tx: tx.run(query, assetName=self.node_name).single())
+            if record is not None and record["summary"]:
+                return json.loads(record["summary"])
 
         except Exception as exc:
             print(f'{logger_tag} exception occurred {exc}')
             print(traceback.format_exc())
 
-        finally:
-            self.driver.close()
+        return None
 
 
 if __name__ == "__main__":
@@ -140,6 +609,13 @@ if __name__ == "__main__":
     direction = ""
     relation_levels = 10
     limit = 500
+    configure_metrics(enabled=True, exporters=[JsonLinesExporter()])
     obj = RetrieveNodeAndRelations(node_name, project_id, relationship_types,
                                    direction, relation_levels, limit)
     return_data = obj.retrieve_relation_using_node_name()
+    print(return_data)
+    page = RetrieveNodeAndRelations(node_name, project_id, relationship_types, direction, relation_levels, limit,
+                                    traversal=TRAVERSAL_FRONTIER).fetch_page(
+        page_size=50, properties=["assetName", "type", "deviceStatus"])
+    print(page["rows"], page["nextCursor"])
+    metrics.flush()
@@ -0,0 +1,212 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable, List, Optional
+
+DEFAULT_MAX_ENTRIES = 2048
+DEFAULT_TTL_SECONDS = 300.0
+
+
+def _normalize_direction(direction) -> str:
+    direction = (direction or "").lower()
+    return direction if direction in ("incoming", "outgoing") else "both"
+
+
+def make_relation_key(node_label: str, node_name: str, relationship_types: Optional[List[dict]], direction,
+                      relation_levels, limit, traversal: str = "paths") -> tuple:
+    # spec order is kept: results of several relationship types are concatenated in request order
+    specs = tuple(
+        (types.get("relation", ""), _normalize_direction(types.get("direction", "")),
+         str(types.get("relationLevel", "")))
+        for types in relationship_types or []
+    )
+    if specs:
+        return node_label, node_name, specs, None, None, str(limit), traversal
+    return node_label, node_name, (), _normalize_direction(direction), str(relation_levels), str(limit), traversal
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class _InFlight:
+    __slots__ = ("event", "value", "error", "waiters")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+        # (loop, future) of coroutines sharing this load, woken from whichever thread finishes it
+        self.waiters = []
+
+    def set(self):
+        self.event.set()
+        for loop, future in self.waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+
+class RelationResultCache:
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._keys_by_label = {}
+        self._label_generations = {}
+        self._generation = 0
+        self._in_flight = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.shared_loads = 0
+
+    def _drop(self, key):
+        _, label, _ = self._entries.pop(key)
+        keys = self._keys_by_label.get(label)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_label[label]
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= self._clock():
+            self._drop(key)
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key, label, value):
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (self._clock() + self._ttl_seconds, label, value)
+        self._keys_by_label.setdefault(label, set()).add(key)
+        while len(self._entries) > self._max_entries:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _claim(self, key: Hashable, label: str, waiter=None):
+        # returns (entry, pending, generation): a cached entry, or the in-flight load to share, or a new
+        # load this caller owns (generation is only set for the owner)
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self.hits += 1
+                return entry, None, None
+            self.misses += 1
+            pending = self._in_flight.get(key)
+            if pending is not None:
+                self.shared_loads += 1
+                if waiter is not None:
+                    pending.waiters.append(waiter)
+                return None, pending, None
+            pending = self._in_flight[key] = _InFlight()
+            return None, pending, (self._generation, self._label_generations.get(label, 0))
+
+    def _complete(self, key: Hashable, label: str, pending: _InFlight, generation: tuple):
+        with self._lock:
+            del self._in_flight[key]
+            # a write to the label while the query ran makes the result stale, so it is not stored
+            if pending.error is None and (self._generation, self._label_generations.get(label, 0)) == generation:
+                self._store(key, label, tuple(pending.value))
+        pending.set()
+
+    def get_or_load(self, key: Hashable, label: str, loader: Callable[[], list]) -> list:
+        # results are stored as tuples and every caller gets its own list, so changing a returned list does
+        # not change later hits; the rows in it are shared and are not to be modified
+        entry, pending, generation = self._claim(key, label)
+        if entry is not None:
+            return list(entry[2])
+
+        if generation is None:
+            # identical request already running: wait for its result instead of querying again
+            pending.event.wait()
+            if pending.error is not None:
+                raise pending.error
+            return list(pending.value)
+
+        try:
+            pending.value = loader()
+        except BaseException as exc:
+            pending.error = exc
+            raise
+        finally:
+            self._complete(key, label, pending, generation)
+        return list(pending.value)
+
+    async def get_or_load_async(self, key: Hashable, label: str, loader: Callable[[], Awaitable[list]]) -> list:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        entry, pending, generation = self._claim(key, label, waiter=(loop, future))
+        if entry is not None:
+            return list(entry[2])
+
+        if generation is None:
+            await future
+            if pending.error is not None:
+                raise pending.error
+            return list(pending.value)
+
+        try:
+            pending.value = await loader()
+        except BaseException as exc:
+            pending.error = exc
+            raise
+        finally:
+            self._complete(key, label, pending, generation)
+        return list(pending.value)
+
+    def invalidate_label(self, label: str) -> int:
+        with self._lock:
+            self._label_generations[label] = self._label_generations.get(label, 0) + 1
+            keys = self._keys_by_label.pop(label, set())
+            for key in keys:
+                self._entries.pop(key, None)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def invalidate_all(self) -> int:
+        # for writers whose label is not the one the readers cache under: every entry goes, and loads that
+        # are in flight are not stored
+        with self._lock:
+            self._generation += 1
+            count = len(self._entries)
+            self._entries.clear()
+            self._keys_by_label.clear()
+            self.invalidations += count
+            return count
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._keys_by_label.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "maxEntries": self._max_entries,
+                "ttlSeconds": self._ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "sharedLoads": self.shared_loads
+            }
+
+
+relation_cache = RelationResultCache()
@@ -0,0 +1,473 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from typing import Callable, List, Optional
+
+from neo4j.exceptions import Neo4jError
+
+
+class StandInRecord(dict):
+
+    def data(self) -> dict:
+        return dict(self)
+
+    def value(self, key=0, default=None):
+        if isinstance(key, int):
+            values = list(self.values())
+            return values[key] if key < len(values) else default
+        return self.get(key, default)
+
+
+class StandInCounters:
+
+    def __init__(self, **counters):
+        self.nodes_created = counters.get("nodes_created", 0)
+        self.relationships_created = counters.get("relationships_created", 0)
+        self.properties_set = counters.get("properties_set", 0)
+
+    def __repr__(self):
+        return (f"StandInCounters(nodes_created={self.nodes_created}, "
+                f"relationships_created={self.relationships_created}, properties_set={self.properties_set})")
+
+
+class StandInSummary:
+
+    def __init__(self, query: str, parameters: dict, counters: Optional[dict] = None):
+        self.query = query
+        self.parameters = parameters
+        self.counters = StandInCounters(**(counters or {}))
+        self.profile = None
+
+
+class StandInResult:
+
+    def __init__(self, query: str, parameters: dict, records: List[dict], counters: Optional[dict] = None):
+        self._records = [StandInRecord(record) for record in records]
+        self._summary = StandInSummary(query, parameters, counters)
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def single(self):
+        return self._records[0] if self._records else None
+
+    def data(self) -> List[dict]:
+        return [record.data() for record in self._records]
+
+    def consume(self) -> StandInSummary:
+        return self._summary
+
+
+class StandInTransaction:
+
+    def __init__(self, driver: "StandInDriver"):
+        self._driver = driver
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # like neo4j.Transaction: an explicit transaction left open commits on success, rolls back on error
+        if not self.closed:
+            if exc_type is None:
+                self.commit()
+            else:
+                self.rollback()
+
+    def run(self, query: str, parameters: Optional[dict] = None, **kwargs) -> StandInResult:
+        return self._driver._execute(query, {**(parameters or {}), **kwargs})
+
+    def commit(self):
+        self.closed = True
+
+    def rollback(self):
+        self.closed = True
+
+
+class StandInSession:
+
+    def __init__(self, driver: "StandInDriver", config: dict):
+        self._driver = driver
+        self.config = config
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._driver._release()
+
+    def run(self, query: str, parameters: Optional[dict] = None, **kwargs) -> StandInResult:
+        return self._driver._execute(query, {**(parameters or {}), **kwargs})
+
+    def begin_transaction(self, **config) -> StandInTransaction:
+        return StandInTransaction(self._driver)
+
+    def execute_read(self, transaction_function: Callable, *args, **kwargs):
+        return transaction_function(StandInTransaction(self._driver), *args, **kwargs)
+
+    def execute_write(self, transaction_function: Callable, *args, **kwargs):
+        return transaction_function(StandInTransaction(self._driver), *args, **kwargs)
+
+
+class StandInDriver:
+    # local stand-in for neo4j.Driver: no network, records every statement and can simulate round-trip latency
+
+    def __init__(self, uri: str = "stand-in://local", auth=None, *, latency: float = 0.0,
+                 responder: Optional[Callable[[str, dict], List[dict]]] = None, **config):
+        self.uri = uri
+        self.auth = auth
+        self.config = config
+        self.latency = latency
+        self.responder = responder
+        self.statements: List[tuple] = []
+        self.sessions_opened = 0
+        self.open_sessions = 0
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def session(self, **config) -> StandInSession:
+        if self.closed:
+            raise RuntimeError("Driver closed")
+        with self._lock:
+            self.sessions_opened += 1
+            self.open_sessions += 1
+        return StandInSession(self, config)
+
+    def _release(self):
+        with self._lock:
+            self.open_sessions -= 1
+
+    def _execute(self, query: str, parameters: dict) -> StandInResult:
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.statements.append((query, parameters))
+        records = self.responder(query, parameters) if self.responder else []
+        return StandInResult(query, parameters, records)
+
+    def verify_connectivity(self, **config):
+        if self.closed:
+            raise RuntimeError("Driver closed")
+        if self.latency:
+            time.sleep(self.latency)
+
+    def close(self):
+        self.closed = True
+
+
+class SimulatedCrash(Exception):
+    # the process dying mid-import; not a driver error, so nothing retries it
+    pass
+
+
+def _batch_rows(parameters: dict) -> int:
+    if "rows" in parameters:
+        return len(parameters["rows"])
+    return parameters.get("count", 0)
+
+
+class _BufferedTransaction(StandInTransaction):
+
+    def __init__(self, driver: "FaultInjectingDriver"):
+        super().__init__(driver)
+        self.statements: List[tuple] = []
+
+    def run(self, query: str, parameters: Optional[dict] = None, **kwargs) -> StandInResult:
+        parameters = {**(parameters or {}), **kwargs}
+        self.statements.append((query, parameters))
+        records = self._driver.responder(query, parameters) if self._driver.responder else []
+        return StandInResult(query, parameters, records)
+
+    def commit(self):
+        # statements are only recorded once the commit succeeds
+        self.closed = True
+        self._driver._commit(self.statements)
+
+
+class _FaultInjectingSession(StandInSession):
+
+    def begin_transaction(self, **config) -> _BufferedTransaction:
+        return _BufferedTransaction(self._driver)
+
+    def execute_write(self, transaction_function: Callable, *args, **kwargs):
+        # a managed transaction, retried like the 5.x driver does: every retryable error is replayed with
+        # exponential backoff (1s, doubling) until max_transaction_retry_time has passed since the first
+        # failure. The backoff is added to driver.managed_retry_seconds instead of being slept
+        max_retry_time = self.config.get("max_transaction_retry_time",
+                                         self._driver.config.get("max_transaction_retry_time", 30.0))
+        waited = 0.0
+        delay = 1.0
+        while True:
+            tx = _BufferedTransaction(self._driver)
+            try:
+                value = transaction_function(tx, *args, **kwargs)
+                tx.commit()
+                return value
+            except Neo4jError as exc:
+                if not exc.is_retryable() or waited >= max_retry_time:
+                    raise
+            with self._driver._lock:
+                self._driver.managed_retries += 1
+                self._driver.managed_retry_seconds += delay
+            waited += delay
+            delay *= 2
+
+    execute_read = execute_write
+
+
+class FaultInjectingDriver(StandInDriver):
+    # stand-in that fails the way a loaded server does: random transient errors, an out-of-memory error for
+    # batches above max_batch_rows, latency that grows with the batch and a crash after a number of commits
+
+    def __init__(self, uri: str = "stand-in://local", auth=None, *, transient_rate: float = 0.0,
+                 max_batch_rows: Optional[int] = None, latency_per_row: float = 0.0,
+                 crash_after_commits: Optional[int] = None, seed: Optional[int] = None, **config):
+        super().__init__(uri, auth, **config)
+        self.transient_rate = transient_rate
+        self.max_batch_rows = max_batch_rows
+        self.latency_per_row = latency_per_row
+        self.crash_after_commits = crash_after_commits
+        self.committed_batches = 0
+        self.committed_rows = 0
+        self.faults = {"transient": 0, "memory": 0}
+        # replays done inside managed transactions (execute_write), and the backoff they would have slept
+        self.managed_retries = 0
+        self.managed_retry_seconds = 0.0
+        self._random = random.Random(seed)
+
+    def session(self, **config) -> StandInSession:
+        if self.closed:
+            raise RuntimeError("Driver closed")
+        with self._lock:
+            self.sessions_opened += 1
+            self.open_sessions += 1
+        return _FaultInjectingSession(self, config)
+
+    def _inject_fault(self, rows: int):
+        # faults are drawn per transaction, on all the rows it wrote
+        if not rows:
+            # schema statements and lookups never fail
+            return
+        if self.latency or self.latency_per_row:
+            time.sleep(self.latency + self.latency_per_row * rows)
+        with self._lock:
+            if self.crash_after_commits is not None and self.committed_batches >= self.crash_after_commits:
+                raise SimulatedCrash(f"stand-in crashed after {self.committed_batches} commits")
+            if self.max_batch_rows is not None and rows > self.max_batch_rows:
+                self.faults["memory"] += 1
+                raise Neo4jError.hydrate(
+                    message=f"batch of {rows} rows exceeds the memory pool",
+                    code="Neo.TransientError.General.MemoryPoolOutOfMemoryError")
+            if self._random.random() < self.transient_rate:
+                self.faults["transient"] += 1
+                raise Neo4jError.hydrate(message="deadlock detected",
+                                         code="Neo.TransientError.Transaction.DeadlockDetected")
+
+    def _execute(self, query: str, parameters: dict) -> StandInResult:
+        self._inject_fault(_batch_rows(parameters))
+        return super()._execute(query, parameters)
+
+    def _commit(self, statements: List[tuple]):
+        rows = sum(_batch_rows(parameters) for _, parameters in statements)
+        self._inject_fault(rows)
+        with self._lock:
+            self.statements.extend(statements)
+            if rows:
+                self.committed_batches += 1
+                self.committed_rows += rows
+
+
+class AsyncStandInResult(StandInResult):
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for record in self._records:
+            yield record
+
+    async def single(self):
+        return super().single()
+
+    async def data(self) -> List[dict]:
+        return super().data()
+
+    async def consume(self) -> StandInSummary:
+        return super().consume()
+
+
+class AsyncStandInTransaction:
+
+    def __init__(self, driver: "AsyncStandInDriver"):
+        self._driver = driver
+
+    async def run(self, query: str, parameters: Optional[dict] = None, **kwargs) -> AsyncStandInResult:
+        return await self._driver._execute_async(query, {**(parameters or {}), **kwargs})
+
+
+class AsyncStandInSession(StandInSession):
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        super().close()
+
+    async def run(self, query: str, parameters: Optional[dict] = None, **kwargs) -> AsyncStandInResult:
+        return await self._driver._execute_async(query, {**(parameters or {}), **kwargs})
+
+    async def execute_read(self, transaction_function: Callable, *args, **kwargs):
+        return await transaction_function(AsyncStandInTransaction(self._driver), *args, **kwargs)
+
+    async def execute_write(self, transaction_function: Callable, *args, **kwargs):
+        return await transaction_function(AsyncStandInTransaction(self._driver), *args, **kwargs)
+
+
+class AsyncStandInDriver(StandInDriver):
+    # asyncio flavour of StandInDriver: latency is awaited, so concurrent sessions overlap their round trips
+
+    def session(self, **config) -> AsyncStandInSession:
+        if self.closed:
+            raise RuntimeError("Driver closed")
+        with self._lock:
+            self.sessions_opened += 1
+            self.open_sessions += 1
+        return AsyncStandInSession(self, config)
+
+    async def _execute_async(self, query: str, parameters: dict) -> AsyncStandInResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        with self._lock:
+            self.statements.append((query, parameters))
+        records = self.responder(query, parameters) if self.responder else []
+        return AsyncStandInResult(query, parameters, records)
+
+    async def verify_connectivity(self, **config):
+        if self.closed:
+            raise RuntimeError("Driver closed")
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def close(self):
+        self.closed = True
+
+
+def _parameter_bytes(parameters: dict) -> int:
+    # JSON length is a stable, driver-independent proxy for the packstream payload size
+    return len(json.dumps(parameters, default=str, separators=(",", ":")).encode("utf-8"))
+
+
+class RecordingStats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.round_trips = 0
+        self.statements = 0
+        self.transactions = 0
+        self.parameter_bytes = 0
+        self.batch_latencies: List[float] = []
+
+    def record_statement(self, parameters: dict):
+        size = _parameter_bytes(parameters)
+        with self._lock:
+            self.statements += 1
+            self.round_trips += 1
+            self.parameter_bytes += size
+
+    def record_batch(self, seconds: float, transaction: bool):
+        with self._lock:
+            self.batch_latencies.append(seconds)
+            if transaction:
+                # the commit of a managed transaction is one more round trip
+                self.transactions += 1
+                self.round_trips += 1
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "roundTrips": self.round_trips,
+                "statements": self.statements,
+                "transactions": self.transactions,
+                "parameterBytes": self.parameter_bytes,
+                "batches": len(self.batch_latencies)
+            }
+
+
+class _RecordingTransaction:
+
+    def __init__(self, inner, stats: RecordingStats):
+        self._inner = inner
+        self._stats = stats
+
+    def run(self, query: str, parameters: Optional[dict] = None, **kwargs):
+        self._stats.record_statement({**(parameters or {}), **kwargs})
+        return self._inner.run(query, parameters, **kwargs)
+
+
+class _RecordingSession:
+
+    def __init__(self, inner, stats: RecordingStats):
+        self._inner = inner
+        self._stats = stats
+
+    def __enter__(self):
+        self._inner.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return self._inner.__exit__(exc_type, exc_val, exc_tb)
+
+    def close(self):
+        self._inner.close()
+
+    def run(self, query: str, parameters: Optional[dict] = None, **kwargs):
+        self._stats.record_statement({**(parameters or {}), **kwargs})
+        start = time.perf_counter()
+        result = self._inner.run(query, parameters, **kwargs)
+        self._stats.record_batch(time.perf_counter() - start, transaction=False)
+        return result
+
+    def _execute(self, execute, transaction_function: Callable, *args, **kwargs):
+        def _recorded(tx, *tx_args, **tx_kwargs):
+            return transaction_function(_RecordingTransaction(tx, self._stats), *tx_args, **tx_kwargs)
+
+        start = time.perf_counter()
+        try:
+            return execute(_recorded, *args, **kwargs)
+        finally:
+            self._stats.record_batch(time.perf_counter() - start, transaction=True)
+
+    def execute_read(self, transaction_function: Callable, *args, **kwargs):
+        return self._execute(self._inner.execute_read, transaction_function, *args, **kwargs)
+
+    def execute_write(self, transaction_function: Callable, *args, **kwargs):
+        return self._execute(self._inner.execute_write, transaction_function, *args, **kwargs)
+
+
+class RecordingDriver:
+    # wraps a real driver or a StandInDriver and counts round trips, statements and parameter bytes
+
+    def __init__(self, inner=None, stats: Optional[RecordingStats] = None):
+        self._inner = inner if inner is not None else StandInDriver()
+        self.stats = stats or RecordingStats()
+
+    def session(self, **config) -> _RecordingSession:
+        return _RecordingSession(self._inner.session(**config), self.stats)
+
+    def verify_connectivity(self, **config):
+        return self._inner.verify_connectivity(**config)
+
+    def close(self):
+        self._inner.close()
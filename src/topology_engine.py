@@ -0,0 +1,394 @@
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+from neo4j import READ_ACCESS
+
+from read_ws import TRAVERSAL_FRONTIER, TRAVERSAL_PATHS
+from topology_readers import DEFAULT_CHUNK_SIZE, iter_device_chunks, iter_relationship_chunks
+
+logger_tag = "[TOPOLOGY-ENGINE] "
+
+NAME_PROPERTY = "name"
+LOOKUP_PROPERTY = "assetName"
+
+
+class CsrAdjacency:
+    __slots__ = ("offsets", "neighbours", "types", "edge_ids")
+
+    def __init__(self, offsets, neighbours, types, edge_ids):
+        self.offsets = offsets
+        self.neighbours = neighbours
+        self.types = types
+        self.edge_ids = edge_ids
+
+    @classmethod
+    def from_edges(cls, node_count, keys, neighbours, types):
+        order = np.argsort(keys, kind="stable")
+        offsets = np.zeros(node_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=node_count), out=offsets[1:])
+        return cls(offsets, neighbours[order], types[order], order.astype(np.int32))
+
+
+class PropertyColumn:
+    __slots__ = ("codes", "values")
+
+    # dictionary-encoded column: codes[node_id] indexes into values, -1 means the node has no such property
+    def __init__(self, codes, values):
+        self.codes = codes
+        self.values = values
+
+
+class _TopologyBuilder:
+
+    def __init__(self, dedupe_edges: bool):
+        self._dedupe_edges = dedupe_edges
+        self._node_count = 0
+        self._codes: Dict[str, list] = {}
+        self._value_ids: Dict[str, dict] = {}
+        self._type_ids: Dict[str, int] = {}
+        self._sources: List[int] = []
+        self._targets: List[int] = []
+        self._types: List[int] = []
+        self._edge_keys = set()
+
+    def add_node(self, properties: dict) -> int:
+        node_id = self._node_count
+        self._node_count += 1
+        for key, value in properties.items():
+            codes = self._codes.get(key)
+            if codes is None:
+                codes = self._codes[key] = [-1] * node_id
+                self._value_ids[key] = {}
+            value_ids = self._value_ids[key]
+            code = value_ids.get(value)
+            if code is None:
+                code = value_ids[value] = len(value_ids)
+            codes.append(code)
+        for key, codes in self._codes.items():
+            if len(codes) == node_id:
+                codes.append(-1)
+        return node_id
+
+    def add_edge(self, source: int, target: int, type_name: str):
+        type_id = self._type_ids.get(type_name)
+        if type_id is None:
+            type_id = self._type_ids[type_name] = len(self._type_ids)
+        if self._dedupe_edges:
+            # mirrors MERGE (source)-[r:TYPE]->(target): one relationship per key
+            key = (source, target, type_id)
+            if key in self._edge_keys:
+                return
+            self._edge_keys.add(key)
+        self._sources.append(source)
+        self._targets.append(target)
+        self._types.append(type_id)
+
+    def build(self) -> "TopologyGraph":
+        columns = {
+            key: PropertyColumn(np.asarray(codes, dtype=np.int32), list(self._value_ids[key]))
+            for key, codes in self._codes.items()
+        }
+        sources = np.asarray(self._sources, dtype=np.int32)
+        targets = np.asarray(self._targets, dtype=np.int32)
+        types = np.asarray(self._types, dtype=np.int32)
+        return TopologyGraph(
+            columns=columns,
+            type_names=list(self._type_ids),
+            outgoing=CsrAdjacency.from_edges(self._node_count, sources, targets, types),
+            incoming=CsrAdjacency.from_edges(self._node_count, targets, sources, types)
+        )
+
+
+class TopologyGraph:
+
+    def __init__(self, *, columns: Dict[str, PropertyColumn], type_names: List[str], outgoing: CsrAdjacency,
+                 incoming: CsrAdjacency):
+        self.columns = columns
+        self.type_names = type_names
+        self.outgoing = outgoing
+        self.incoming = incoming
+        self._type_ids = {type_name: type_id for type_id, type_name in enumerate(type_names)}
+        self._lookup_indexes: Dict[str, Dict[object, List[int]]] = {}
+
+    @property
+    def node_count(self) -> int:
+        return len(self.outgoing.offsets) - 1
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.outgoing.neighbours)
+
+    @classmethod
+    def from_csv(cls, device_file: str, relationship_file: Optional[str],
+                 chunk_size: int = DEFAULT_CHUNK_SIZE) -> "TopologyGraph":
+        # same node layout ImportTopologyWithRelationsService writes (name + mapped fields), keeping assetName
+        # as well so lookups by asset name behave like they do against the database
+        start = time.time()
+        builder = _TopologyBuilder(dedupe_edges=True)
+        asset_ids = {}
+        for chunk in iter_device_chunks(device_file, chunk_size):
+            for item in chunk:
+                properties = {NAME_PROPERTY: item.get(LOOKUP_PROPERTY)}
+                properties.update(item)
+                asset_ids[item.get("assetId")] = builder.add_node(properties)
+        for chunk in iter_relationship_chunks(relationship_file, chunk_size) if relationship_file else []:
+            for item in chunk:
+                source = asset_ids.get(item['Source Asset ID'])
+                target = asset_ids.get(item['Target Asset ID'])
+                rel_type_name = item['Relationship Type Name']
+                if source is None or target is None or not rel_type_name:
+                    continue
+                builder.add_edge(source, target, rel_type_name)
+        graph = builder.build()
+        end = time.time()
+        print(f"{logger_tag}loaded {graph.node_count} nodes and {graph.edge_count} relations from csv in "
+              + str(end - start))
+        return graph
+
+    @classmethod
+    def from_driver(cls, driver, node_label: str, database: Optional[str] = None) -> "TopologyGraph":
+        start = time.time()
+        builder = _TopologyBuilder(dedupe_edges=False)
+        element_ids = {}
+        with driver.session(database=database, default_access_mode=READ_ACCESS) as session:
+            nodes = session.run(f"MATCH (n:{node_label}) RETURN elementId(n) AS id, properties(n) AS properties")
+            for record in nodes:
+                element_ids[record["id"]] = builder.add_node(record["properties"])
+            relations = session.run(
+                f"MATCH (source:{node_label})-[r]->(target:{node_label}) "
+                "RETURN elementId(source) AS source, elementId(target) AS target, type(r) AS type"
+            )
+            for record in relations:
+                builder.add_edge(element_ids[record["source"]], element_ids[record["target"]], record["type"])
+        graph = builder.build()
+        end = time.time()
+        print(f"{logger_tag}loaded {graph.node_count} nodes and {graph.edge_count} relations from snapshot in "
+              + str(end - start))
+        return graph
+
+    @classmethod
+    def from_snapshot(cls, path: str) -> "TopologyGraph":
+        # memory-mapped, see topology_snapshot for the format
+        from topology_snapshot import load_snapshot
+
+        return load_snapshot(path)
+
+    def write_snapshot(self, path: str) -> dict:
+        from topology_snapshot import write_snapshot
+
+        return write_snapshot(self, path)
+
+    def node_properties(self, node_id: int) -> dict:
+        properties = {}
+        for key, column in self.columns.items():
+            code = int(column.codes[node_id])
+            if code >= 0:
+                properties[key] = column.values[code]
+        return properties
+
+    def find_nodes(self, value, lookup_property: str = LOOKUP_PROPERTY) -> List[int]:
+        index = self._lookup_indexes.get(lookup_property)
+        if index is None:
+            index = self._lookup_indexes[lookup_property] = {}
+            column = self.columns.get(lookup_property)
+            if column is not None:
+                for node_id, code in enumerate(column.codes.tolist()):
+                    if code >= 0:
+                        index.setdefault(column.values[code], []).append(node_id)
+        return index.get(value, [])
+
+    @staticmethod
+    def _parse_level(relation_level) -> Optional[int]:
+        # an empty level renders as [r*1..] in the Cypher queries, i.e. unbounded
+        if relation_level is None or relation_level == "":
+            return None
+        return int(relation_level)
+
+    def _adjacencies(self, direction: str):
+        direction = (direction or "").lower()
+        if direction == "incoming":
+            return (self.incoming,)
+        if direction == "outgoing":
+            return (self.outgoing,)
+        return self.outgoing, self.incoming
+
+    def _neighbours(self, node_id, adjacencies, type_id):
+        for adjacency in adjacencies:
+            low, high = int(adjacency.offsets[node_id]), int(adjacency.offsets[node_id + 1])
+            for edge_id, other, edge_type in zip(adjacency.edge_ids[low:high].tolist(),
+                                                 adjacency.neighbours[low:high].tolist(),
+                                                 adjacency.types[low:high].tolist()):
+                if type_id is not None and edge_type != type_id:
+                    continue
+                if adjacency is self.incoming and len(adjacencies) == 2 and other == node_id:
+                    # an undirected pattern matches a self loop once, it is already yielded from outgoing
+                    continue
+                yield edge_id, other, edge_type
+
+    def _row(self, node_id: int, depth: int, type_id: int) -> dict:
+        properties = self.node_properties(node_id)
+        return {"relatedNode": properties.get(NAME_PROPERTY), "positionNumber": depth,
+                "relation": self.type_names[type_id], "relatedNodeProperties": properties}
+
+    def expand(self, node_name, direction: str, relation_level, limit: Optional[int],
+               relationship_type: Optional[str] = None) -> List[dict]:
+        # enumerates paths like MATCH p = (node)-[r*1..level]-(related): a relationship is used at most once
+        # per path, every path yields one row and the row count is capped by LIMIT
+        rows = []
+        max_level = self._parse_level(relation_level)
+        if max_level is not None and max_level < 1:
+            return rows
+        if limit is not None and int(limit) <= 0:
+            return rows
+        type_id = None
+        if relationship_type is not None:
+            type_id = self._type_ids.get(relationship_type)
+            if type_id is None:
+                return rows
+        adjacencies = self._adjacencies(direction)
+        for start in self.find_nodes(node_name):
+            used_edges = set()
+            path_edges = []
+            stack = [(0, self._neighbours(start, adjacencies, type_id))]
+            while stack:
+                depth, neighbours = stack[-1]
+                step = next(neighbours, None)
+                if step is None:
+                    stack.pop()
+                    if depth > 0:
+                        used_edges.discard(path_edges.pop())
+                    continue
+                edge_id, other, edge_type = step
+                if edge_id in used_edges:
+                    continue
+                rows.append(self._row(other, depth + 1, edge_type))
+                if limit is not None and len(rows) >= int(limit):
+                    return rows
+                if max_level is None or depth + 1 < max_level:
+                    used_edges.add(edge_id)
+                    path_edges.append(edge_id)
+                    stack.append((depth + 1, self._neighbours(other, adjacencies, type_id)))
+        return rows
+
+    @staticmethod
+    def _gather(adjacency: CsrAdjacency, frontier):
+        # neighbours and types of every edge leaving the frontier, without a python loop over the nodes
+        low = adjacency.offsets[frontier]
+        counts = adjacency.offsets[frontier + 1] - low
+        total = int(counts.sum())
+        if total == 0:
+            return adjacency.neighbours[:0], adjacency.types[:0]
+        positions = np.repeat(low - np.cumsum(counts) + counts, counts) + np.arange(total)
+        return adjacency.neighbours[positions], adjacency.types[positions]
+
+    def expand_frontier(self, node_name, direction: str, relation_level, limit: Optional[int],
+                        relationship_type: Optional[str] = None) -> List[dict]:
+        # same semantics as read_ws.FrontierTraversal: each related node once at its minimum depth, ordered by
+        # (depth, name, node id), reported with the smallest type name it is reached through at that depth
+        max_level = self._parse_level(relation_level)
+        limit = None if limit is None or limit == "" else int(limit)
+        type_id = None
+        if relationship_type:
+            type_id = self._type_ids.get(relationship_type)
+            if type_id is None:
+                return []
+        starts = self.find_nodes(node_name)
+        visited = np.zeros(self.node_count, dtype=bool)
+        visited[starts] = True
+        frontier = np.asarray(starts, dtype=np.int64)
+        # ranks order type ids by type name, so the smallest rank is the smallest name
+        names_by_rank = sorted(self.type_names)
+        type_ranks = np.asarray([names_by_rank.index(type_name) for type_name in self.type_names], dtype=np.int32)
+        names = self.columns.get(NAME_PROPERTY)
+        selected = []
+        depth = 0
+        while len(frontier) and (max_level is None or depth < max_level) and (limit is None or len(selected) < limit):
+            depth += 1
+            neighbours, types = [], []
+            for adjacency in self._adjacencies(direction):
+                adjacency_neighbours, adjacency_types = self._gather(adjacency, frontier)
+                neighbours.append(adjacency_neighbours)
+                types.append(adjacency_types)
+            neighbours = np.concatenate(neighbours)
+            types = np.concatenate(types)
+            keep = ~visited[neighbours]
+            if type_id is not None:
+                keep &= types == type_id
+            neighbours, types = neighbours[keep], types[keep]
+            reached, inverse = np.unique(neighbours, return_inverse=True)
+            best_ranks = np.full(len(reached), len(names_by_rank), dtype=np.int32)
+            np.minimum.at(best_ranks, inverse, type_ranks[types])
+            visited[reached] = True
+            level = []
+            for node_id, rank in zip(reached.tolist(), best_ranks.tolist()):
+                name = None
+                if names is not None and names.codes[node_id] >= 0:
+                    name = names.values[names.codes[node_id]]
+                level.append((name is None, str(name), node_id, names_by_rank[rank]))
+            level.sort()
+            selected.extend((node_id, depth, relation) for _, _, node_id, relation in level)
+            frontier = np.asarray([node_id for _, _, node_id, _ in level], dtype=np.int64)
+        if limit is not None:
+            del selected[limit:]
+        return [self._frontier_row(node_id, depth, relation) for node_id, depth, relation in selected]
+
+    def _frontier_row(self, node_id: int, depth: int, relation: str) -> dict:
+        properties = self.node_properties(node_id)
+        return {"relatedNode": properties.get(NAME_PROPERTY), "positionNumber": depth, "relation": relation,
+                "relatedNodeProperties": properties}
+
+    def retrieve(self, node_name, relationship_types: List[dict], direction: str, relation_levels,
+                 limit: Optional[int], traversal: str = TRAVERSAL_PATHS) -> List[dict]:
+        expand = self.expand_frontier if traversal == TRAVERSAL_FRONTIER else self.expand
+        results = []
+        if relationship_types:
+            for types in relationship_types:
+                results.extend(expand(node_name, types.get("direction", ""), types.get("relationLevel", ""),
+                                      limit, relationship_type=types.get("relation", "")))
+        else:
+            results.extend(expand(node_name, direction, relation_levels, limit))
+        return results
+
+
+def _row_key(row: dict):
+    return row.get("relatedNode"), row.get("positionNumber"), row.get("relation")
+
+
+def compare_with_cypher(graph: TopologyGraph, node_name: str, project_id: int, relationship_types: List[dict],
+                        direction: str, relation_levels, limit, traversal: str = TRAVERSAL_PATHS,
+                        driver=None) -> dict:
+    # parity check against the Cypher semantics of RetrieveNodeAndRelations, on `driver` or the shared
+    # DriverManager. Frontier rows are ordered, so they are compared in order; path order is not defined by
+    # Cypher, so path rows are compared as multisets and the check is only exact while LIMIT is not reached
+    from read_ws import RetrieveNodeAndRelations
+
+    retriever = RetrieveNodeAndRelations(node_name, project_id, relationship_types, direction, relation_levels,
+                                         limit, cache=None, traversal=traversal)
+    retriever.driver = driver
+    expected_rows = retriever.retrieve_relation_using_node_name()
+    actual_rows = graph.retrieve(node_name, relationship_types, direction, relation_levels, limit, traversal=traversal)
+    expected = Counter(_row_key(row) for row in expected_rows)
+    actual = Counter(_row_key(row) for row in actual_rows)
+    matches = expected == actual
+    if traversal == TRAVERSAL_FRONTIER:
+        matches = expected_rows == actual_rows
+    return {
+        "matches": matches,
+        "missing": list((expected - actual).elements()),
+        "unexpected": list((actual - expected).elements())
+    }
+
+
+if __name__ == "__main__":
+    graph = TopologyGraph.from_csv("../artifacts/1k/device_details_1k_csv.csv",
+                                   "../artifacts/1k/relationships_1k_csv.csv")
+    start = time.time()
+    data = graph.retrieve("Device7", [], "", 3, 500)
+    end = time.time()
+    print(f"{logger_tag}{len(data)} rows in " + str(end - start))
+    start = time.time()
+    data = graph.retrieve("Device7", [], "", 10, 500, traversal=TRAVERSAL_FRONTIER)
+    end = time.time()
+    print(f"{logger_tag}{len(data)} frontier rows in " + str(end - start))
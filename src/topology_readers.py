@@ -0,0 +1,116 @@
+import os
+import uuid
+from typing import Iterator, List
+
+import pandas as pd
+from openpyxl import load_workbook
+
+DEVICE_FIELD_MAPPINGS = {
+    "assetId": "Asset ID",
+    "assetName": "Asset Name",
+    "type": "Type",
+    "description": "Description",
+    "ipAddress": "IP Address",
+    "macAddress": "MAC Address",
+    "serialNumber": "Serial Number",
+    "modelNuber": "Model Number",
+    "deviceStatus": "Status",
+    "decommissioned": "Decommissioned",
+    "businessCriticality": "Business Criticality",
+    "impactRadius": "Impact Radius",
+    "resourceGroup": "Resource Group",
+    "vendor": "Vendor",
+    "manufacturer": "Manufacturer",
+    "deviceContact": "Device Contact",
+    "country": "Country",
+    "site": "Site",
+    "region": "Region",
+    "businessTimeZone": "Business Time Zone",
+    "tags": "Tags"
+}
+
+RELATIONSHIP_KEY_FIELDS = ['Relationship Type Name', 'Source Asset ID', 'Target Asset ID']
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def convert_to_aiops_fields(rows: List[dict]) -> List[dict]:
+    converted_list = []
+    for item in rows:
+        converted_item = {}
+        for aiops_key, ip_key in DEVICE_FIELD_MAPPINGS.items():
+            if ip_key in item:
+                converted_item[aiops_key] = item[ip_key]
+        converted_item["internalAssetId"] = str(uuid.uuid4())
+        converted_list.append(converted_item)
+    return converted_list
+
+
+def _iter_csv_frames(file_path: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    # dtype=str and keep_default_na=False keep values as the raw strings LOAD CSV would see
+    with pd.read_csv(file_path, chunksize=chunk_size, dtype=str, keep_default_na=False,
+                     encoding="utf-8-sig") as reader:
+        # a header-only file reads as one empty frame; the xlsx reader yields no chunk for it
+        for frame in reader:
+            if len(frame):
+                yield frame
+
+
+def _iter_csv_chunks(file_path: str, chunk_size: int) -> Iterator[List[dict]]:
+    for frame in _iter_csv_frames(file_path, chunk_size):
+        yield frame.to_dict(orient='records')
+
+
+def _iter_xlsx_chunks(file_path: str, chunk_size: int) -> Iterator[List[dict]]:
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        chunk = []
+        for values in rows:
+            if all(value is None for value in values):
+                continue
+            chunk.append(dict(zip(header, values)))
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        workbook.close()
+
+
+def iter_file_chunks(file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[dict]]:
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be a positive integer")
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in (".xlsx", ".xlsm"):
+        return _iter_xlsx_chunks(file_path, chunk_size)
+    if extension == ".csv":
+        return _iter_csv_chunks(file_path, chunk_size)
+    raise ValueError(f"Unsupported input file type: {file_path}")
+
+
+def iter_device_chunks(file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[dict]]:
+    for chunk in iter_file_chunks(file_path, chunk_size):
+        yield convert_to_aiops_fields(chunk)
+
+
+def iter_relationship_chunks(file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[dict]]:
+    yield from iter_file_chunks(file_path, chunk_size)
+
+
+def iter_file_frames(file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    # same chunks as iter_file_chunks, kept as DataFrames for the columnar batches
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be a positive integer")
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in (".xlsx", ".xlsm"):
+        # object columns keep the cell values openpyxl returns: inferring dtypes would turn an integer column
+        # with blank cells into float64 and send 1.0 and NaN where the row dicts send 1 and null
+        return (pd.DataFrame(chunk, dtype=object) for chunk in _iter_xlsx_chunks(file_path, chunk_size))
+    if extension == ".csv":
+        return _iter_csv_frames(file_path, chunk_size)
+    raise ValueError(f"Unsupported input file type: {file_path}")
@@ -0,0 +1,181 @@
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from topology_engine import CsrAdjacency, PropertyColumn, TopologyGraph
+
+logger_tag = "[TOPOLOGY-SNAPSHOT] "
+
+MAGIC = b"TOPOSNAP"
+FORMAT_VERSION = 1
+# magic, format version, reserved, offset and length of the JSON directory at the end of the file
+_HEADER = struct.Struct("<8sIIQQ")
+# sections start on cache line boundaries, so every array is aligned for its dtype
+_ALIGNMENT = 64
+
+_TAG_STRING = 0
+_TAG_JSON = 1
+
+_ADJACENCY_FIELDS = ("offsets", "neighbours", "types", "edge_ids")
+
+
+class _StringTable:
+
+    def __init__(self):
+        self._ids: Dict[tuple, int] = {}
+        self._encoded: List[bytes] = []
+        self._tags: List[int] = []
+
+    def intern(self, value) -> int:
+        # strings are stored as UTF-8, anything else a driver can return as JSON
+        if isinstance(value, str):
+            key = (_TAG_STRING, value.encode("utf-8"))
+        else:
+            key = (_TAG_JSON, json.dumps(value, default=str, sort_keys=True).encode("utf-8"))
+        string_id = self._ids.get(key)
+        if string_id is None:
+            string_id = self._ids[key] = len(self._encoded)
+            self._tags.append(key[0])
+            self._encoded.append(key[1])
+        return string_id
+
+    def arrays(self) -> dict:
+        offsets = np.zeros(len(self._encoded) + 1, dtype=np.int64)
+        np.cumsum([len(encoded) for encoded in self._encoded], out=offsets[1:])
+        return {"strings.offsets": offsets,
+                "strings.tags": np.asarray(self._tags, dtype=np.uint8),
+                "strings.data": np.frombuffer(b"".join(self._encoded), dtype=np.uint8)}
+
+
+class _MappedStrings:
+    __slots__ = ("_data", "_offsets", "_tags")
+
+    def __init__(self, data, offsets, tags):
+        self._data = data
+        self._offsets = offsets
+        self._tags = tags
+
+    def get(self, string_id: int):
+        low, high = int(self._offsets[string_id]), int(self._offsets[string_id + 1])
+        text = self._data[low:high].tobytes().decode("utf-8")
+        return text if self._tags[string_id] == _TAG_STRING else json.loads(text)
+
+
+class MappedValues(Sequence):
+    # PropertyColumn.values backed by the mapped string table: a value is decoded when it is read, so
+    # loading a snapshot does not materialise a python object per distinct value
+
+    def __init__(self, strings: _MappedStrings, string_ids):
+        self._strings = strings
+        self._string_ids = string_ids
+
+    def __len__(self):
+        return len(self._string_ids)
+
+    def __getitem__(self, code):
+        if isinstance(code, slice):
+            return [self._strings.get(int(string_id)) for string_id in self._string_ids[code]]
+        return self._strings.get(int(self._string_ids[code]))
+
+
+def write_snapshot(graph: TopologyGraph, path: str) -> dict:
+    start = time.time()
+    strings = _StringTable()
+    arrays = {}
+    for name, adjacency in (("outgoing", graph.outgoing), ("incoming", graph.incoming)):
+        for field in _ADJACENCY_FIELDS:
+            arrays[f"{name}.{field}"] = getattr(adjacency, field)
+    columns = {}
+    for index, (key, column) in enumerate(graph.columns.items()):
+        arrays[f"columns.{index}.codes"] = column.codes
+        arrays[f"columns.{index}.values"] = np.asarray([strings.intern(value) for value in column.values],
+                                                       dtype=np.int32)
+        columns[key] = index
+    type_names = [strings.intern(type_name) for type_name in graph.type_names]
+    arrays.update(strings.arrays())
+
+    directory = {"nodeCount": graph.node_count, "typeNames": type_names, "columns": columns, "sections": {}}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as snapshot_file:
+        position = _aligned(_HEADER.size)
+        for name, array in arrays.items():
+            snapshot_file.seek(position)
+            snapshot_file.write(np.ascontiguousarray(array).tobytes())
+            directory["sections"][name] = {"offset": position, "dtype": array.dtype.str, "length": int(array.size)}
+            position = _aligned(position + array.nbytes)
+        encoded = json.dumps(directory).encode("utf-8")
+        snapshot_file.seek(position)
+        snapshot_file.write(encoded)
+        snapshot_file.seek(0)
+        snapshot_file.write(_HEADER.pack(MAGIC, FORMAT_VERSION, 0, position, len(encoded)))
+    position += len(encoded)
+    # replaced in one step, so a worker never maps a half written snapshot
+    os.replace(tmp_path, path)
+    end = time.time()
+    print(f"{logger_tag}wrote {graph.node_count} nodes and {graph.edge_count} relations to {path} in "
+          + str(end - start))
+    return {"path": path, "bytes": position, "nodes": graph.node_count, "relations": graph.edge_count}
+
+
+def _aligned(position: int) -> int:
+    return (position + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def load_snapshot(path: str) -> TopologyGraph:
+    # every array is a read-only view of the mapping, nothing is copied: processes mapping the same file
+    # share its pages through the page cache
+    with open(path, "rb") as snapshot_file:
+        if os.fstat(snapshot_file.fileno()).st_size < _HEADER.size:
+            raise ValueError(f"{path} is not a topology snapshot")
+        mapping = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, _, directory_offset, directory_length = _HEADER.unpack_from(mapping, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a topology snapshot")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"unsupported topology snapshot version {version}")
+    # the directory is written last, a truncated file loses it first
+    if directory_offset + directory_length > len(mapping):
+        raise ValueError(f"{path} is truncated")
+    try:
+        directory = json.loads(mapping[directory_offset:directory_offset + directory_length])
+    except ValueError:
+        raise ValueError(f"{path} has a corrupt directory") from None
+
+    def _section(name):
+        section = directory["sections"][name]
+        return np.frombuffer(mapping, dtype=np.dtype(section["dtype"]), count=section["length"],
+                             offset=section["offset"])
+
+    strings = _MappedStrings(_section("strings.data"), _section("strings.offsets"), _section("strings.tags"))
+    adjacencies = {name: CsrAdjacency(*(_section(f"{name}.{field}") for field in _ADJACENCY_FIELDS))
+                   for name in ("outgoing", "incoming")}
+    columns = {key: PropertyColumn(_section(f"columns.{index}.codes"),
+                                   MappedValues(strings, _section(f"columns.{index}.values")))
+               for key, index in directory["columns"].items()}
+    return TopologyGraph(columns=columns, type_names=[strings.get(string_id) for string_id in directory["typeNames"]],
+                         outgoing=adjacencies["outgoing"], incoming=adjacencies["incoming"])
+
+
+def export_csv_snapshot(device_file: str, relationship_file: Optional[str], path: str) -> dict:
+    return write_snapshot(TopologyGraph.from_csv(device_file, relationship_file), path)
+
+
+def export_driver_snapshot(driver, node_label: str, path: str, database: Optional[str] = None) -> dict:
+    return write_snapshot(TopologyGraph.from_driver(driver, node_label, database), path)
+
+
+if __name__ == "__main__":
+    snapshot_location = os.path.join(tempfile.gettempdir(), "topology_5k.snapshot")
+    print(export_csv_snapshot("../artifacts/5k/device_details_5k_csv.csv", "../artifacts/5k/relationships_5k_csv.csv",
+                              snapshot_location))
+    start = time.time()
+    graph = load_snapshot(snapshot_location)
+    data = graph.retrieve("Device7", [], "", 3, 500)
+    end = time.time()
+    print(f"{logger_tag}loaded and retrieved {len(data)} rows in " + str(end - start))
@@ -1,54 +1,426 @@
-import time
-import uuid
-from typing import List
+from collections import defaultdict
+from itertools import chain
+from typing import Iterable, List, Optional
 
-import pandas as pd
-from neo4j import GraphDatabase, WRITE_ACCESS
+from neo4j import WRITE_ACCESS
 
+from bulk_impot_csv import _quote
+from driver_manager import get_driver_manager
+from instrumentation import configure_metrics, JsonLinesExporter, metrics
+from parallel_import import ParallelRelationshipImporter
+from result_cache import relation_cache
+from topology_readers import (RELATIONSHIP_KEY_FIELDS, convert_to_aiops_fields, iter_device_chunks,
+                              iter_relationship_chunks)
 
-class ImportTopologyWithRelationsService:
-    def __init__(self, *, project_id: int, device_details_data: List[dict], relationship_data: List[dict]):
+
+DEFAULT_STREAM_BATCH_SIZE = 1000
+
+SERVICE = "import"
+
+
+class TopologyImportBase:
+    # input rows, label and batch Cypher shared by the sync and the async import; a subclass resolves its
+    # driver in _establish_connection and only defines the entry points it supports
+
+    def __init__(self, *, project_id: int, device_details_data: Optional[List[dict]] = None,
+                 relationship_data: Optional[List[dict]] = None, batch_size: Optional[int] = None):
         self._project_id: int = int(project_id)
-        self._device_details_data: List[dict] = device_details_data
-        self._relationship_data: List[dict] = relationship_data
+        self._device_details_data: List[dict] = device_details_data or []
+        self._relationship_data: List[dict] = relationship_data or []
         self._node_label = "CI_10K_loop"
         self._unique_properties = ["assetId"]
         self._node_indices = ["name"]
         self._rel_indices = ["type", "assetId"]
+        self._batch_size: Optional[int] = int(batch_size) if batch_size else None
         self._driver = self._establish_connection()
 
+    def _chunked(self, rows):
+        for offset in range(0, len(rows), self._batch_size):
+            yield rows[offset:offset + self._batch_size]
+
+    def _node_batch_query(self):
+        return (
+            "UNWIND $rows AS row "
+            f"MERGE (n:{self._node_label} {{name: row.asset_name}}) "
+            "SET n += row.properties"
+        )
+
     @staticmethod
-    def _establish_connection():
+    def _node_batch_rows(items):
+        return [{"asset_name": item['assetName'],
+                 "properties": {k: v for k, v in item.items() if k != 'assetName'}} for item in items]
 
-        neo4j_uname = "neo4j"  # replace with correct value
-        neo4j_pwd = "password"
-        neo4j_uri = "uri"
+    @staticmethod
+    def _group_relationship_rows(items):
+        rows_by_type = defaultdict(list)
+        for item in items:
+            rows_by_type[item['Relationship Type Name']].append({
+                "source_asset_id": item['Source Asset ID'],
+                "target_asset_id": item['Target Asset ID'],
+                "properties": {k: v for k, v in item.items() if k not in RELATIONSHIP_KEY_FIELDS}
+            })
+        return rows_by_type
 
-        if neo4j_uname and neo4j_pwd and neo4j_uri:
-            start = time.time()
-            _driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_uname, neo4j_pwd))
-            end = time.time()
-            print("Time taken for initializing driver: " + str(end - start))
-            return _driver
-        else:
-            raise RuntimeError("Driver not initialized")
+    def _relationship_batch_query(self, rel_type_name):
+        return (
+            "UNWIND $rows AS row "
+            f"MATCH (source:{self._node_label} {{assetId: row.source_asset_id}}), "
+            f"(target:{self._node_label} {{assetId: row.target_asset_id}}) "
+            "MERGE (source)-[r:`" + rel_type_name + "`]->(target) "
+            "SET r += row.properties"
+        )
+
+    def _convert_to_aiops_fields(self):
+        self._device_details_data = convert_to_aiops_fields(self._device_details_data)
+
+    def _index_queries(self):
+        queries = []
+        for index in self._node_indices:
+            node_index_query = f"CREATE INDEX composite_range_node_index_name IF NOT EXISTS FOR (n:{self._node_label}) ON (n.{index})"
+            queries.append(node_index_query)
+        for index in self._rel_indices:
+            rel_index_query = f"CREATE INDEX composite_range_rel_index_name1 IF NOT EXISTS FOR ()-[r:{self._node_label}]-() ON (r.{index})"
+            queries.append(rel_index_query)
+        return queries
+
+    def _constraint_query(self):
+        return (
+            f"CREATE CONSTRAINT IF NOT EXISTS FOR (label:{self._node_label}) "
+            f"REQUIRE ({', '.join(f'label.{prop}' for prop in self._unique_properties)}) IS NODE KEY"
+        )
+
+
+class ImportTopologyWithRelationsService(TopologyImportBase):
+    def __init__(self, *, project_id: int, device_details_data: Optional[List[dict]] = None,
+                 relationship_data: Optional[List[dict]] = None, batch_size: Optional[int] = None,
+                 parallel_workers: Optional[int] = None, controller=None, impact_index=None):
+        self._parallel_workers: Optional[int] = int(parallel_workers) if parallel_workers else None
+        # import_controller.ImportController: adaptive batch size, retries and checkpoints for the writes
+        self._controller = controller
+        # impact_index.ImpactIndex kept up to date with every import, its summaries are stored on the nodes
+        self._impact_index = impact_index
+        super().__init__(project_id=project_id, device_details_data=device_details_data,
+                         relationship_data=relationship_data, batch_size=batch_size)
+
+    @staticmethod
+    def _establish_connection():
+        return get_driver_manager()
 
     def process_input(self):
-        start = time.time()
+        try:
+            with metrics.phase(SERVICE, "total"):
+                if self._controller:
+                    self._convert_to_aiops_fields()
+                    self._write_input_controlled(self._device_details_data, self._relationship_data)
+                else:
+                    self._write_input()
+                if self._impact_index is not None:
+                    self._impact_index.upsert_nodes(self._device_details_data)
+                    self._impact_index.add_relationship_rows(self._relationship_data)
+                    self._write_impact_summaries()
+        finally:
+            relation_cache.invalidate_all()
+        msg = f"Nodes and relationships created successfully in Neo4j database {self._node_label}."
+        return {"statusCode": 200, "statusMessage": msg}
+
+    def _write_input(self):
         with self._driver.session(default_access_mode=WRITE_ACCESS) as session:
             self._create_indices(session)
             self._create_constraints(session)
-            self._create_nodes(session)
-            self._match_relationships(session)
+            if self._parallel_workers and not self._batch_size:
+                self._batch_size = DEFAULT_STREAM_BATCH_SIZE
+            with metrics.phase(SERVICE, "nodes"):
+                if self._batch_size:
+                    self._create_nodes_batched(session)
+                else:
+                    self._create_nodes(session)
+            with metrics.phase(SERVICE, "relationships"):
+                if self._parallel_workers:
+                    self._match_relationships_parallel()
+                elif self._batch_size:
+                    self._match_relationships_batched(session)
+                else:
+                    self._match_relationships(session)
             session.close()
-        self._driver.close()
-        end = time.time()
-        print("Total time taken for execution: " + str(end - start))
+
+    def process_input_stream(self, device_chunks: Iterable[List[dict]], relationship_chunks: Iterable[List[dict]]):
+        # chunks are expected to be converted already (see topology_readers.iter_device_chunks)
+        if not self._batch_size:
+            self._batch_size = DEFAULT_STREAM_BATCH_SIZE
+        device_chunks, relationship_chunks = self._track_chunks(device_chunks, relationship_chunks)
+        try:
+            with metrics.phase(SERVICE, "total"):
+                if self._controller:
+                    self._write_input_controlled(chain.from_iterable(device_chunks),
+                                                 chain.from_iterable(relationship_chunks))
+                else:
+                    self._write_input_stream(device_chunks, relationship_chunks)
+                self._write_impact_summaries()
+        finally:
+            relation_cache.invalidate_all()
         msg = f"Nodes and relationships created successfully in Neo4j database {self._node_label}."
         return {"statusCode": 200, "statusMessage": msg}
 
+    def process_input_columnar(self, device_batches: Iterable, relationship_batches: Iterable):
+        # DeviceBatch / RelationshipBatch from columnar_batches: column lists go to the driver as they are,
+        # no per-row dicts are built on the client
+        if self._impact_index is not None:
+            device_batches = self._track_device_batches(device_batches)
+            relationship_batches = self._track_relationship_batches(relationship_batches)
+        try:
+            with metrics.phase(SERVICE, "total"):
+                self._write_input_columnar(device_batches, relationship_batches)
+                self._write_impact_summaries()
+        finally:
+            relation_cache.invalidate_all()
+        msg = f"Nodes and relationships created successfully in Neo4j database {self._node_label}."
+        return {"statusCode": 200, "statusMessage": msg}
+
+    def process_delta(self, fingerprint_store, device_chunks: Optional[Iterable[List[dict]]] = None,
+                      relationship_chunks: Optional[Iterable[List[dict]]] = None, delete_missing: bool = True):
+        # the input is treated as a full snapshot: rows whose fingerprint is unchanged are skipped and, with
+        # delete_missing, nodes and relationships absent from the snapshot are removed from the graph
+        if not self._batch_size:
+            self._batch_size = DEFAULT_STREAM_BATCH_SIZE
+        if device_chunks is None:
+            self._convert_to_aiops_fields()
+            device_chunks = self._chunked(self._device_details_data)
+        if relationship_chunks is None:
+            relationship_chunks = self._chunked(self._relationship_data)
+        # the whole snapshot goes through the impact index, it only marks what actually changed
+        device_chunks, relationship_chunks = self._track_chunks(device_chunks, relationship_chunks)
+        summary = {kind: {"written": 0, "skipped": 0, "deleted": 0} for kind in ("nodes", "relationships")}
+        # relationships whose endpoints are not in the graph yet; they are written by the run that brings them
+        summary["relationships"]["unmatched"] = 0
+        run_id = fingerprint_store.begin_run()
+        try:
+            with metrics.phase(SERVICE, "total"):
+                self._write_delta(fingerprint_store, run_id, device_chunks, relationship_chunks, delete_missing,
+                                  summary)
+                self._write_impact_summaries()
+        finally:
+            relation_cache.invalidate_all()
+        for kind, counts in summary.items():
+            for outcome, count in counts.items():
+                metrics.increment("topology_delta_rows_total", count, service=SERVICE, kind=kind, outcome=outcome)
+        msg = f"Delta of nodes and relationships applied successfully in Neo4j database {self._node_label}."
+        return {"statusCode": 200, "statusMessage": msg, "summary": summary}
+
+    def _write_delta(self, store, run_id, device_chunks, relationship_chunks, delete_missing, summary):
+        with self._driver.session(default_access_mode=WRITE_ACCESS) as session:
+            self._create_indices(session)
+            self._create_constraints(session)
+            with metrics.phase(SERVICE, "nodes"):
+                for chunk in device_chunks:
+                    changed, skipped = store.classify_nodes(run_id, chunk)
+                    summary["nodes"]["skipped"] += skipped
+                    for batch in self._chunked(changed):
+                        store.record_nodes(run_id, batch, self._write_node_delta_batch(session, batch))
+                        summary["nodes"]["written"] += len(batch)
+            with metrics.phase(SERVICE, "relationships"):
+                for chunk in relationship_chunks:
+                    for rel_type_name, rel_rows in self._group_relationship_rows(chunk).items():
+                        changed, skipped = store.classify_edges(run_id, rel_type_name, rel_rows)
+                        summary["relationships"]["skipped"] += skipped
+                        for batch in self._chunked(changed):
+                            written = self._write_relationship_delta_batch(session, rel_type_name, batch)
+                            store.record_edges(run_id, rel_type_name, batch, written)
+                            summary["relationships"]["written"] += len(written)
+                            summary["relationships"]["unmatched"] += len(batch) - len(written)
+            if delete_missing:
+                with metrics.phase(SERVICE, "deletions"):
+                    for rows in store.iter_unseen_edges(run_id, self._batch_size):
+                        summary["relationships"]["deleted"] += self._delete_relationship_batch(session, rows)
+                    for asset_ids in store.iter_unseen_nodes(run_id, self._batch_size):
+                        summary["nodes"]["deleted"] += self._delete_node_batch(session, asset_ids)
+                    store.forget_unseen(run_id)
+            session.close()
+        store.complete_run(run_id)
+
+    def _write_node_delta_batch(self, session, items):
+        # keeps the internalAssetId a node already has; only nodes that never had one take the new UUID
+        cypher_query = (
+            "UNWIND $rows AS row "
+            f"MERGE (n:{self._node_label} {{name: row.asset_name}}) "
+            "SET n += row.properties, n.internalAssetId = coalesce(n.internalAssetId, row.internal_asset_id) "
+            "RETURN row.asset_id AS assetId, n.internalAssetId AS internalAssetId"
+        )
+        rows = [{"asset_name": item['assetName'], "asset_id": item.get('assetId'),
+                 "internal_asset_id": item.get('internalAssetId'),
+                 "properties": {k: v for k, v in item.items() if k not in ('assetName', 'internalAssetId')}}
+                for item in items]
+
+        def _delta_tx(tx):
+            result = tx.run(metrics.profiled(cypher_query), rows=rows)
+            records = result.data()
+            metrics.record_summary(SERVICE, result.consume())
+            return records
+
+        with metrics.query(SERVICE, "merge_node_delta_batch"):
+            records = session.execute_write(_delta_tx)
+        metrics.increment("topology_rows_total", len(rows), service=SERVICE, kind="nodes")
+        return {record["assetId"]: record["internalAssetId"] for record in records}
+
+    def _write_relationship_delta_batch(self, session, rel_type_name, rows):
+        # a row whose source or target is missing matches nothing, so only the keys the MERGE saw come back
+        cypher_query = (
+            self._relationship_batch_query(rel_type_name) + " "
+            "RETURN row.source_asset_id AS sourceAssetId, row.target_asset_id AS targetAssetId"
+        )
+
+        def _delta_tx(tx):
+            result = tx.run(metrics.profiled(cypher_query), rows=rows)
+            records = result.data()
+            metrics.record_summary(SERVICE, result.consume())
+            return records
+
+        with metrics.query(SERVICE, "merge_relationship_delta_batch"):
+            records = session.execute_write(_delta_tx)
+        metrics.increment("topology_rows_total", len(records), service=SERVICE, kind="relationships")
+        return {(record["sourceAssetId"], record["targetAssetId"]) for record in records}
+
+    def _delete_relationship_batch(self, session, rows):
+        rows_by_type = defaultdict(list)
+        for source_asset_id, target_asset_id, rel_type_name in rows:
+            rows_by_type[rel_type_name].append({"source_asset_id": source_asset_id,
+                                                "target_asset_id": target_asset_id})
+        for rel_type_name, rel_rows in rows_by_type.items():
+            cypher_query = (
+                "UNWIND $rows AS row "
+                f"MATCH (source:{self._node_label} {{assetId: row.source_asset_id}})-[r:`" + rel_type_name + "`]->"
+                f"(target:{self._node_label} {{assetId: row.target_asset_id}}) "
+                "DELETE r"
+            )
+            with metrics.query(SERVICE, "delete_relationship_batch"):
+                session.execute_write(self._run_batch_tx, cypher_query, rel_rows)
+        if self._impact_index is not None:
+            for source_asset_id, target_asset_id, rel_type_name in rows:
+                self._impact_index.remove_edge(source_asset_id, target_asset_id, rel_type_name)
+        return len(rows)
+
+    def _delete_node_batch(self, session, asset_ids):
+        cypher_query = (
+            "UNWIND $rows AS asset_id "
+            f"MATCH (n:{self._node_label} {{assetId: asset_id}}) "
+            "DETACH DELETE n"
+        )
+        with metrics.query(SERVICE, "delete_node_batch"):
+            session.execute_write(self._run_batch_tx, cypher_query, asset_ids)
+        if self._impact_index is not None:
+            for asset_id in asset_ids:
+                self._impact_index.remove_node(asset_id)
+        return len(asset_ids)
+
+    def _track_chunks(self, device_chunks, relationship_chunks):
+        if self._impact_index is None:
+            return device_chunks, relationship_chunks
+        return (self._track_device_chunks(device_chunks), self._track_relationship_chunks(relationship_chunks))
+
+    def _track_device_chunks(self, chunks):
+        for chunk in chunks:
+            self._impact_index.upsert_nodes(chunk)
+            yield chunk
+
+    def _track_relationship_chunks(self, chunks):
+        for chunk in chunks:
+            self._impact_index.add_relationship_rows(chunk)
+            yield chunk
+
+    def _track_device_batches(self, batches):
+        for batch in batches:
+            criticality = batch.columns.get("businessCriticality", [None] * batch.size)
+            for asset_id, asset_name, value in zip(batch.columns["assetId"], batch.columns["assetName"],
+                                                   criticality):
+                self._impact_index.upsert_node(asset_id, asset_name, value)
+            yield batch
+
+    def _track_relationship_batches(self, batches):
+        for batch in batches:
+            for source_asset_id, target_asset_id in zip(batch.source_asset_ids, batch.target_asset_ids):
+                self._impact_index.add_edge(source_asset_id, target_asset_id, batch.rel_type_name)
+            yield batch
+
+    def _write_impact_summaries(self):
+        if self._impact_index is None:
+            return
+        with metrics.phase(SERVICE, "impact_summaries"):
+            with self._driver.session(default_access_mode=WRITE_ACCESS) as session:
+                # an index that only saw this input reaches no further than it, its summaries would overwrite
+                # the ones computed from the whole graph; it is synced from the graph once before writing
+                if self._impact_index.is_synced(self._node_label):
+                    changed = self._impact_index.refresh()
+                else:
+                    changed = self._impact_index.sync_from_session(session, self._node_label)
+                self._impact_index.write_summaries(session, self._node_label, changed,
+                                                   self._batch_size or DEFAULT_STREAM_BATCH_SIZE)
+
+    def _write_input_stream(self, device_chunks, relationship_chunks):
+        with self._driver.session(default_access_mode=WRITE_ACCESS) as session:
+            self._create_indices(session)
+            self._create_constraints(session)
+            with metrics.phase(SERVICE, "nodes"):
+                for chunk in device_chunks:
+                    for batch in self._chunked(chunk):
+                        self._write_node_batch(session, batch)
+            with metrics.phase(SERVICE, "relationships"):
+                # one importer for the whole stream, it buffers chunks so the rounds are not run per chunk
+                importer = self._parallel_importer() if self._parallel_workers else None
+                for chunk in relationship_chunks:
+                    if importer:
+                        importer.add(self._group_relationship_rows(chunk))
+                    else:
+                        for rel_type_name, rel_rows in self._group_relationship_rows(chunk).items():
+                            for batch in self._chunked(rel_rows):
+                                self._write_relationship_batch(session, rel_type_name, batch)
+                if importer:
+                    importer.flush()
+            session.close()
+
+    def _write_input_controlled(self, device_rows, relationship_rows):
+        with self._driver.session(default_access_mode=WRITE_ACCESS) as session:
+            self._create_indices(session)
+            self._create_constraints(session)
+        with metrics.phase(SERVICE, "nodes"):
+            self._controller.run("nodes", device_rows, self._write_node_rows_tx)
+        with metrics.phase(SERVICE, "relationships"):
+            self._controller.run("relationships", relationship_rows, self._write_relationship_rows_tx)
+        self._controller.complete()
+
+    def _write_node_rows_tx(self, tx, items):
+        self._run_batch_tx(tx, self._node_batch_query(), self._node_batch_rows(items))
+
+    def _write_relationship_rows_tx(self, tx, items):
+        # every type of the batch is written in the same transaction, so the batch commits or fails as a whole
+        self._write_relationship_groups_tx(tx, self._group_relationship_rows(items))
+
+    def _write_relationship_groups_tx(self, tx, rows_by_type):
+        for rel_type_name, rows in rows_by_type.items():
+            self._run_batch_tx(tx, self._relationship_batch_query(rel_type_name), rows)
+
+    def _write_input_columnar(self, device_batches, relationship_batches):
+        with self._driver.session(default_access_mode=WRITE_ACCESS) as session:
+            self._create_indices(session)
+            self._create_constraints(session)
+            with metrics.phase(SERVICE, "nodes"):
+                for batch in device_batches:
+                    if batch.size:
+                        with metrics.query(SERVICE, "merge_node_columns"):
+                            session.execute_write(self._run_parameters_tx,
+                                                  self._columnar_node_query(batch.property_keys()),
+                                                  batch.parameters())
+                        metrics.increment("topology_rows_total", batch.size, service=SERVICE, kind="nodes")
+            with metrics.phase(SERVICE, "relationships"):
+                for batch in relationship_batches:
+                    if batch.size:
+                        with metrics.query(SERVICE, "merge_relationship_columns"):
+                            session.execute_write(self._run_parameters_tx,
+                                                  self._columnar_relationship_query(batch.rel_type_name,
+                                                                                    batch.property_keys()),
+                                                  batch.parameters())
+                        metrics.increment("topology_rows_total", batch.size, service=SERVICE, kind="relationships")
+            session.close()
+
     def _create_nodes(self, session):
-        full_start = time.time()
         self._convert_to_aiops_fields()
         for item in self._device_details_data:
             asset_name = item['assetName']
@@ -59,18 +431,16 @@ class ImportTopologyWithRelationsService:
                     f"MERGE (n:{self._node_label} {{name: $asset_name}}) "
                     "SET n += $properties"
                 )
-                tx.run(cypher_query, asset_name=asset_name, properties=properties)
+                result = tx.run(metrics.profiled(cypher_query), asset_name=asset_name, properties=properties)
+                if metrics.enabled:
+                    metrics.record_summary(SERVICE, result.consume())
 
-            start = time.time()
-            # session.execute_write(_create_node_tx, asset_name=asset_name, properties=properties)
-            _create_node_tx(session, asset_name=asset_name, properties=properties)
-            end = time.time()
-            print("Time taken for creating each nodes: " + str(end - start))
-        full_end = time.time()
-        print("Total Time taken for creating nodes: " + str(full_end - full_start))
+            with metrics.query(SERVICE, "merge_node"):
+                # session.execute_write(_create_node_tx, asset_name=asset_name, properties=properties)
+                _create_node_tx(session, asset_name=asset_name, properties=properties)
+        metrics.increment("topology_rows_total", len(self._device_details_data), service=SERVICE, kind="nodes")
 
     def _match_relationships(self, session):
-        full_start = time.time()
         for item in self._relationship_data:
             source_asset_id = item['Source Asset ID']
             target_asset_id = item['Target Asset ID']
@@ -84,92 +454,96 @@ class ImportTopologyWithRelationsService:
                         "MERGE (source)-[r:`" + rel_type_name + "`]->(target) "
                                                                 "SET r += $properties"
                 )
-                tx.run(cypher_query, source_asset_id=source_asset_id, target_asset_id=target_asset_id,
-                       properties=properties)
-
-            start = time.time()
-            # session.execute_write(_match_rel_tx, rel_type_name=rel_type_name, source_asset_id=source_asset_id, target_asset_id=target_asset_id,
-            #                       properties=properties)
-            _match_rel_tx(session, rel_type_name=rel_type_name, source_asset_id=source_asset_id,
-                          target_asset_id=target_asset_id,
-                          properties=properties)
-            end = time.time()
-            print("Time taken for matching each nodes: " + str(end - start))
-        full_end = time.time()
-        print("Total Time taken for matching relations: " + str(full_end - full_start))
+                result = tx.run(metrics.profiled(cypher_query), source_asset_id=source_asset_id,
+                                target_asset_id=target_asset_id, properties=properties)
+                if metrics.enabled:
+                    metrics.record_summary(SERVICE, result.consume())
 
-    def _convert_to_aiops_fields(self):
-        mappings = {
-            "assetId": "Asset ID",
-            "assetName": "Asset Name",
-            "type": "Type",
-            "description": "Description",
-            "ipAddress": "IP Address",
-            "macAddress": "MAC Address",
-            "serialNumber": "Serial Number",
-            "modelNuber": "Model Number",
-            "deviceStatus": "Status",
-            "decommissioned": "Decommissioned",
-            "businessCriticality": "Business Criticality",
-            "impactRadius": "Impact Radius",
-            "resourceGroup": "Resource Group",
-            "vendor": "Vendor",
-            "manufacturer": "Manufacturer",
-            "deviceContact": "Device Contact",
-            "country": "Country",
-            "site": "Site",
-            "region": "Region",
-            "businessTimeZone": "Business Time Zone",
-            "tags": "Tags"
-        }
-        converted_list = []
-        for item in self._device_details_data:
-            converted_item = {}
-            for aiops_key, ip_key in mappings.items():
-                if ip_key in item:
-                    converted_item[aiops_key] = item[ip_key]
-            converted_item["internalAssetId"] = str(uuid.uuid4())
-            converted_list.append(converted_item)
+            with metrics.query(SERVICE, "merge_relationship"):
+                # session.execute_write(_match_rel_tx, rel_type_name=rel_type_name, source_asset_id=source_asset_id, target_asset_id=target_asset_id,
+                #                       properties=properties)
+                _match_rel_tx(session, rel_type_name=rel_type_name, source_asset_id=source_asset_id,
+                              target_asset_id=target_asset_id,
+                              properties=properties)
+        metrics.increment("topology_rows_total", len(self._relationship_data), service=SERVICE,
+                          kind="relationships")
+
+    @staticmethod
+    def _run_batch_tx(tx, cypher_query, rows):
+        metrics.record_summary(SERVICE, tx.run(metrics.profiled(cypher_query), rows=rows).consume())
 
-        self._device_details_data = converted_list
+    @staticmethod
+    def _run_parameters_tx(tx, cypher_query, parameters):
+        metrics.record_summary(SERVICE, tx.run(metrics.profiled(cypher_query), parameters).consume())
 
-    def _create_indices(self, session):
-        start = time.time()
+    def _create_nodes_batched(self, session):
+        self._convert_to_aiops_fields()
+        for chunk in self._chunked(self._device_details_data):
+            self._write_node_batch(session, chunk)
+
+    def _write_node_batch(self, session, items):
+        rows = self._node_batch_rows(items)
+        with metrics.query(SERVICE, "merge_node_batch"):
+            session.execute_write(self._run_batch_tx, self._node_batch_query(), rows)
+        metrics.increment("topology_rows_total", len(rows), service=SERVICE, kind="nodes")
 
+    def _match_relationships_batched(self, session):
+        for rel_type_name, rel_rows in self._group_relationship_rows(self._relationship_data).items():
+            for chunk in self._chunked(rel_rows):
+                self._write_relationship_batch(session, rel_type_name, chunk)
+
+    def _parallel_importer(self):
+        return ParallelRelationshipImporter(self._driver, self._write_relationship_groups_tx,
+                                            worker_count=self._parallel_workers, batch_size=self._batch_size,
+                                            service=SERVICE)
+
+    def _match_relationships_parallel(self):
+        return self._parallel_importer().import_relationships(self._group_relationship_rows(self._relationship_data))
+
+    def _columnar_node_query(self, property_keys):
+        properties = ", ".join(f"{_quote(key)}: $columns.{_quote(key)}[i]" for key in property_keys)
+        return (
+            "UNWIND range(0, $count - 1) AS i "
+            f"MERGE (n:{self._node_label} {{name: $columns.assetName[i]}}) "
+            f"SET n += {{{properties}}}"
+        )
+
+    def _columnar_relationship_query(self, rel_type_name, property_keys):
+        properties = ", ".join(f"{_quote(key)}: $properties[{index}][i]" for index, key in enumerate(property_keys))
+        return (
+            "UNWIND range(0, $count - 1) AS i "
+            f"MATCH (source:{self._node_label} {{assetId: $sources[i]}}), "
+            f"(target:{self._node_label} {{assetId: $targets[i]}}) "
+            f"MERGE (source)-[r:{_quote(rel_type_name)}]->(target) "
+            f"SET r += {{{properties}}}"
+        )
+
+    def _write_relationship_batch(self, session, rel_type_name, rows):
+        with metrics.query(SERVICE, "merge_relationship_batch"):
+            session.execute_write(self._run_batch_tx, self._relationship_batch_query(rel_type_name), rows)
+        metrics.increment("topology_rows_total", len(rows), service=SERVICE, kind="relationships")
+
+    def _create_indices(self, session):
         def _create_indices_tx(tx):
-            for index in self._node_indices:
-                node_index_query = f"CREATE INDEX composite_range_node_index_name IF NOT EXISTS FOR (n:{self._node_label}) ON (n.{index})"
-                tx.run(node_index_query)
-            for index in self._rel_indices:
-                rel_index_query = f"CREATE INDEX composite_range_rel_index_name1 IF NOT EXISTS FOR ()-[r:{self._node_label}]-() ON (r.{index})"
-                tx.run(rel_index_query)
+            for index_query in self._index_queries():
+                tx.run(index_query)
 
-        session.execute_write(_create_indices_tx)
-        end = time.time()
-        print("Time taken for creating indices: " + str(end - start))
+        with metrics.phase(SERVICE, "indices"):
+            session.execute_write(_create_indices_tx)
 
     def _create_constraints(self, session):
-        start = time.time()
-
         def _create_constraints_tx(tx):
-            cypher_query = (
-                f"CREATE CONSTRAINT IF NOT EXISTS FOR (label:{self._node_label}) "
-                f"REQUIRE ({', '.join(f'label.{prop}' for prop in self._unique_properties)}) IS NODE KEY"
-            )
-            tx.run(cypher_query)
+            tx.run(self._constraint_query())
 
-        session.execute_write(_create_constraints_tx)
-        end = time.time()
-        print("Time taken for creating constraints: " + str(end - start))
+        with metrics.phase(SERVICE, "constraints"):
+            session.execute_write(_create_constraints_tx)
 
 
 if __name__ == "__main__":
+    configure_metrics(enabled=True, exporters=[JsonLinesExporter()])
     device_details_location = "C:/Users/192296/Downloads/Neo4j/demo/device_details.xlsx"
     relationship_location = "C:/Users/192296/Downloads/Neo4j/demo/relationship_details.xlsx"
-    device_details_df = pd.read_excel(device_details_location)
-    relationship_df = pd.read_excel(relationship_location)
-    device_details_data = device_details_df.to_dict(orient='records')
-    relationship_data = relationship_df.to_dict(orient='records')
-    obj = ImportTopologyWithRelationsService(project_id=60, device_details_data=device_details_data,
-                                             relationship_data=relationship_data)
-    response = obj.process_input()
+    obj = ImportTopologyWithRelationsService(project_id=60, batch_size=1000)
+    response = obj.process_input_stream(device_chunks=iter_device_chunks(device_details_location),
+                                        relationship_chunks=iter_relationship_chunks(relationship_location))
+    metrics.flush()
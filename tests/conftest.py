@@ -0,0 +1,17 @@
+import pytest
+
+import driver_manager
+from stand_in_driver import StandInDriver
+
+
+@pytest.fixture
+def stand_in_manager():
+    # the services resolve their driver through the shared DriverManager, so it is pointed at a stand-in
+    def _configure(driver_class=StandInDriver, **driver_config):
+        return driver_manager.configure_driver_manager(
+            uri="stand-in://local", username="test", password="test",
+            driver_factory=lambda uri, **config: driver_class(uri, **{**config, **driver_config}))
+
+    yield _configure
+    driver_manager.configure_driver_manager(uri="stand-in://local", username="test", password="test",
+                                            driver_factory=StandInDriver).close()
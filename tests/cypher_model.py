@@ -0,0 +1,149 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+# MATCH p = (node:Label)-[r*1..level]-(related) as rendered by RetrieveNodeAndRelations._queries/_build_query
+_PATH_QUERY = re.compile(r"MATCH p = \(node:\w+\)(<?-)\[r\*1\.\.(\d*)\](->?)\(related\) "
+                         r"WHERE node\.assetName = \$assetName "
+                         r"(?:AND ALL\(rel IN r WHERE type\(rel\) = '([^']*)'\) )?"
+                         r".*LIMIT (\d+) ")
+# the per-path stream query and the keyset page query of RetrieveNodeAndRelations
+_STREAM_QUERY = re.compile(r"MATCH p = \(node:\w+\)(<?-)\[r\*1\.\.(\d*)\](->?)\(related\) "
+                           r"WHERE node\.assetName = \$assetName AND \(\$relation IS NULL")
+# one UNION ALL branch per (direction, level) shape of BatchRetrieveNodeAndRelations
+_BATCH_BRANCH = re.compile(r"req\.shape = (\d+) AND node\.assetName = req\.assetName "
+                           r"MATCH p = \(node\)(<?-)\[r\*1\.\.(\d*)\](->?)\(related\)")
+_PROJECTION = re.compile(r"related \{([^}]*)\} AS relatedNodeProperties")
+
+
+def _direction(left: str, right: str) -> str:
+    if left == "<-":
+        return "incoming"
+    if right == "->":
+        return "outgoing"
+    return "both"
+
+
+def _frontier_direction(query: str) -> str:
+    if "(source)<-[rel]-(related)" in query:
+        return "incoming"
+    if "(source)-[rel]->(related)" in query:
+        return "outgoing"
+    return "both"
+
+
+class FixtureGraph:
+    # small property graph that answers the statements the services send with the semantics the server
+    # gives them: variable length patterns match trails (no relationship twice per path), an undirected
+    # pattern follows a relationship from either end, and the frontier expansion groups by related node
+
+    def __init__(self, nodes: Dict[str, dict], edges: List[Tuple[str, str, str]]):
+        self.nodes = nodes
+        self.edges = edges
+
+    def _steps(self, node_id: str, direction: str, relation: Optional[str]):
+        for edge_index, (source, target, rel_type) in enumerate(self.edges):
+            if relation is not None and rel_type != relation:
+                continue
+            if direction in ("outgoing", "both") and source == node_id:
+                yield edge_index, target
+            elif direction in ("incoming", "both") and target == node_id:
+                yield edge_index, source
+
+    def _starts(self, asset_name) -> List[str]:
+        return sorted(node_id for node_id, properties in self.nodes.items()
+                      if properties.get("assetName") == asset_name)
+
+    def _trails(self, asset_name, direction: str, max_level: Optional[int], relation: Optional[str]) -> List[tuple]:
+        # (related node id, depth, type of the last relationship) per path
+        trails = []
+
+        def _walk(node_id, used, depth):
+            for edge_index, other in self._steps(node_id, direction, relation):
+                if edge_index in used:
+                    continue
+                trails.append((other, depth, self.edges[edge_index][2]))
+                if max_level is None or depth < max_level:
+                    _walk(other, used | {edge_index}, depth + 1)
+
+        if max_level is None or max_level >= 1:
+            for start in self._starts(asset_name):
+                _walk(start, frozenset(), 1)
+        return trails
+
+    def _row(self, node_id, depth, relation, keys=None) -> dict:
+        properties = self.nodes[node_id]
+        if keys is not None:
+            properties = {key: properties.get(key) for key in keys}
+        return {"relatedNode": self.nodes[node_id].get("name"), "positionNumber": depth, "relation": relation,
+                "relatedNodeProperties": dict(properties)}
+
+    def paths(self, asset_name, direction: str, max_level: Optional[int], relation: Optional[str]) -> List[dict]:
+        return [self._row(*trail) for trail in self._trails(asset_name, direction, max_level, relation)]
+
+    def page_rows(self, asset_name, direction: str, max_level: Optional[int], relation: Optional[str],
+                  keys=None) -> List[dict]:
+        # DISTINCT (related, depth, last type) in sort key order, as the keyset page query returns them
+        rows = []
+        for node_id, depth, rel_type in set(self._trails(asset_name, direction, max_level, relation)):
+            name = self.nodes[node_id].get("name")
+            sort_key = [depth, int(name is None), "" if name is None else str(name), node_id, rel_type]
+            rows.append({**self._row(node_id, depth, rel_type, keys), "sortKey": sort_key})
+        return sorted(rows, key=lambda row: row["sortKey"])
+
+    def responder(self, query: str, parameters: dict) -> List[dict]:
+        if "properties(n) AS properties" in query:
+            return [{"id": node_id, "properties": dict(properties)} for node_id, properties in self.nodes.items()]
+        if "elementId(source) AS source" in query:
+            return [{"source": source, "target": target, "type": rel_type}
+                    for source, target, rel_type in self.edges]
+        if "RETURN elementId(node) AS id" in query:
+            return [{"id": node_id} for node_id in self._starts(parameters["assetName"])]
+        if query.startswith("UNWIND $frontier"):
+            direction = _frontier_direction(query)
+            reached = {}
+            for source_id in parameters["frontier"]:
+                for edge_index, other in self._steps(source_id, direction, parameters["relation"]):
+                    rel_type = self.edges[edge_index][2]
+                    reached[other] = min(reached.get(other, rel_type), rel_type)
+            return [{"id": node_id, "relatedNode": self.nodes[node_id].get("name"), "relation": relation}
+                    for node_id, relation in reached.items()]
+        if query.startswith("UNWIND $ids"):
+            return [{"id": node_id, "relatedNodeProperties": dict(self.nodes[node_id])}
+                    for node_id in parameters["ids"] if node_id in self.nodes]
+        if query.startswith("UNWIND $requests"):
+            shapes = {int(shape): (_direction(left, right), int(level) if level else None)
+                      for shape, left, level, right in _BATCH_BRANCH.findall(query)}
+            records = []
+            for request in parameters["requests"]:
+                direction, level = shapes[request["shape"]]
+                rows = self.paths(request["assetName"], direction, level, request["relation"])[:parameters["limit"]]
+                # grouped by asset and spec after the subquery, so a request without paths has no record
+                if rows:
+                    records.append({"assetName": request["assetName"], "specIndex": request["specIndex"],
+                                    "data": rows})
+            return records
+        match = _STREAM_QUERY.search(query)
+        if match:
+            left, level, right = match.groups()
+            projection = _PROJECTION.search(query)
+            keys = None if projection is None else re.findall(r"\.`((?:[^`]|``)*)`", projection.group(1))
+            if "LIMIT $pageSize" in query:
+                rows = self.page_rows(parameters["assetName"], _direction(left, right), int(level) if level else None,
+                                      parameters["relation"], keys)
+                after = parameters["after"]
+                return [row for row in rows if after is None or row["sortKey"] > after][:parameters["pageSize"]]
+            rows = [self._row(*trail, keys) for trail in self._trails(
+                parameters["assetName"], _direction(left, right), int(level) if level else None,
+                parameters["relation"])]
+            return rows[:parameters["limit"]] if "LIMIT $limit" in query else rows
+        match = _PATH_QUERY.search(query)
+        if match:
+            left, level, right, relation, limit = match.groups()
+            rows = self.paths(parameters["assetName"], _direction(left, right), int(level) if level else None,
+                              relation)
+            return [{"data": rows[:int(limit)]}]
+        raise AssertionError(f"fixture graph cannot answer {query!r}")
+
+
+def device(name: str, **properties) -> dict:
+    return {"name": name, "assetName": name, **properties}
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+import driver_manager
+from async_read_ws import retrieve_relations_for_assets
+from async_write_ws import AsyncImportTopologyWithRelationsService
+from cypher_model import FixtureGraph, device
+from read_ws import RetrieveNodeAndRelations, TRAVERSAL_FRONTIER, TRAVERSAL_PATHS
+from stand_in_driver import AsyncStandInDriver, StandInDriver
+from write_ws import ImportTopologyWithRelationsService
+
+DEVICES = [{"assetId": str(index), "assetName": f"Device{index}"} for index in range(50)]
+RELATIONSHIPS = [{"Relationship Type Name": "DEPENDS_ON" if index % 3 else "HOSTS",
+                  "Source Asset ID": str(index % 50), "Target Asset ID": str(index * 7 % 50), "index": index}
+                 for index in range(300)]
+
+FIXTURE = FixtureGraph(
+    {f"n{index}": device(f"Device{index}") for index in range(6)},
+    [("n0", "n1", "DEPENDS_ON"), ("n1", "n2", "DEPENDS_ON"), ("n2", "n0", "HOSTS"), ("n3", "n2", "HOSTS"),
+     ("n4", "n3", "DEPENDS_ON"), ("n5", "n5", "HOSTS")])
+
+
+async def _configure(**driver_config):
+    return await driver_manager.configure_async_driver_manager(
+        uri="stand-in://local", username="test", password="test", max_pool_size=4,
+        driver_factory=lambda uri, **config: AsyncStandInDriver(uri, **{**config, **driver_config}))
+
+
+def _run_with_stand_in(coroutine_function, **driver_config):
+    async def _run():
+        manager = await _configure(**driver_config)
+        driver = manager.driver
+        try:
+            return await coroutine_function(), driver
+        finally:
+            await manager.close()
+
+    return asyncio.run(_run())
+
+
+def test_async_import_writes_every_row_once():
+    async def _import():
+        # built after the stand-in manager is configured, the service binds the manager it is created with
+        service = AsyncImportTopologyWithRelationsService(project_id=0, batch_size=20, max_in_flight=3)
+        return await service.process_input_stream([DEVICES[:25], DEVICES[25:]],
+                                                  [RELATIONSHIPS[:150], RELATIONSHIPS[150:]])
+
+    response, driver = _run_with_stand_in(_import, latency=0.001)
+    assert response["statusCode"] == 200
+    assert sorted(row["asset_name"] for query, parameters in driver.statements if "MERGE (n:" in query
+                  for row in parameters["rows"]) == sorted(item["assetName"] for item in DEVICES)
+    assert sorted(row["properties"]["index"] for query, parameters in driver.statements if "MERGE (source)" in query
+                  for row in parameters["rows"]) == list(range(300))
+    assert driver.open_sessions == 0
+
+
+@pytest.mark.parametrize("method", ["process_delta", "process_input_columnar", "_write_input",
+                                    "_write_input_stream", "_write_input_controlled"])
+def test_sync_only_entry_points_do_not_exist(method):
+    service = AsyncImportTopologyWithRelationsService(project_id=0)
+    assert not isinstance(service, ImportTopologyWithRelationsService)
+    assert not hasattr(service, method)
+
+
+@pytest.mark.parametrize("traversal", [TRAVERSAL_PATHS, TRAVERSAL_FRONTIER])
+def test_async_fan_out_matches_sync_reads(traversal):
+    node_names = [f"Device{index}" for index in range(6)]
+    results, driver = _run_with_stand_in(
+        lambda: retrieve_relations_for_assets(node_names, 60, [], "", 3, 100, concurrency=3, cache=None,
+                                              traversal=traversal),
+        responder=FIXTURE.responder, latency=0.001)
+    sync_driver = StandInDriver(responder=FIXTURE.responder)
+    for node_name in node_names:
+        retriever = RetrieveNodeAndRelations(node_name, 60, [], "", 3, 100, cache=None, traversal=traversal)
+        retriever.driver = sync_driver
+        expected = retriever.retrieve_relation_using_node_name()
+        if traversal == TRAVERSAL_FRONTIER:
+            assert results[node_name] == expected
+        else:
+            assert sorted(map(repr, results[node_name])) == sorted(map(repr, expected))
+    assert sum(map(len, results.values())) > 0
+    assert driver.open_sessions == 0
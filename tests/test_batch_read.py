@@ -0,0 +1,52 @@
+import pytest
+
+from read_ws import BatchRetrieveNodeAndRelations, RetrieveNodeAndRelations
+from stand_in_driver import StandInDriver
+from test_topology_engine import FIXTURES
+
+NAMES = ["a", "b", "twin", "missing", "a"]
+
+SPECS = [{"relation": "DEPENDS_ON", "direction": "outgoing", "relationLevel": 2},
+         {"relation": "HOSTS", "direction": "", "relationLevel": 3},
+         {"relation": "HOSTS", "direction": "OUTGOING", "relationLevel": 2}]
+
+
+def _batch(relationship_types, direction="", level=3, limit=100):
+    retriever = BatchRetrieveNodeAndRelations(NAMES, 60, relationship_types, direction, level, limit)
+    retriever.driver = StandInDriver(responder=FIXTURES["parallel"].responder)
+    return retriever
+
+
+def _single(node_name, relationship_types, direction="", level=3, limit=100):
+    retriever = RetrieveNodeAndRelations(node_name, 60, relationship_types, direction, level, limit, cache=None)
+    retriever.driver = StandInDriver(responder=FIXTURES["parallel"].responder)
+    return retriever.retrieve_relation_using_node_name()
+
+
+def test_specs_sharing_a_shape_share_a_branch():
+    shapes, requests = _batch(SPECS)._group_requests()
+    assert shapes == (("outgoing", "2"), ("both", "3"))
+    assert [(request["specIndex"], request["shape"]) for request in requests if request["assetName"] == "a"] == [
+        (0, 0), (1, 1), (2, 0)]
+    assert len(requests) == 3 * 4
+
+
+@pytest.mark.parametrize("relationship_types", [[], SPECS])
+@pytest.mark.parametrize("limit", [1, 100])
+def test_every_asset_gets_the_rows_of_a_single_lookup(relationship_types, limit):
+    retriever = _batch(relationship_types, limit=limit)
+    results = retriever.retrieve_relations_for_nodes()
+    assert list(results) == ["a", "b", "twin", "missing"]
+    for node_name, rows in results.items():
+        assert rows == _single(node_name, relationship_types, limit=limit)
+    assert results["missing"] == []
+    assert results["a"]
+
+
+def test_all_shapes_go_out_in_one_statement():
+    retriever = _batch(SPECS)
+    retriever.retrieve_relations_for_nodes()
+    assert len(retriever.driver.statements) == 1
+    query, parameters = retriever.driver.statements[0]
+    assert query.count("UNION ALL") == 1
+    assert len(parameters["requests"]) == 12
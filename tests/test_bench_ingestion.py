@@ -0,0 +1,35 @@
+from types import SimpleNamespace
+
+import pytest
+
+import bench_ingestion
+from bench_ingestion import run_case
+from stand_in_driver import StandInDriver
+
+
+@pytest.mark.parametrize("strategy,simulated_fields", [
+    ("load_csv", ["rowsPerSecond", "transactions", "batchLatencyP50", "batchLatencyP99"]),
+    ("per_row", ["transactions"]),
+    ("batched", []),
+])
+def test_recording_backend_flags_what_it_cannot_measure(strategy, simulated_fields):
+    result = run_case(strategy, "1k", "recording", batch_size=1000, workers=1)
+    assert result["simulated"] == bool(simulated_fields)
+    assert result["simulatedFields"] == simulated_fields
+
+
+@pytest.mark.parametrize("reset_label,deletes", [(False, 0), (True, 1)])
+def test_neo4j_backend_deletes_the_import_label_only_when_asked(monkeypatch, stand_in_manager, reset_label,
+                                                                deletes):
+    # the neo4j backend is pointed at a stand-in so the statements it would send can be inspected
+    drivers = []
+
+    def _driver(uri, **config):
+        drivers.append(StandInDriver(uri, **config))
+        return drivers[-1]
+
+    monkeypatch.setattr(bench_ingestion, "GraphDatabase", SimpleNamespace(driver=_driver))
+    bench_ingestion.run_case("batched", "1k", "neo4j", batch_size=1000, workers=1, reset_label=reset_label)
+    statements = [query for driver in drivers for query, _ in driver.statements]
+    assert statements
+    assert sum("DETACH DELETE" in query for query in statements) == deletes
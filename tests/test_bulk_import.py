@@ -0,0 +1,50 @@
+import csv
+
+import driver_manager
+from bulk_impot_csv import BulkImportTopologyWithRelationsService
+from impact_index import ImpactIndex
+from stand_in_driver import StandInDriver
+
+DEVICES = [{"Asset ID": "1", "Asset Name": "a", "Type": "Server", "Business Criticality": "High"},
+           {"Asset ID": "2", "Asset Name": "b", "Type": "Switch", "Business Criticality": "Low"}]
+RELATIONSHIPS = [{"Source Asset ID": "1", "Target Asset ID": "2", "Relationship Type Name": "DEPENDS_ON"}]
+
+
+def _write_csv(path, rows):
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    return str(path)
+
+
+def _graph_responder(query, parameters):
+    # the impact index sync reads the graph the import just wrote
+    if query.startswith("MATCH (n:"):
+        return [{"assetId": row["Asset ID"], "name": row["Asset Name"], "criticality": row["Business Criticality"]}
+                for row in DEVICES]
+    if query.startswith("MATCH (source:"):
+        return [{"source": row["Source Asset ID"], "target": row["Target Asset ID"],
+                 "type": row["Relationship Type Name"]} for row in RELATIONSHIPS]
+    return []
+
+
+def test_impact_summaries_are_synced_on_the_import_session(tmp_path):
+    # with a single pooled session a second session next to the import one would time out
+    manager = driver_manager.configure_driver_manager(
+        uri="stand-in://local", username="test", password="test", max_pool_size=1, acquisition_timeout=0.5,
+        driver_factory=lambda uri, **config: StandInDriver(uri, responder=_graph_responder, **config))
+    try:
+        index = ImpactIndex(depth=2)
+        service = BulkImportTopologyWithRelationsService(impact_index=index)
+        service.bulk_import_partitioned(_write_csv(tmp_path / "devices.csv", DEVICES),
+                                        _write_csv(tmp_path / "relationships.csv", RELATIONSHIPS))
+        assert manager.metrics()["peakSessions"] == 1
+        assert manager.driver.sessions_opened == 1
+        assert index.summary("1")["outgoing"]["reachable"] == [1, 0]
+        summary_rows = [parameters["rows"] for query, parameters in manager.driver.statements
+                        if "impactSummary" in query]
+        assert sorted(row["asset_id"] for row in summary_rows[0]) == ["1", "2"]
+    finally:
+        driver_manager.configure_driver_manager(uri="stand-in://local", username="test", password="test",
+                                                driver_factory=StandInDriver).close()
@@ -0,0 +1,41 @@
+from openpyxl import Workbook
+
+from columnar_batches import iter_device_batches, iter_relationship_batches
+from topology_readers import convert_to_aiops_fields, iter_file_chunks
+
+DEVICE_HEADER = ["Asset ID", "Asset Name", "Type", "Impact Radius", "Business Criticality"]
+DEVICE_ROWS = [[1, "a", "Server", 3, "High"], [2, "b", None, None, "Low"], [3, "c", "Switch", 7, None]]
+RELATIONSHIP_HEADER = ["Source Asset ID", "Target Asset ID", "Relationship Type Name", "Weight"]
+RELATIONSHIP_ROWS = [[1, 2, "DEPENDS_ON", 5], [2, 3, "DEPENDS_ON", None], [3, 1, "HOSTS", None]]
+
+
+def _write_xlsx(path, header, rows):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+    return str(path)
+
+
+def test_device_columns_match_the_row_dicts_for_a_sheet_with_blanks(tmp_path):
+    file_path = _write_xlsx(tmp_path / "devices.xlsx", DEVICE_HEADER, DEVICE_ROWS)
+    rows = [row for chunk in iter_file_chunks(file_path) for row in convert_to_aiops_fields(chunk)]
+    (batch,) = iter_device_batches(file_path)
+    columns = {key: values for key, values in batch.columns.items() if key != "internalAssetId"}
+    assert columns == {key: [row[key] for row in rows] for key in rows[0] if key != "internalAssetId"}
+    assert columns["impactRadius"] == [3, None, 7]
+    assert [type(value) for value in columns["assetId"]] == [int, int, int]
+
+
+def test_relationship_columns_match_the_row_dicts_for_a_sheet_with_blanks(tmp_path):
+    file_path = _write_xlsx(tmp_path / "relationships.xlsx", RELATIONSHIP_HEADER, RELATIONSHIP_ROWS)
+    rows = [row for chunk in iter_file_chunks(file_path) for row in chunk]
+    batches = {batch.rel_type_name: batch.parameters() for batch in iter_relationship_batches(file_path)}
+    for rel_type_name, parameters in batches.items():
+        type_rows = [row for row in rows if row["Relationship Type Name"] == rel_type_name]
+        assert parameters["sources"] == [row["Source Asset ID"] for row in type_rows]
+        assert parameters["targets"] == [row["Target Asset ID"] for row in type_rows]
+        assert parameters["properties"] == [[row["Weight"] for row in type_rows]]
+    assert batches["DEPENDS_ON"]["properties"] == [[5, None]]
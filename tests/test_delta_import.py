@@ -0,0 +1,140 @@
+from fingerprint_store import FingerprintStore
+from write_ws import ImportTopologyWithRelationsService
+
+
+class _GraphResponder:
+    # assets MERGEd so far; a relationship row only matches when both endpoints exist. A node keeps the
+    # internalAssetId it was created with, like the coalesce in the MERGE
+
+    def __init__(self):
+        self.internal_asset_ids = {}
+        self.merged_edges = []
+
+    @property
+    def asset_ids(self):
+        return set(self.internal_asset_ids)
+
+    def __call__(self, query, parameters):
+        if "RETURN row.asset_id AS assetId" in query:
+            return [{"assetId": row["asset_id"],
+                     "internalAssetId": self.internal_asset_ids.setdefault(row["asset_id"], row["internal_asset_id"])}
+                    for row in parameters["rows"]]
+        if "RETURN row.source_asset_id AS sourceAssetId" in query:
+            matched = [row for row in parameters["rows"]
+                       if row["source_asset_id"] in self.asset_ids and row["target_asset_id"] in self.asset_ids]
+            self.merged_edges.extend((row["source_asset_id"], row["target_asset_id"]) for row in matched)
+            return [{"sourceAssetId": row["source_asset_id"], "targetAssetId": row["target_asset_id"]}
+                    for row in matched]
+        if query.endswith("DETACH DELETE n"):
+            for asset_id in parameters["rows"]:
+                self.internal_asset_ids.pop(asset_id, None)
+        return []
+
+
+def _device(asset_id, **properties):
+    return {"assetId": asset_id, "assetName": f"Device{asset_id}", "internalAssetId": f"internal-{asset_id}",
+            **properties}
+
+
+def _relationship(source, target):
+    return {"Relationship Type Name": "DEPENDS_ON", "Source Asset ID": source, "Target Asset ID": target}
+
+
+def test_relationship_to_missing_endpoint_is_written_once_the_endpoint_arrives(stand_in_manager, tmp_path):
+    responder = _GraphResponder()
+    stand_in_manager(responder=responder)
+    store = FingerprintStore(str(tmp_path / "fingerprints.sqlite"))
+    relationships = [[_relationship("1", "2"), _relationship("1", "3")]]
+
+    first = ImportTopologyWithRelationsService(project_id=0).process_delta(
+        store, [[_device("1"), _device("2")]], relationships)
+    assert first["summary"]["relationships"] == {"written": 1, "skipped": 0, "deleted": 0, "unmatched": 1}
+    assert responder.merged_edges == [("1", "2")]
+
+    second = ImportTopologyWithRelationsService(project_id=0).process_delta(
+        store, [[_device("1"), _device("2"), _device("3")]], relationships)
+    assert second["summary"]["relationships"] == {"written": 1, "skipped": 1, "deleted": 0, "unmatched": 0}
+    assert responder.merged_edges == [("1", "2"), ("1", "3")]
+
+    third = ImportTopologyWithRelationsService(project_id=0).process_delta(
+        store, [[_device("1"), _device("2"), _device("3")]], relationships)
+    assert third["summary"]["relationships"] == {"written": 0, "skipped": 2, "deleted": 0, "unmatched": 0}
+    store.close()
+
+
+def _statements(driver, marker):
+    return [parameters["rows"] for query, parameters in driver.statements if marker in query]
+
+
+def test_only_changed_nodes_are_written(stand_in_manager, tmp_path):
+    manager = stand_in_manager(responder=_GraphResponder())
+    store = FingerprintStore(str(tmp_path / "fingerprints.sqlite"))
+    devices = [_device("1"), _device("2"), _device("3")]
+
+    first = ImportTopologyWithRelationsService(project_id=0, batch_size=2).process_delta(store, [devices], [])
+    assert first["summary"]["nodes"] == {"written": 3, "skipped": 0, "deleted": 0}
+    assert [len(rows) for rows in _statements(manager.driver, "RETURN row.asset_id AS assetId")] == [2, 1]
+
+    # a new internalAssetId alone is no change, a new property is
+    devices = [_device("1"), _device("2", type="Switch"), {**_device("3"), "internalAssetId": "fresh"}]
+    reads = len(manager.driver.statements)
+    second = ImportTopologyWithRelationsService(project_id=0, batch_size=2).process_delta(store, [devices], [])
+    assert second["summary"]["nodes"] == {"written": 1, "skipped": 2, "deleted": 0}
+    (rows,) = [parameters["rows"] for query, parameters in manager.driver.statements[reads:]
+               if "RETURN row.asset_id AS assetId" in query]
+    assert rows == [{"asset_name": "Device2", "asset_id": "2", "internal_asset_id": "internal-2",
+                     "properties": {"assetId": "2", "type": "Switch"}}]
+    store.close()
+
+
+def test_internal_asset_id_of_an_existing_node_is_kept(stand_in_manager, tmp_path):
+    responder = _GraphResponder()
+    manager = stand_in_manager(responder=responder)
+    store = FingerprintStore(str(tmp_path / "fingerprints.sqlite"))
+    ImportTopologyWithRelationsService(project_id=0).process_delta(store, [[_device("1")]], [])
+    assert "n.internalAssetId = coalesce(n.internalAssetId, row.internal_asset_id)" in manager.driver.statements[-1][0]
+
+    # a changed row carries the stored id instead of the new UUID the conversion gave it
+    ImportTopologyWithRelationsService(project_id=0).process_delta(
+        store, [[{**_device("1", type="Server"), "internalAssetId": "fresh"}]], [])
+    assert _statements(manager.driver, "RETURN row.asset_id AS assetId")[-1][0]["internal_asset_id"] == "internal-1"
+    store.close()
+
+    # with the store lost, the graph keeps its id and the new store records the id the graph returned
+    store = FingerprintStore(str(tmp_path / "other.sqlite"))
+    ImportTopologyWithRelationsService(project_id=0).process_delta(
+        store, [[{**_device("1"), "internalAssetId": "fresh"}]], [])
+    assert responder.internal_asset_ids == {"1": "internal-1"}
+    ImportTopologyWithRelationsService(project_id=0).process_delta(
+        store, [[{**_device("1", type="Switch"), "internalAssetId": "newer"}]], [])
+    assert _statements(manager.driver, "RETURN row.asset_id AS assetId")[-1][0]["internal_asset_id"] == "internal-1"
+    store.close()
+
+
+def test_nodes_and_relationships_missing_from_the_snapshot_are_deleted(stand_in_manager, tmp_path):
+    responder = _GraphResponder()
+    manager = stand_in_manager(responder=responder)
+    store = FingerprintStore(str(tmp_path / "fingerprints.sqlite"))
+    devices = [_device("1"), _device("2"), _device("3"), _device("4")]
+    relationships = [_relationship("1", "2"), _relationship("2", "3"), _relationship("3", "4")]
+    ImportTopologyWithRelationsService(project_id=0).process_delta(store, [devices], [relationships])
+
+    kept = ImportTopologyWithRelationsService(project_id=0).process_delta(
+        store, [devices[:3]], [relationships[:1]], delete_missing=False)
+    assert kept["summary"]["nodes"]["deleted"] == kept["summary"]["relationships"]["deleted"] == 0
+    assert not _statements(manager.driver, "DELETE")
+
+    deleted = ImportTopologyWithRelationsService(project_id=0).process_delta(
+        store, [devices[:3]], [relationships[:1]])
+    assert deleted["summary"]["nodes"]["deleted"] == 1
+    assert deleted["summary"]["relationships"]["deleted"] == 2
+    assert _statements(manager.driver, "DELETE r") == [[{"source_asset_id": "2", "target_asset_id": "3"},
+                                                        {"source_asset_id": "3", "target_asset_id": "4"}]]
+    assert _statements(manager.driver, "DETACH DELETE n") == [["4"]]
+    assert responder.asset_ids == {"1", "2", "3"}
+
+    # what was deleted is forgotten, so it is written again when it comes back
+    restored = ImportTopologyWithRelationsService(project_id=0).process_delta(store, [devices], [relationships])
+    assert restored["summary"]["nodes"] == {"written": 1, "skipped": 3, "deleted": 0}
+    assert restored["summary"]["relationships"] == {"written": 2, "skipped": 1, "deleted": 0, "unmatched": 0}
+    store.close()
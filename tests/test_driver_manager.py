@@ -0,0 +1,99 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from driver_manager import AsyncDriverManager, DriverManager
+from stand_in_driver import AsyncStandInDriver, StandInDriver
+
+
+class _ConcurrencyProbe:
+    # responder recording how many sessions of the driver are open while a statement runs
+
+    def __init__(self):
+        self.driver = None
+        self.peak = 0
+
+    def __call__(self, query, parameters):
+        self.peak = max(self.peak, self.driver.open_sessions)
+        return []
+
+
+def _manager(max_pool_size, driver_class=StandInDriver, manager_class=DriverManager, **driver_config):
+    probe = _ConcurrencyProbe()
+
+    def _factory(uri, **config):
+        probe.driver = driver_class(uri, responder=probe, **config, **driver_config)
+        return probe.driver
+
+    manager = manager_class("stand-in://local", "test", "test", max_pool_size=max_pool_size,
+                            acquisition_timeout=5.0, driver_factory=_factory)
+    return manager, probe
+
+
+def test_sessions_are_capped_at_the_pool_size():
+    manager, probe = _manager(2, latency=0.01)
+
+    def _query(_):
+        with manager.session() as session:
+            session.run("RETURN 1")
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(_query, range(16)))
+    metrics = manager.metrics()
+    assert probe.peak == 2
+    assert metrics["peakSessions"] == 2 and metrics["sessionsInUse"] == 0
+    assert metrics["acquisitions"] == 16 and metrics["waitTimeMax"] > 0
+    assert manager.driver.config["max_connection_pool_size"] == 2
+
+
+def test_acquisition_times_out_when_the_pool_is_exhausted():
+    manager, _ = _manager(1)
+    manager._acquisition_timeout = 0.05
+    errors = []
+
+    def _second_session():
+        try:
+            with manager.session():
+                pass
+        except RuntimeError as exc:
+            errors.append(exc)
+
+    with manager.session():
+        thread = threading.Thread(target=_second_session)
+        thread.start()
+        thread.join()
+    assert len(errors) == 1
+    assert manager.metrics()["acquisitionTimeouts"] == 1
+    with manager.session():
+        assert manager.metrics()["sessionsInUse"] == 1
+
+
+def test_readiness_reports_the_session_counts():
+    manager, _ = _manager(3)
+    readiness = manager.check_readiness()
+    assert readiness["ready"] is True
+    assert readiness["pool"]["maxPoolSize"] == 3 and readiness["pool"]["peakSessions"] == 1
+    assert "idle" not in readiness["pool"]
+
+
+def test_async_sessions_are_capped_at_the_pool_size():
+    async def _run():
+        manager, probe = _manager(3, AsyncStandInDriver, AsyncDriverManager, latency=0.01)
+
+        async def _query():
+            async with manager.session() as session:
+                await session.run("RETURN 1")
+
+        await asyncio.gather(*(_query() for _ in range(12)))
+        return manager.metrics(), probe
+
+    metrics, probe = asyncio.run(_run())
+    assert probe.peak == 3
+    assert metrics["peakSessions"] == 3 and metrics["sessionsInUse"] == 0
+
+
+def test_pool_size_must_be_positive():
+    with pytest.raises(ValueError):
+        DriverManager("stand-in://local", "test", "test", max_pool_size=0)
@@ -0,0 +1,54 @@
+import json
+
+from impact_index import ImpactIndex
+from stand_in_driver import StandInDriver
+from write_ws import ImportTopologyWithRelationsService
+
+LABEL = "CI_10K_loop"
+# the graph in the database: 1 -> 2 -> 3, and 4 only reachable from 3
+GRAPH_NODES = {"1": ("a", None), "2": ("b", None), "3": ("c", "Critical"), "4": ("d", None)}
+GRAPH_EDGES = [("1", "2", "DEPENDS_ON"), ("2", "3", "DEPENDS_ON"), ("3", "4", "HOSTS")]
+
+
+def _graph_responder(query, parameters):
+    if "RETURN n.assetId AS assetId, n.assetName AS name" in query:
+        return [{"assetId": asset_id, "name": name, "criticality": criticality}
+                for asset_id, (name, criticality) in GRAPH_NODES.items()]
+    if "type(r) AS type" in query:
+        return [{"source": source, "target": target, "type": rel_type_name}
+                for source, target, rel_type_name in GRAPH_EDGES]
+    return []
+
+
+def _written_summaries(driver):
+    return {row["asset_id"]: json.loads(row["summary"]) for query, parameters in driver.statements
+            if "impactSummary" in query for row in parameters["rows"]}
+
+
+def _import(index, devices, relationships=()):
+    ImportTopologyWithRelationsService(project_id=1, device_details_data=devices,
+                                       relationship_data=list(relationships), batch_size=10,
+                                       impact_index=index).process_input()
+
+
+def test_a_fresh_index_writes_summaries_of_the_whole_graph(stand_in_manager):
+    manager = stand_in_manager(responder=_graph_responder)
+    index = ImpactIndex(depth=2)
+    # the input only holds asset 3, the rest of its neighbourhood is already in the database
+    _import(index, [{"Asset ID": "3", "Asset Name": "c", "Business Criticality": "Critical"}])
+    expected = ImpactIndex.from_driver(StandInDriver(responder=_graph_responder), LABEL, depth=2)
+    written = _written_summaries(manager.driver)
+    assert set(written) == set(GRAPH_NODES)
+    assert all(summary == expected.summary(asset_id) for asset_id, summary in written.items())
+    assert written["3"]["incoming"]["reachable"] == [1, 1]
+    assert written["1"]["outgoing"]["maxCriticality"] == "Critical"
+
+
+def test_a_synced_index_is_not_read_again(stand_in_manager):
+    manager = stand_in_manager(responder=_graph_responder)
+    index = ImpactIndex.from_driver(manager.driver, LABEL, depth=2)
+    reads = len(manager.driver.statements)
+    _import(index, [{"Asset ID": "4", "Asset Name": "d", "Business Criticality": "High"}])
+    assert not any("type(r) AS type" in query for query, _ in manager.driver.statements[reads:])
+    # only 3 changes: 2 already reaches the Critical 3, and 1 is out of range of 4
+    assert set(_written_summaries(manager.driver)) == {"3"}
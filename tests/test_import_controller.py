@@ -0,0 +1,96 @@
+import pytest
+from neo4j.exceptions import Neo4jError
+
+from import_controller import AdaptiveBatchSizer, ImportCheckpoint, ImportController
+from stand_in_driver import FaultInjectingDriver, SimulatedCrash
+
+ROWS = [{"id": index} for index in range(2000)]
+
+
+def _write_tx(tx, rows):
+    tx.run("UNWIND $rows AS row MERGE (n:Test {id: row.id})", rows=rows)
+
+
+def _written_ids(driver):
+    return sorted(row["id"] for _, parameters in driver.statements for row in parameters.get("rows", []))
+
+
+def test_oversized_batches_are_split_without_managed_retries():
+    driver = FaultInjectingDriver(max_batch_rows=300)
+    controller = ImportController(driver, sizer=AdaptiveBatchSizer(initial=1000, min_size=10), base_delay=0)
+    stats = controller.run("nodes", ROWS, _write_tx)
+    assert stats["rows"] == len(ROWS) and driver.committed_rows == len(ROWS)
+    assert _written_ids(driver) == list(range(len(ROWS)))
+    # every rejected batch reached the controller right away, none was replayed inside the driver
+    assert stats["splits"] == driver.faults["memory"] > 0
+    assert driver.managed_retries == 0
+    assert stats["batchSize"] <= 300
+
+
+def test_managed_transaction_replays_oversized_batch_until_retry_time_runs_out():
+    driver = FaultInjectingDriver(max_batch_rows=300)
+    with driver.session() as session, pytest.raises(Neo4jError):
+        session.execute_write(_write_tx, ROWS[:500])
+    # 1 + 2 + 4 + 8 + 16 seconds of backoff before the 30s default is exceeded
+    assert driver.faults["memory"] == 6
+    assert driver.managed_retries == 5 and driver.managed_retry_seconds == 31.0
+
+    driver = FaultInjectingDriver(max_batch_rows=300, max_transaction_retry_time=0)
+    with driver.session() as session, pytest.raises(Neo4jError):
+        session.execute_write(_write_tx, ROWS[:500])
+    assert driver.faults["memory"] == 1 and driver.managed_retries == 0
+
+
+def test_transient_errors_are_retried_with_backoff():
+    driver = FaultInjectingDriver(transient_rate=0.3, seed=7)
+    controller = ImportController(driver, sizer=AdaptiveBatchSizer(initial=100, min_size=100, max_size=100),
+                                  base_delay=0, max_retries=20)
+    stats = controller.run("nodes", ROWS, _write_tx)
+    assert driver.committed_rows == len(ROWS)
+    assert stats["retries"] == driver.faults["transient"] > 0
+    assert driver.managed_retries == 0
+
+
+def test_retries_give_up_after_max_retries():
+    driver = FaultInjectingDriver(transient_rate=1.0)
+    controller = ImportController(driver, base_delay=0, max_retries=2)
+    with pytest.raises(Neo4jError):
+        controller.run("nodes", ROWS, _write_tx)
+    assert driver.faults["transient"] == 3 and driver.committed_rows == 0
+
+
+def test_crashed_import_resumes_from_checkpoint(tmp_path):
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    crashed = FaultInjectingDriver(crash_after_commits=3)
+    controller = ImportController(crashed, sizer=AdaptiveBatchSizer(initial=150, min_size=150, max_size=150),
+                                  checkpoint=ImportCheckpoint(checkpoint_path, "input"))
+    with pytest.raises(SimulatedCrash):
+        controller.run("nodes", ROWS, _write_tx)
+    assert crashed.committed_rows == 450
+
+    resumed = FaultInjectingDriver()
+    controller = ImportController(resumed, sizer=AdaptiveBatchSizer(initial=150, min_size=150, max_size=150),
+                                  checkpoint=ImportCheckpoint(checkpoint_path, "input"))
+    stats = controller.run("nodes", ROWS, _write_tx)
+    controller.complete()
+    assert stats["resumedAfter"] == 450
+    assert _written_ids(crashed) + _written_ids(resumed) == list(range(len(ROWS)))
+    assert not (tmp_path / "checkpoint.json").exists()
+
+
+def test_checkpoint_of_another_input_is_ignored(tmp_path):
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    ImportCheckpoint(checkpoint_path, "first").advance("nodes", 100)
+    assert ImportCheckpoint(checkpoint_path, "first").committed("nodes") == 100
+    assert ImportCheckpoint(checkpoint_path, "second").committed("nodes") == 0
+
+
+def test_sizer_stays_below_rejected_size():
+    sizer = AdaptiveBatchSizer(initial=1000, min_size=10, max_size=5000, target_seconds=1.0)
+    sizer.shrink(rejected_rows=1000)
+    assert sizer.size == 500
+    for _ in range(10):
+        sizer.observe(sizer.size, 0.01)
+    assert sizer.size == 900
+    sizer.observe(sizer.size, 2.0)
+    assert sizer.size == 450
@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+import pytest
+
+from instrumentation import InMemoryExporter, configure_metrics, metrics
+from stand_in_driver import StandInCounters
+from write_ws import ImportTopologyWithRelationsService
+
+
+@pytest.fixture
+def registry():
+    yield metrics
+    configure_metrics(enabled=False)
+    metrics.reset()
+
+
+def _db_hits_total(snapshot) -> float:
+    return sum(counter["value"] for counter in snapshot["counters"] if counter["metric"] == "topology_db_hits_total")
+
+
+def test_queries_are_profiled_only_when_opted_in(registry):
+    configure_metrics(enabled=True, exporters=[InMemoryExporter()])
+    assert registry.profiled("RETURN 1") == "RETURN 1"
+    configure_metrics(enabled=False, profile=True)
+    assert registry.profiled("RETURN 1") == "RETURN 1"
+    configure_metrics(enabled=True, exporters=[InMemoryExporter()], profile=True)
+    assert registry.profiled("RETURN 1") == "PROFILE RETURN 1"
+
+
+def test_db_hits_are_summed_over_the_profiled_plan(registry):
+    configure_metrics(enabled=True, exporters=[InMemoryExporter()], profile=True)
+    profile = {"dbHits": 2, "children": [{"dbHits": 5, "children": []}, {"dbHits": 3}]}
+    registry.record_summary("import", SimpleNamespace(counters=StandInCounters(), profile=profile))
+    registry.record_summary("import", SimpleNamespace(counters=StandInCounters(), profile=None))
+    assert _db_hits_total(registry.snapshot()) == 10
+
+
+def test_import_batches_run_with_profile(registry, stand_in_manager):
+    manager = stand_in_manager()
+    configure_metrics(enabled=True, exporters=[InMemoryExporter()], profile=True)
+    devices = [{"Asset ID": str(index), "Asset Name": f"Device{index}"} for index in range(3)]
+    relationships = [{"Source Asset ID": "0", "Target Asset ID": "1", "Relationship Type Name": "DEPENDS_ON"}]
+    ImportTopologyWithRelationsService(project_id=1, device_details_data=devices, relationship_data=relationships,
+                                       batch_size=2).process_input()
+    batch_queries = [query for query, _ in manager.driver.statements if "UNWIND $rows" in query]
+    assert len(batch_queries) == 3
+    assert all(query.startswith("PROFILE ") for query in batch_queries)
@@ -0,0 +1,98 @@
+import os
+import random
+
+import pytest
+
+from parallel_import import (ParallelRelationshipImporter, _bucket_of, partition_batches,
+                             partition_relationship_rows, thread_scaling_report)
+from stand_in_driver import RecordingDriver, StandInDriver
+
+TYPES = ("DEPENDS_ON", "HOSTS", "CONNECTS_TO")
+
+
+def _rows_by_type(count, seed=1):
+    generator = random.Random(seed)
+    rows_by_type = {}
+    for index in range(count):
+        rows_by_type.setdefault(generator.choice(TYPES), []).append(
+            {"source_asset_id": str(generator.randrange(200)), "target_asset_id": str(generator.randrange(200)),
+             "properties": {"index": index}})
+    return rows_by_type
+
+
+def _write_tx(tx, rows_by_type):
+    for rel_type_name, rows in rows_by_type.items():
+        tx.run(f"UNWIND $rows AS row MERGE (s)-[:{rel_type_name}]->(t)", rows=rows)
+
+
+def _written(driver):
+    return sorted(row["properties"]["index"] for _, parameters in driver._inner.statements
+                  for row in parameters["rows"])
+
+
+def test_partitions_of_a_round_share_no_node():
+    worker_count = 3
+    for round_partitions in partition_relationship_rows(_rows_by_type(3000), worker_count):
+        assert len(round_partitions) <= 2 * worker_count
+        seen = set()
+        for partition in round_partitions:
+            buckets = {_bucket_of(row[key], 2 * worker_count) for rows in partition.values() for row in rows
+                       for key in ("source_asset_id", "target_asset_id")}
+            assert not buckets & seen
+            seen |= buckets
+
+
+def test_one_transaction_per_partition_with_every_type():
+    rows_by_type = _rows_by_type(2000)
+    driver = RecordingDriver(StandInDriver())
+    stats = ParallelRelationshipImporter(driver, _write_tx, worker_count=2, batch_size=1000).import_relationships(
+        rows_by_type)
+    partitions = [partition for round_partitions in partition_relationship_rows(rows_by_type, 2)
+                  for partition in round_partitions]
+    assert stats["transactions"] == driver.stats.transactions == len(partitions)
+    assert driver.stats.statements == sum(len(partition) for partition in partitions)
+    assert stats["rows"] == 2000 and _written(driver) == list(range(2000))
+
+
+def test_importer_buffers_chunks_before_running_rounds():
+    driver = RecordingDriver(StandInDriver())
+    importer = ParallelRelationshipImporter(driver, _write_tx, worker_count=2, batch_size=1000)
+    for seed in range(10):
+        importer.add(_rows_by_type(100, seed))
+    assert driver.stats.transactions == 0
+    stats = importer.flush()
+    # a single schedule of 2 * workers rounds for all ten chunks
+    assert stats["rounds"] == 4 and stats["rows"] == 1000
+    assert stats["transactions"] == driver.stats.transactions <= 10
+    assert importer.flush()["rows"] == 1000
+
+
+def test_importer_flushes_when_the_buffer_is_full():
+    driver = RecordingDriver(StandInDriver())
+    importer = ParallelRelationshipImporter(driver, _write_tx, worker_count=2, batch_size=100, buffer_rows=250)
+    for seed in range(5):
+        importer.add(_rows_by_type(100, seed))
+    assert importer.stats["rows"] == 300
+    importer.flush()
+    assert importer.stats["rows"] == 500
+
+
+def test_partition_batches_cut_across_types():
+    partition = {"A": [{"i": index} for index in range(5)], "B": [{"i": index} for index in range(4)]}
+    batches = list(partition_batches(partition, 4))
+    assert [{name: len(rows) for name, rows in batch.items()} for batch in batches] == [
+        {"A": 4}, {"A": 1, "B": 3}, {"B": 1}]
+
+
+ARTIFACTS_1K = os.path.join(os.path.dirname(__file__), os.pardir, "artifacts", "1k")
+
+
+@pytest.mark.parametrize("reset_relationships,deletes", [(False, 0), (True, 2)])
+def test_thread_scaling_report_deletes_relationships_only_when_asked(stand_in_manager, capsys, reset_relationships,
+                                                                     deletes):
+    manager = stand_in_manager()
+    report = thread_scaling_report(os.path.join(ARTIFACTS_1K, "device_details_1k_csv.csv"),
+                                   os.path.join(ARTIFACTS_1K, "relationships_1k_csv.csv"), worker_counts=(1, 2),
+                                   reset_relationships=reset_relationships)
+    assert [entry["workers"] for entry in report] == [1, 2]
+    assert sum("DELETE r" in query for query, _ in manager.driver.statements) == deletes
@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from async_read_ws import AsyncRetrieveNodeAndRelations
+from read_ws import ROW_KEYS, RetrieveNodeAndRelations, TRAVERSAL_FRONTIER, TRAVERSAL_PATHS
+from stand_in_driver import AsyncStandInDriver, StandInDriver
+from test_topology_engine import FIXTURES
+
+SPECS = [{"relation": "DEPENDS_ON", "direction": "outgoing", "relationLevel": 2},
+         {"relation": "HOSTS", "direction": "", "relationLevel": 3}]
+
+
+def _retriever(fixture_name, start="a", relationship_types=(), direction="", level=3, limit=None,
+               traversal=TRAVERSAL_PATHS):
+    retriever = RetrieveNodeAndRelations(start, 60, list(relationship_types), direction, level, limit, cache=None,
+                                         traversal=traversal)
+    retriever.driver = StandInDriver(responder=FIXTURES[fixture_name].responder)
+    return retriever
+
+
+def _pages(page_size, **kwargs):
+    # every page is fetched by a new retriever, only the cursor carries over
+    pages, cursor = [], None
+    while True:
+        page = _retriever(**kwargs).fetch_page(page_size, cursor)
+        pages.append(page["rows"])
+        cursor = page["nextCursor"]
+        if cursor is None:
+            return pages
+
+
+def _expected_page_rows(fixture_name, start, specs) -> list:
+    rows = []
+    for spec in specs:
+        direction = spec["direction"] or "both"
+        rows.extend({key: row[key] for key in ROW_KEYS} for row in FIXTURES[fixture_name].page_rows(
+            start, direction, spec["relationLevel"] or None, spec["relation"]))
+    return rows
+
+
+@pytest.mark.parametrize("page_size", [1, 2, 3, 100])
+@pytest.mark.parametrize("relationship_types", [[], SPECS])
+def test_path_pages_concatenate_to_every_distinct_row(page_size, relationship_types):
+    specs = relationship_types or [{"relation": None, "direction": "", "relationLevel": 3}]
+    expected = _expected_page_rows("parallel", "a", specs)
+    pages = _pages(page_size, fixture_name="parallel", relationship_types=relationship_types)
+    assert [row for page in pages for row in page] == expected
+    assert all(len(page) == page_size for page in pages[:-1])
+    assert 0 < len(pages[-1]) <= page_size
+
+
+def test_resuming_from_a_cursor_continues_after_the_last_row():
+    expected = _expected_page_rows("parallel", "a", [{"relation": None, "direction": "", "relationLevel": 3}])
+    first = _retriever("parallel").fetch_page(2)
+    second = _retriever("parallel").fetch_page(3, first["nextCursor"])
+    assert first["rows"] + second["rows"] == expected[:5]
+    assert second["nextCursor"] is not None
+
+
+def test_page_ending_exactly_at_the_limit_is_the_last_page():
+    pages = _pages(2, fixture_name="parallel", limit=4)
+    assert [len(page) for page in pages] == [2, 2]
+    expected = _expected_page_rows("parallel", "a", [{"relation": None, "direction": "", "relationLevel": 3}])
+    assert [row for page in pages for row in page] == expected[:4]
+
+
+def test_page_ending_exactly_at_the_last_row_is_the_last_page():
+    expected = _expected_page_rows("cycle", "a", [{"relation": None, "direction": "", "relationLevel": 3}])
+    assert len(expected) == 9
+    pages = _pages(3, fixture_name="cycle")
+    assert [len(page) for page in pages] == [3, 3, 3]
+    assert [row for page in pages for row in page] == expected
+
+
+@pytest.mark.parametrize("page_size", [1, 2, 100])
+@pytest.mark.parametrize("limit", [None, 3])
+def test_frontier_pages_concatenate_to_the_frontier_result(page_size, limit):
+    kwargs = {"fixture_name": "cycle", "limit": limit, "traversal": TRAVERSAL_FRONTIER}
+    expected = _retriever(**kwargs)._query_database()
+    pages = _pages(page_size, **kwargs)
+    assert [row for page in pages for row in page] == expected
+
+
+def test_invalid_cursor_and_page_size_are_rejected():
+    with pytest.raises(ValueError):
+        _retriever("cycle").fetch_page(10, "not a cursor")
+    with pytest.raises(ValueError):
+        _retriever("cycle").fetch_page(0)
+
+
+@pytest.mark.parametrize("limit", [None, 3])
+def test_iter_relations_streams_every_path_up_to_the_limit(limit):
+    every_path = FIXTURES["parallel"].paths("a", "both", 3, None)
+    rows = list(_retriever("parallel", limit=limit).iter_relations())
+    assert rows == every_path[:limit]
+
+
+def test_iter_relations_frontier_matches_the_frontier_result():
+    kwargs = {"fixture_name": "mixed", "start": "hub", "traversal": TRAVERSAL_FRONTIER}
+    assert list(_retriever(**kwargs).iter_relations()) == _retriever(**kwargs)._query_database()
+
+
+@pytest.mark.parametrize("limit", [None, 3])
+def test_async_pages_and_stream_match_the_sync_ones(limit):
+    async def _read():
+        retriever = AsyncRetrieveNodeAndRelations("a", 60, [], "", 3, limit, cache=None)
+        retriever.driver = AsyncStandInDriver(responder=FIXTURES["parallel"].responder)
+        page = await retriever.fetch_page(2)
+        return page, [row async for row in retriever.iter_relations()]
+
+    page, rows = asyncio.run(_read())
+    assert page == _retriever("parallel", limit=limit).fetch_page(2)
+    assert rows == list(_retriever("parallel", limit=limit).iter_relations())
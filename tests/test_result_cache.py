@@ -0,0 +1,173 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from result_cache import RelationResultCache, make_relation_key, relation_cache
+from write_ws import ImportTopologyWithRelationsService
+
+
+class _Clock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class _Loader:
+    # counts calls; with a gate, every call blocks until the test releases it
+
+    def __init__(self, value, gate: threading.Event = None):
+        self.value = value
+        self.gate = gate
+        self.calls = 0
+        self.started = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        return list(self.value)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = RelationResultCache(max_entries=2)
+    loaders = {key: _Loader([key]) for key in "abc"}
+    cache.get_or_load("a", "L", loaders["a"])
+    cache.get_or_load("b", "L", loaders["b"])
+    cache.get_or_load("a", "L", loaders["a"])
+    cache.get_or_load("c", "L", loaders["c"])
+    assert cache.get_or_load("a", "L", loaders["a"]) == ["a"]
+    assert cache.get_or_load("b", "L", loaders["b"]) == ["b"]
+    assert (loaders["a"].calls, loaders["b"].calls) == (1, 2)
+    assert cache.stats()["evictions"] == 2
+
+
+def test_entries_expire_after_the_ttl():
+    clock = _Clock()
+    cache = RelationResultCache(ttl_seconds=10.0, clock=clock)
+    loader = _Loader([1])
+    cache.get_or_load("a", "L", loader)
+    clock.now = 9.9
+    cache.get_or_load("a", "L", loader)
+    assert loader.calls == 1
+    clock.now = 10.0
+    cache.get_or_load("a", "L", loader)
+    assert loader.calls == 2
+    assert cache.stats()["expirations"] == 1
+
+
+def test_returned_lists_do_not_change_the_cached_result():
+    cache = RelationResultCache()
+    loader = _Loader([1, 2])
+    first = cache.get_or_load("a", "L", loader)
+    first.append(3)
+    second = cache.get_or_load("a", "L", loader)
+    second.clear()
+    assert cache.get_or_load("a", "L", loader) == [1, 2]
+    assert loader.calls == 1
+
+
+def test_concurrent_sync_lookups_share_one_load():
+    cache = RelationResultCache()
+    gate = threading.Event()
+    loader = _Loader([1], gate)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(cache.get_or_load, "a", "L", loader) for _ in range(4)]
+        loader.started.wait(5)
+        while cache.stats()["sharedLoads"] < 3:
+            threading.Event().wait(0.001)
+        gate.set()
+        results = [future.result() for future in futures]
+    assert results == [[1]] * 4
+    assert loader.calls == 1
+    assert results[0] is not results[1]
+
+
+def test_a_failed_load_is_raised_to_every_waiter_and_not_stored():
+    cache = RelationResultCache()
+    gate = threading.Event()
+
+    def _failing():
+        gate.wait(5)
+        raise RuntimeError("query failed")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(cache.get_or_load, "a", "L", _failing) for _ in range(2)]
+        while cache.stats()["misses"] < 2:
+            threading.Event().wait(0.001)
+        gate.set()
+        for future in futures:
+            with pytest.raises(RuntimeError):
+                future.result()
+    assert cache.stats()["entries"] == 0
+
+
+def test_concurrent_async_lookups_share_one_load():
+    cache = RelationResultCache()
+    calls = []
+
+    async def _loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return [1]
+
+    async def _run():
+        return await asyncio.gather(*(cache.get_or_load_async("a", "L", _loader) for _ in range(5)))
+
+    assert asyncio.run(_run()) == [[1]] * 5
+    assert len(calls) == 1
+    assert cache.stats()["sharedLoads"] == 4
+
+
+@pytest.mark.parametrize("invalidate", [lambda cache: cache.invalidate_label("L"),
+                                        lambda cache: cache.invalidate_all()])
+def test_invalidation_during_a_load_keeps_its_result_out_of_the_cache(invalidate):
+    cache = RelationResultCache()
+    gate = threading.Event()
+    loader = _Loader([1], gate)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(cache.get_or_load, "a", "L", loader)
+        loader.started.wait(5)
+        invalidate(cache)
+        gate.set()
+        assert future.result() == [1]
+    loader.gate = None
+    cache.get_or_load("a", "L", loader)
+    assert loader.calls == 2
+
+
+def test_invalidate_label_keeps_other_labels():
+    cache = RelationResultCache()
+    cache.get_or_load("a", "L1", _Loader([1]))
+    cache.get_or_load("b", "L2", _Loader([2]))
+    assert cache.invalidate_label("L1") == 1
+    assert cache.stats()["entries"] == 1
+    assert cache.invalidate_all() == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_relation_key_normalises_direction_and_keeps_spec_order():
+    specs = [{"relation": "HOSTS", "direction": "INCOMING", "relationLevel": 2}, {"relation": "DEPENDS_ON"}]
+    assert make_relation_key("L", "a", [], "sideways", 3, 10) == make_relation_key("L", "a", [], "", "3", "10")
+    assert make_relation_key("L", "a", specs, "", 3, 10) != make_relation_key("L", "a", specs[::-1], "", 3, 10)
+    assert make_relation_key("L", "a", specs, "", 3, 10)[2][0] == ("HOSTS", "incoming", "2")
+
+
+def test_an_import_evicts_what_the_readers_cached(stand_in_manager):
+    # the readers cache under their own label, which is not the label the writers import into
+    stand_in_manager()
+    loader = _Loader([{"relatedNode": "b"}])
+    key = make_relation_key("CI_1K", "a", [], "", 3, 10)
+    try:
+        relation_cache.get_or_load(key, "CI_1K", loader)
+        ImportTopologyWithRelationsService(project_id=1, device_details_data=[{"Asset ID": "1", "Asset Name": "a"}],
+                                           relationship_data=[], batch_size=10).process_input()
+        relation_cache.get_or_load(key, "CI_1K", loader)
+        assert loader.calls == 2
+    finally:
+        relation_cache.clear()
@@ -0,0 +1,105 @@
+from collections import Counter
+
+import pytest
+
+from cypher_model import FixtureGraph, device
+from read_ws import TRAVERSAL_FRONTIER, TRAVERSAL_PATHS
+from stand_in_driver import StandInDriver
+from topology_engine import TopologyGraph, compare_with_cypher
+
+FIXTURES = {
+    # a -> b -> c -> a, c -> d <- e: a directed cycle with a mixed direction tail
+    "cycle": FixtureGraph(
+        {"n0": device("a"), "n1": device("b"), "n2": device("c"), "n3": device("d"), "n4": device("e")},
+        [("n0", "n1", "DEPENDS_ON"), ("n1", "n2", "DEPENDS_ON"), ("n2", "n0", "HOSTS"),
+         ("n2", "n3", "DEPENDS_ON"), ("n4", "n3", "HOSTS")]),
+    # parallel relationships of the same and of different types, plus two nodes sharing a name
+    "parallel": FixtureGraph(
+        {"n0": device("a"), "n1": device("b"), "n2": device("c"), "n3": device("twin"), "n4": device("twin")},
+        [("n0", "n1", "DEPENDS_ON"), ("n0", "n1", "DEPENDS_ON"), ("n0", "n1", "HOSTS"),
+         ("n1", "n0", "DEPENDS_ON"), ("n1", "n2", "HOSTS"), ("n2", "n3", "DEPENDS_ON"), ("n2", "n4", "DEPENDS_ON"),
+         ("n3", "n4", "HOSTS")]),
+    # a star with edges in both directions and an unnamed leaf
+    "mixed": FixtureGraph(
+        {"n0": device("hub"), "n1": device("in1"), "n2": device("in2"), "n3": device("out1"),
+         "n4": {"assetName": "unnamed"}, "n5": device("far")},
+        [("n1", "n0", "DEPENDS_ON"), ("n2", "n0", "HOSTS"), ("n0", "n3", "DEPENDS_ON"), ("n0", "n4", "HOSTS"),
+         ("n3", "n5", "DEPENDS_ON"), ("n5", "n1", "DEPENDS_ON")]),
+    "empty": FixtureGraph({}, []),
+}
+
+STARTS = {"cycle": ["a", "d"], "parallel": ["a", "twin"], "mixed": ["hub", "far"], "empty": ["a"]}
+
+CASES = [(name, start) for name, starts in STARTS.items() for start in starts]
+
+
+def _load(fixture: FixtureGraph):
+    driver = StandInDriver(responder=fixture.responder)
+    return driver, TopologyGraph.from_driver(driver, "CI_1K")
+
+
+def _row_keys(rows) -> Counter:
+    return Counter((row["relatedNode"], row["positionNumber"], row["relation"]) for row in rows)
+
+
+@pytest.mark.parametrize("fixture_name,start", CASES)
+@pytest.mark.parametrize("direction", ["incoming", "outgoing", ""])
+@pytest.mark.parametrize("level", [1, 2, 4, ""])
+@pytest.mark.parametrize("relation", [None, "DEPENDS_ON"])
+def test_expand_matches_cypher_paths(fixture_name, start, direction, level, relation):
+    driver, graph = _load(FIXTURES[fixture_name])
+    relationship_types = [{"relation": relation, "direction": direction, "relationLevel": level}] if relation else []
+    comparison = compare_with_cypher(graph, start, 60, relationship_types, direction, level, 10000, driver=driver)
+    assert comparison == {"matches": True, "missing": [], "unexpected": []}
+
+
+@pytest.mark.parametrize("fixture_name,start", CASES)
+@pytest.mark.parametrize("direction", ["incoming", "outgoing", ""])
+@pytest.mark.parametrize("limit", [0, 1, 3])
+def test_expand_limit_keeps_a_subset_of_the_cypher_paths(fixture_name, start, direction, limit):
+    driver, graph = _load(FIXTURES[fixture_name])
+    every_path = _row_keys(FIXTURES[fixture_name].paths(start, direction if direction else "both", None, None))
+    rows = graph.expand(start, direction, "", limit)
+    assert len(rows) == min(limit, sum(every_path.values()))
+    assert not _row_keys(rows) - every_path
+
+
+@pytest.mark.parametrize("fixture_name,start", CASES)
+@pytest.mark.parametrize("direction", ["incoming", "outgoing", ""])
+@pytest.mark.parametrize("level", [1, 2, 4, ""])
+@pytest.mark.parametrize("limit", [0, 1, 3, 500])
+@pytest.mark.parametrize("relation", [None, "DEPENDS_ON", "HOSTS"])
+def test_expand_frontier_matches_frontier_traversal(fixture_name, start, direction, level, limit, relation):
+    driver, graph = _load(FIXTURES[fixture_name])
+    relationship_types = [{"relation": relation, "direction": direction, "relationLevel": level}] if relation else []
+    comparison = compare_with_cypher(graph, start, 60, relationship_types, direction, level, limit,
+                                     traversal=TRAVERSAL_FRONTIER, driver=driver)
+    assert comparison["matches"], comparison
+
+
+def test_frontier_visits_each_node_once_at_its_minimum_depth():
+    _, graph = _load(FIXTURES["cycle"])
+    rows = graph.expand_frontier("a", "", "", None)
+    assert [(row["relatedNode"], row["positionNumber"], row["relation"]) for row in rows] == [
+        ("b", 1, "DEPENDS_ON"), ("c", 1, "HOSTS"), ("d", 2, "DEPENDS_ON"), ("e", 3, "HOSTS")]
+
+
+def test_parallel_relationships_are_separate_paths():
+    _, graph = _load(FIXTURES["parallel"])
+    rows = graph.expand("a", "outgoing", 1, None)
+    assert _row_keys(rows) == Counter({("b", 1, "DEPENDS_ON"): 2, ("b", 1, "HOSTS"): 1})
+
+
+def test_unknown_relationship_type_and_level_zero_return_nothing():
+    _, graph = _load(FIXTURES["cycle"])
+    assert graph.expand("a", "", 3, 10, relationship_type="UNKNOWN") == []
+    assert graph.expand_frontier("a", "", 3, 10, relationship_type="UNKNOWN") == []
+    assert graph.expand("a", "", 0, 10) == []
+    assert graph.expand_frontier("a", "", 0, 10) == []
+
+
+@pytest.mark.parametrize("traversal", [TRAVERSAL_PATHS, TRAVERSAL_FRONTIER])
+def test_empty_graph(traversal):
+    _, graph = _load(FIXTURES["empty"])
+    assert graph.node_count == 0 and graph.edge_count == 0
+    assert graph.retrieve("a", [], "", 3, 10, traversal=traversal) == []
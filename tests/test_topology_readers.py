@@ -0,0 +1,102 @@
+import pytest
+from openpyxl import Workbook
+
+from topology_readers import (DEVICE_FIELD_MAPPINGS, convert_to_aiops_fields, iter_device_chunks, iter_file_chunks,
+                              iter_file_frames, iter_relationship_chunks)
+
+HEADER = ["Asset ID", "Asset Name", "Type", "Impact Radius"]
+
+
+def _rows(count):
+    # blank and NA-looking values must come through as the raw strings
+    return [[str(index), f"Device{index}", "NA" if index % 2 else "", f"00{index}"] for index in range(count)]
+
+
+def _write_csv(path, rows, bom=False):
+    with open(path, "w", encoding="utf-8-sig" if bom else "utf-8", newline="") as file:
+        file.write(",".join(HEADER) + "\n")
+        for row in rows:
+            file.write(",".join(row) + "\n")
+    return str(path)
+
+
+def _write_xlsx(path, rows):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(HEADER)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+    return str(path)
+
+
+def _expected(rows):
+    return [dict(zip(HEADER, row)) for row in rows]
+
+
+@pytest.mark.parametrize("count,chunk_size,sizes", [(6, 3, [3, 3]), (7, 3, [3, 3, 1]), (2, 3, [2]),
+                                                    (3, 1, [1, 1, 1]), (0, 3, [])])
+@pytest.mark.parametrize("writer", [_write_csv, _write_xlsx])
+def test_chunks_cut_at_the_chunk_size_with_a_partial_last_chunk(tmp_path, writer, count, chunk_size, sizes):
+    extension = ".csv" if writer is _write_csv else ".xlsx"
+    file_path = writer(tmp_path / f"devices{extension}", _rows(count))
+    chunks = list(iter_file_chunks(file_path, chunk_size))
+    assert [len(chunk) for chunk in chunks] == sizes
+    if writer is _write_csv:
+        assert [row for chunk in chunks for row in chunk] == _expected(_rows(count))
+
+
+@pytest.mark.parametrize("count,chunk_size,sizes", [(6, 3, [3, 3]), (7, 3, [3, 3, 1])])
+def test_csv_frames_match_the_chunks(tmp_path, count, chunk_size, sizes):
+    file_path = _write_csv(tmp_path / "devices.csv", _rows(count))
+    frames = list(iter_file_frames(file_path, chunk_size))
+    assert [len(frame) for frame in frames] == sizes
+    assert ([frame.to_dict(orient="records") for frame in frames]
+            == list(iter_file_chunks(file_path, chunk_size)))
+    assert all(isinstance(value, str) for frame in frames for value in frame.to_numpy().ravel())
+
+
+def test_csv_byte_order_mark_is_not_part_of_the_first_column(tmp_path):
+    file_path = _write_csv(tmp_path / "devices.csv", _rows(2), bom=True)
+    (chunk,) = iter_file_chunks(file_path)
+    assert list(chunk[0]) == HEADER
+    (frame,) = iter_file_frames(file_path)
+    assert list(frame.columns) == HEADER
+
+
+@pytest.mark.parametrize("reader", [iter_file_chunks, iter_file_frames])
+@pytest.mark.parametrize("chunk_size", [0, -1])
+def test_chunk_size_must_be_positive(tmp_path, reader, chunk_size):
+    file_path = _write_csv(tmp_path / "devices.csv", _rows(2))
+    with pytest.raises(ValueError):
+        reader(file_path, chunk_size)
+
+
+@pytest.mark.parametrize("reader", [iter_file_chunks, iter_file_frames])
+def test_unsupported_extension_is_rejected(tmp_path, reader):
+    with pytest.raises(ValueError, match="Unsupported"):
+        reader(str(tmp_path / "devices.json"))
+
+
+def test_convert_maps_known_fields_and_drops_the_rest():
+    row = {ip_key: f"value of {aiops_key}" for aiops_key, ip_key in DEVICE_FIELD_MAPPINGS.items()}
+    row["Unmapped Column"] = "dropped"
+    (converted,) = convert_to_aiops_fields([row])
+    assert set(converted) == set(DEVICE_FIELD_MAPPINGS) | {"internalAssetId"}
+    assert all(converted[aiops_key] == f"value of {aiops_key}" for aiops_key in DEVICE_FIELD_MAPPINGS)
+
+
+def test_convert_gives_every_row_its_own_internal_id():
+    converted = convert_to_aiops_fields([{"Asset ID": "1"}, {"Asset ID": "1"}, {}])
+    assert [set(item) for item in converted] == [{"assetId", "internalAssetId"}] * 2 + [{"internalAssetId"}]
+    assert len({item["internalAssetId"] for item in converted}) == 3
+
+
+def test_device_and_relationship_chunks(tmp_path):
+    file_path = _write_csv(tmp_path / "devices.csv", _rows(5))
+    chunks = list(iter_device_chunks(file_path, 2))
+    assert [[row["assetName"] for row in chunk] for chunk in chunks] == [
+        ["Device0", "Device1"], ["Device2", "Device3"], ["Device4"]]
+    assert chunks[0][1]["type"] == "NA" and chunks[0][0]["type"] == ""
+    assert chunks[0][0]["impactRadius"] == "000"
+    assert list(iter_relationship_chunks(file_path, 2)) == list(iter_file_chunks(file_path, 2))
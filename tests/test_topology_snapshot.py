@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+from cypher_model import FixtureGraph
+from stand_in_driver import StandInDriver
+from test_topology_engine import FIXTURES, STARTS
+from topology_engine import TopologyGraph
+from topology_snapshot import _HEADER, FORMAT_VERSION, MAGIC, load_snapshot, write_snapshot
+
+ARTIFACTS_1K = os.path.join(os.path.dirname(__file__), os.pardir, "artifacts", "1k")
+
+
+def _graph(fixture: FixtureGraph) -> TopologyGraph:
+    return TopologyGraph.from_driver(StandInDriver(responder=fixture.responder), "CI_1K")
+
+
+def _round_trip(graph: TopologyGraph, tmp_path) -> TopologyGraph:
+    path = str(tmp_path / "topology.snapshot")
+    write_snapshot(graph, path)
+    return load_snapshot(path)
+
+
+@pytest.mark.parametrize("fixture_name", ["cycle", "parallel", "mixed"])
+def test_loaded_snapshot_expands_like_the_graph_it_was_written_from(fixture_name, tmp_path):
+    graph = _graph(FIXTURES[fixture_name])
+    loaded = _round_trip(graph, tmp_path)
+    assert (loaded.node_count, loaded.edge_count) == (graph.node_count, graph.edge_count)
+    for start in STARTS[fixture_name]:
+        for direction in ("incoming", "outgoing", ""):
+            for level in (1, 3, ""):
+                assert loaded.expand(start, direction, level, None) == graph.expand(start, direction, level, None)
+                assert (loaded.expand_frontier(start, direction, level, None)
+                        == graph.expand_frontier(start, direction, level, None))
+            assert (loaded.expand(start, direction, 2, None, relationship_type="DEPENDS_ON")
+                    == graph.expand(start, direction, 2, None, relationship_type="DEPENDS_ON"))
+    for node_id in range(graph.node_count):
+        assert loaded.node_properties(node_id) == graph.node_properties(node_id)
+
+
+def test_csv_snapshot_round_trip(tmp_path):
+    graph = TopologyGraph.from_csv(os.path.join(ARTIFACTS_1K, "device_details_1k_csv.csv"),
+                                   os.path.join(ARTIFACTS_1K, "relationships_1k_csv.csv"))
+    loaded = _round_trip(graph, tmp_path)
+    for start in ("Device1", "Device7", "Device500"):
+        assert loaded.expand(start, "", 3, 500) == graph.expand(start, "", 3, 500)
+        assert loaded.retrieve(start, [], "outgoing", 2, 100) == graph.retrieve(start, [], "outgoing", 2, 100)
+
+
+def test_empty_graph_round_trip(tmp_path):
+    loaded = _round_trip(_graph(FIXTURES["empty"]), tmp_path)
+    assert (loaded.node_count, loaded.edge_count) == (0, 0)
+    assert loaded.expand("a", "", 3, 10) == []
+    assert loaded.expand_frontier("a", "", 3, 10) == []
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    path = str(tmp_path / "topology.snapshot")
+    write_snapshot(_graph(FIXTURES["cycle"]), path)
+    return path
+
+
+@pytest.mark.parametrize("keep", [0, _HEADER.size - 1, _HEADER.size, 0.5, -1])
+def test_truncated_snapshot_is_rejected(snapshot_path, keep):
+    size = os.path.getsize(snapshot_path)
+    keep = int(size * keep) if isinstance(keep, float) else (size + keep if keep < 0 else keep)
+    with open(snapshot_path, "r+b") as snapshot_file:
+        snapshot_file.truncate(keep)
+    with pytest.raises(ValueError):
+        load_snapshot(snapshot_path)
+
+
+def test_corrupt_directory_is_rejected(snapshot_path):
+    with open(snapshot_path, "r+b") as snapshot_file:
+        _, _, _, directory_offset, _ = _HEADER.unpack(snapshot_file.read(_HEADER.size))
+        snapshot_file.seek(directory_offset)
+        snapshot_file.write(b"\x00garbage")
+    with pytest.raises(ValueError, match="corrupt directory"):
+        load_snapshot(snapshot_path)
+
+
+@pytest.mark.parametrize("magic,version,message", [(b"NOTSNAPS", FORMAT_VERSION, "not a topology snapshot"),
+                                                   (MAGIC, FORMAT_VERSION + 1, "unsupported")])
+def test_header_mismatch_is_rejected(snapshot_path, magic, version, message):
+    with open(snapshot_path, "r+b") as snapshot_file:
+        _, _, reserved, directory_offset, directory_length = _HEADER.unpack(snapshot_file.read(_HEADER.size))
+        snapshot_file.seek(0)
+        snapshot_file.write(_HEADER.pack(magic, version, reserved, directory_offset, directory_length))
+    with pytest.raises(ValueError, match=message):
+        load_snapshot(snapshot_path)
@@ -0,0 +1,66 @@
+import pytest
+
+from write_ws import ImportTopologyWithRelationsService
+
+DEVICES = [{"Asset ID": str(index), "Asset Name": f"Device{index}", "Type": "Server"} for index in range(7)]
+# interleaved types, so grouping has to collect rows that are not adjacent in the input
+RELATIONSHIPS = [{"Relationship Type Name": "HOSTS" if index in (1, 4) else "DEPENDS_ON",
+                  "Source Asset ID": str(index), "Target Asset ID": str(index + 1), "weight": index}
+                 for index in range(7)]
+
+
+def _node_batches(driver):
+    return [parameters["rows"] for query, parameters in driver.statements if query.startswith("UNWIND $rows")
+            and "MERGE (n:" in query]
+
+
+def _relationship_batches(driver):
+    batches = []
+    for query, parameters in driver.statements:
+        if query.startswith("UNWIND $rows") and "MERGE (source)" in query:
+            batches.append((query.split("-[r:`")[1].split("`]")[0], parameters["rows"]))
+    return batches
+
+
+@pytest.mark.parametrize("batch_size,sizes", [(3, [3, 3, 1]), (7, [7]), (1, [1] * 7), (100, [7])])
+def test_node_batches_cut_at_the_batch_size_with_a_partial_last_batch(stand_in_manager, batch_size, sizes):
+    manager = stand_in_manager()
+    ImportTopologyWithRelationsService(project_id=1, device_details_data=[dict(row) for row in DEVICES],
+                                       batch_size=batch_size).process_input()
+    batches = _node_batches(manager.driver)
+    assert [len(batch) for batch in batches] == sizes
+    rows = [row for batch in batches for row in batch]
+    assert [row["asset_name"] for row in rows] == [device["Asset Name"] for device in DEVICES]
+    assert rows[0]["properties"]["assetId"] == "0" and "assetName" not in rows[0]["properties"]
+    assert len({row["properties"]["internalAssetId"] for row in rows}) == len(DEVICES)
+
+
+def test_relationships_are_grouped_by_type_and_batched_per_type(stand_in_manager):
+    manager = stand_in_manager()
+    ImportTopologyWithRelationsService(project_id=1, relationship_data=RELATIONSHIPS, batch_size=3).process_input()
+    batches = _relationship_batches(manager.driver)
+    assert [(rel_type_name, len(rows)) for rel_type_name, rows in batches] == [
+        ("DEPENDS_ON", 3), ("DEPENDS_ON", 2), ("HOSTS", 2)]
+    assert [row["properties"]["weight"] for _, rows in batches for row in rows] == [0, 2, 3, 5, 6, 1, 4]
+    assert batches[0][1][0] == {"source_asset_id": "0", "target_asset_id": "1", "properties": {"weight": 0}}
+
+
+def test_unbatched_input_writes_one_statement_per_row(stand_in_manager):
+    manager = stand_in_manager()
+    ImportTopologyWithRelationsService(project_id=1, device_details_data=[dict(row) for row in DEVICES[:2]],
+                                       relationship_data=RELATIONSHIPS[:3]).process_input()
+    queries = [query for query, _ in manager.driver.statements]
+    assert not any(query.startswith("UNWIND") for query in queries)
+    assert sum(query.startswith("MERGE (n:") for query in queries) == 2
+    assert sum(query.startswith("MATCH (source:") for query in queries) == 3
+
+
+def test_stream_batches_each_chunk_on_its_own(stand_in_manager):
+    # types are grouped per chunk in the order they first appear in it
+    manager = stand_in_manager()
+    devices = [{"assetId": str(index), "assetName": f"Device{index}"} for index in range(8)]
+    ImportTopologyWithRelationsService(project_id=1, batch_size=3).process_input_stream(
+        [devices[:4], devices[4:]], [RELATIONSHIPS[:4], RELATIONSHIPS[4:]])
+    assert [len(batch) for batch in _node_batches(manager.driver)] == [3, 1, 3, 1]
+    assert [(rel_type_name, len(rows)) for rel_type_name, rows in _relationship_batches(manager.driver)] == [
+        ("DEPENDS_ON", 3), ("HOSTS", 1), ("HOSTS", 1), ("DEPENDS_ON", 2)]